@@ -1,3 +1,16 @@
 from django.contrib import admin
+from .models import TokenUsage, DailyTokenUsage
 
-# Register your models here.
+
+@admin.register(DailyTokenUsage)
+class DailyTokenUsageAdmin(admin.ModelAdmin):
+    list_display = ['day', 'user', 'organization', 'source', 'calls', 'prompt_tokens', 'completion_tokens']
+    list_filter = ['day', 'source']
+    search_fields = ['user__username', 'organization__name']
+
+
+@admin.register(TokenUsage)
+class TokenUsageAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'user', 'organization', 'source', 'prompt_tokens', 'completion_tokens']
+    list_filter = ['source', 'created_at']
+    search_fields = ['user__username', 'organization__name']
@@ -0,0 +1,241 @@
+"""
+Admission control for the endpoints that run inference.
+
+Each web process admits at most INFERENCE_ADMISSION_SLOTS requests into
+inference at once. Later requests wait in a bounded priority queue, with
+interactive routes ahead of bulk documentation (INFERENCE_ADMISSION_PRIORITIES).
+When the queue is full a request is rejected at once with 429. The exception
+is a higher-priority request, which displaces the lowest-priority waiter. A
+request still queued after INFERENCE_ADMISSION_MAX_WAIT seconds gets 503.
+Both responses carry Retry-After. A request that runs several inferences
+at once, like a documentation batch, takes that many slots.
+
+Slots and the queue are per process, not shared: a deployment of N web
+workers admits up to N * INFERENCE_ADMISSION_SLOTS requests at once, so
+size the setting as the inference capacity divided by the worker count.
+The inference server's own bounded queue (503 when full) is the shared
+limit behind it.
+"""
+import heapq
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+from .metrics import incr_metric
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """The request was not admitted; status_code is 429 (queue full) or 503 (waited too long)"""
+
+    def __init__(self, message, status_code, retry_after):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """An admitted request's slots; release() is idempotent so every exit path may call it"""
+
+    def __init__(self, controller, route, weight=1):
+        self.controller = controller
+        self.route = route
+        self.weight = weight
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Waiter:
+    def __init__(self, priority, sequence, route, weight):
+        self.priority = priority
+        self.sequence = sequence
+        self.route = route
+        self.weight = weight
+        self.event = threading.Event()
+        self.granted = False
+        self.displaced = False
+
+    def __lt__(self, other):
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class AdmissionController:
+    def __init__(self, slots, queue_size, max_wait):
+        self.slots = max(1, slots)
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.active = 0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        # Moving average of seconds a request holds its slot, for Retry-After
+        self._service_seconds = 5.0
+
+    def priority(self, route):
+        priorities = settings.INFERENCE_ADMISSION_PRIORITIES
+        return priorities.get(route, priorities.get('default', 1))
+
+    def retry_after(self):
+        """Seconds until the current queue has likely drained through the slots"""
+        queued = len(self._waiting)
+        return max(1, math.ceil(self._service_seconds * (queued + 1) / self.slots))
+
+    def acquire(self, route='default', weight=1):
+        """
+        Wait for weight slots (capped at the total) and return their Ticket.
+
+        Raises:
+            AdmissionRejected: the queue is full or the wait exceeded max_wait
+        """
+        priority = self.priority(route)
+        weight = min(max(1, weight), self.slots)
+        with self._lock:
+            if self.active + weight <= self.slots and not self._waiting:
+                self.active += weight
+                return Ticket(self, route, weight)
+
+            rejection = None
+            if len(self._waiting) >= self.queue_size:
+                lowest = max(self._waiting, default=None)
+                if lowest is None or lowest.priority <= priority:
+                    rejection = self._rejection(status.HTTP_429_TOO_MANY_REQUESTS, "Inference queue is full")
+                else:
+                    self._waiting.remove(lowest)
+                    heapq.heapify(self._waiting)
+                    lowest.displaced = True
+                    lowest.event.set()
+
+            if rejection is None:
+                waiter = Waiter(priority, next(self._sequence), route, weight)
+                heapq.heappush(self._waiting, waiter)
+                self._grant_waiters()
+        if rejection is not None:
+            raise self._rejected(route, rejection)
+
+        waiter.event.wait(self.max_wait)
+
+        with self._lock:
+            if waiter.granted:
+                return Ticket(self, route, weight)
+            if waiter.displaced:
+                rejection = self._rejection(status.HTTP_429_TOO_MANY_REQUESTS,
+                                            "Inference queue is full of higher-priority requests")
+            else:
+                self._waiting.remove(waiter)
+                heapq.heapify(self._waiting)
+                # Waiters held back behind this one may fit now
+                self._grant_waiters()
+                rejection = self._rejection(status.HTTP_503_SERVICE_UNAVAILABLE,
+                                            f"No inference capacity within {self.max_wait}s")
+        raise self._rejected(route, rejection)
+
+    def release(self, ticket):
+        with self._lock:
+            held = time.monotonic() - ticket.started
+            self._service_seconds = 0.8 * self._service_seconds + 0.2 * held
+            self.active -= ticket.weight
+            self._grant_waiters()
+
+    def _grant_waiters(self):
+        """
+        Hand free slots to waiters in priority order; called with the lock held.
+
+        Slots go straight to waiters so a newcomer cannot take them, and a
+        waiter that needs more slots than are free holds back those behind it.
+        """
+        while self._waiting and self.active + self._waiting[0].weight <= self.slots:
+            waiter = heapq.heappop(self._waiting)
+            self.active += waiter.weight
+            waiter.granted = True
+            waiter.event.set()
+
+    def _rejection(self, status_code, message):
+        """Build the rejection; called with the lock held"""
+        return AdmissionRejected(message, status_code, self.retry_after())
+
+    def _rejected(self, route, rejection):
+        """Count and log a rejection; called after the lock is released so disk I/O never blocks it"""
+        incr_metric(f'admission.rejected.{rejection.status_code}')
+        logger.warning(f"Rejected {route} inference request ({rejection.status_code}): {str(rejection)}")
+        return rejection
+
+    def snapshot(self):
+        """Current load of this process, for autoscaling and the queue-depth endpoint"""
+        with self._lock:
+            by_route = {}
+            for waiter in self._waiting:
+                by_route[waiter.route] = by_route.get(waiter.route, 0) + 1
+            return {
+                'pid': os.getpid(),
+                'slots': self.slots,
+                'active': self.active,
+                'queued': len(self._waiting),
+                'queued_by_route': by_route,
+                'queue_size': self.queue_size,
+                'max_wait_seconds': self.max_wait,
+                'retry_after_seconds': self.retry_after(),
+            }
+
+
+class AdmittedStream:
+    """Iterate events while holding ticket; releases it when exhausted or closed, even if never started"""
+
+    def __init__(self, events, ticket):
+        self.events = events
+        self.ticket = ticket
+
+    def __iter__(self):
+        try:
+            yield from self.events
+        finally:
+            self.close()
+
+    def close(self):
+        try:
+            if hasattr(self.events, 'close'):
+                self.events.close()
+        finally:
+            self.ticket.release()
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    settings.INFERENCE_ADMISSION_SLOTS,
+                    settings.INFERENCE_ADMISSION_QUEUE_SIZE,
+                    settings.INFERENCE_ADMISSION_MAX_WAIT,
+                )
+    return _controller
+
+
+def rejected_response(error):
+    """429/503 response for an AdmissionRejected, with Retry-After"""
+    return Response(
+        {'error': str(error), 'retry_after': error.retry_after},
+        status=error.status_code,
+        headers={'Retry-After': str(error.retry_after)},
+    )
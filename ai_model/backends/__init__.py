@@ -0,0 +1,159 @@
+"""
+Inference backends and the router that picks between them.
+
+Backends are named in INFERENCE_BACKENDS (or per purpose in
+INFERENCE_ROUTES) and tried in order: a backend that is unreachable or
+overloaded is skipped for INFERENCE_HEALTH_CHECK_INTERVAL seconds and then
+re-admitted once its health check passes. Extra named instances of a
+driver, e.g. a second Ollama box, are declared in INFERENCE_BACKEND_CONFIG.
+"""
+import logging
+import threading
+import time
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .base import InferenceBackend, BackendUnavailable
+
+logger = logging.getLogger(__name__)
+
+DRIVERS = {
+    'llama_cpp': 'ai_model.backends.llama_cpp.LlamaCppBackend',
+    'inference_server': 'ai_model.backends.server.InferenceServerBackend',
+    'ollama': 'ai_model.backends.ollama.OllamaBackend',
+    'completion_server': 'ai_model.backends.completion_server.CompletionServerBackend',
+    'fake': 'ai_model.backends.fake.FakeBackend',
+}
+
+_backends = {}
+_routers = {}
+_registry_lock = threading.Lock()
+
+# Backend name -> monotonic time before which it is skipped
+_down_until = {}
+_down_lock = threading.Lock()
+
+
+def get_backend(name):
+    """Return the process-wide backend instance registered under name"""
+    with _registry_lock:
+        backend = _backends.get(name)
+        if backend is None:
+            options = dict(settings.INFERENCE_BACKEND_CONFIG.get(name, {}))
+            driver = options.pop('driver', name)
+            if driver not in DRIVERS:
+                raise ValueError(f"Unknown inference backend driver: {driver}")
+            backend = import_string(DRIVERS[driver])(name, **options)
+            _backends[name] = backend
+        return backend
+
+
+def get_router(route='default'):
+    """Router over the backends configured for route ('default', 'chat', 'docs', ...)"""
+    names = tuple(settings.INFERENCE_ROUTES.get(route) or settings.INFERENCE_BACKENDS)
+    with _registry_lock:
+        router = _routers.get(names)
+    if router is None:
+        router = InferenceRouter([get_backend(name) for name in names])
+        with _registry_lock:
+            _routers[names] = router
+    return router
+
+
+def mark_down(backend, error):
+    logger.warning(f"Inference backend {backend.name} unavailable: {str(error)}")
+    with _down_lock:
+        _down_until[backend.name] = time.monotonic() + settings.INFERENCE_HEALTH_CHECK_INTERVAL
+
+
+def is_available(backend):
+    """False while backend is marked down; once the interval passes, its health check decides"""
+    with _down_lock:
+        until = _down_until.get(backend.name)
+    if until is None:
+        return True
+    if time.monotonic() < until:
+        return False
+    if backend.health():
+        logger.info(f"Inference backend {backend.name} is back")
+        with _down_lock:
+            _down_until.pop(backend.name, None)
+        return True
+    mark_down(backend, "health check failed")
+    return False
+
+
+def health_report():
+    """Health of every backend named in INFERENCE_BACKENDS and INFERENCE_ROUTES"""
+    names = list(settings.INFERENCE_BACKENDS)
+    for route_names in settings.INFERENCE_ROUTES.values():
+        names.extend(name for name in route_names if name not in names)
+    return {name: get_backend(name).health() for name in names}
+
+
+class InferenceRouter(InferenceBackend):
+    """
+    Send each request to the first available backend, failing over on BackendUnavailable.
+
+    A stream only fails over before its first piece; after that the error
+    is raised, as retrying elsewhere would repeat text already sent.
+    """
+
+    def __init__(self, backends):
+        super().__init__('+'.join(backend.name for backend in backends))
+        self.backends = backends
+        self._tokenizer = None
+        self._tokenizer_loaded = False
+
+    def candidates(self):
+        available = [backend for backend in self.backends if is_available(backend)]
+        # With every backend marked down, try them all rather than failing outright
+        return available or self.backends
+
+    def complete(self, prompt, max_tokens, stop=None, cancel_event=None):
+        errors = []
+        for backend in self.candidates():
+            try:
+                return backend.complete(prompt, max_tokens, stop=stop, cancel_event=cancel_event)
+            except BackendUnavailable as e:
+                mark_down(backend, e)
+                errors.append(str(e))
+        raise BackendUnavailable(f"No inference backend available: {'; '.join(errors)}")
+
+    def stream(self, prompt, max_tokens, stop=None, cancel_event=None):
+        errors = []
+        for backend in self.candidates():
+            started = False
+            pieces = backend.stream(prompt, max_tokens, stop=stop, cancel_event=cancel_event)
+            try:
+                for piece in pieces:
+                    started = True
+                    yield piece
+                return
+            except BackendUnavailable as e:
+                mark_down(backend, e)
+                if started:
+                    raise
+                errors.append(str(e))
+            finally:
+                pieces.close()
+        raise BackendUnavailable(f"No inference backend available: {'; '.join(errors)}")
+
+    def health(self):
+        return any(backend.health() for backend in self.backends)
+
+    def model_id(self):
+        """Every backend's model, since any of them may serve a given request"""
+        return '+'.join(backend.model_id() for backend in self.backends)
+
+    def tokenizer(self):
+        """The primary backend's tokenizer, so prompts are sized for the model that usually serves them"""
+        if not self._tokenizer_loaded:
+            try:
+                self._tokenizer = self.backends[0].tokenizer()
+            except Exception as e:
+                logger.warning(f"No tokenizer for {self.backends[0].name}, estimating prompt sizes: {str(e)}")
+            self._tokenizer_loaded = True
+        return self._tokenizer
+
+    def warm_up(self):
+        return self.backends[0].warm_up()
@@ -0,0 +1,50 @@
+class BackendUnavailable(Exception):
+    """Raised when a backend cannot serve requests right now, so the router should fail over"""
+
+
+class InferenceBackend:
+    """
+    Interface of an inference driver.
+
+    Drivers implement stream(); complete() joins it. health() is used by the
+    router to re-admit a backend it marked down.
+
+    Args:
+        name (str): Registry name the backend was created under
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def stream(self, prompt, max_tokens, stop=None, cancel_event=None):
+        """
+        Yield the completion of prompt as it is generated.
+
+        Raises:
+            BackendUnavailable: if the backend cannot be reached or is overloaded
+            Exception: if generation itself fails
+        """
+        raise NotImplementedError
+
+    def complete(self, prompt, max_tokens, stop=None, cancel_event=None):
+        """Return the full completion of prompt; raises like stream()"""
+        return ''.join(self.stream(prompt, max_tokens, stop=stop, cancel_event=cancel_event))
+
+    def health(self):
+        """True if the backend can serve requests"""
+        return True
+
+    def model_id(self):
+        """Identifies the model that generates this backend's text, for keying cached output"""
+        return self.name
+
+    def tokenizer(self):
+        """
+        Object with llama-cpp style tokenize/detokenize methods matching the
+        backend's model, or None to size prompts by estimate.
+        """
+        return None
+
+    def warm_up(self):
+        """Prepare the backend for its first request; returns the seconds it took"""
+        return 0.0
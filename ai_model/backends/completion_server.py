@@ -0,0 +1,38 @@
+import json
+from django.conf import settings
+from .remote import RemoteBackend
+
+
+class CompletionServerBackend(RemoteBackend):
+    """llama.cpp's HTTP server, whose /completion endpoint is AI_MODEL_API_ENDPOINT"""
+
+    def __init__(self, name, url=None):
+        endpoint = url or settings.AI_MODEL_API_ENDPOINT
+        if endpoint.rstrip('/').endswith('/completion'):
+            endpoint = endpoint.rstrip('/')[:-len('/completion')]
+        super().__init__(name, endpoint)
+
+    def stream(self, prompt, max_tokens, stop=None, cancel_event=None):
+        payload = {
+            'prompt': prompt,
+            'n_predict': max_tokens,
+            'temperature': settings.TEMPERATURE,
+            'stop': stop or [],
+            'stream': True,
+        }
+        # Server-sent events: "data: {...}" lines
+        for line in self.post_lines('/completion', payload, cancel_event=cancel_event):
+            if not line.startswith(b'data:'):
+                continue
+            event = json.loads(line[len(b'data:'):])
+            if event.get('content'):
+                yield event['content']
+            if event.get('stop'):
+                return
+
+    def health(self):
+        return self.get_ok('/health')
+
+    def model_id(self):
+        # The server picks the model; its URL is the closest thing to a name
+        return f"completion_server:{self.url}"
@@ -0,0 +1,53 @@
+import hashlib
+import threading
+import time
+from django.conf import settings
+from .base import InferenceBackend
+
+FAKE_WORDS = ['the', 'function', 'returns', 'module', 'class', 'value', 'request', 'file', 'data', 'handles']
+
+
+class FakeBackend(InferenceBackend):
+    """
+    Deterministic stand-in for a model, for development and benchmarks.
+
+    The same prompt always produces the same text: a header naming the
+    prompt's hash followed by max_tokens words picked from it. Latency is
+    simulated with FAKE_LLM_LATENCY_SECONDS before the first token (prompt
+    evaluation) and FAKE_LLM_TOKENS_PER_SECOND for the rest; calls and the
+    seconds spent in them are counted for benchmarks.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.calls = 0
+        self.busy_seconds = 0.0
+        self._stats_lock = threading.Lock()
+
+    def stream(self, prompt, max_tokens, stop=None, cancel_event=None):
+        started = time.monotonic()
+        try:
+            if settings.FAKE_LLM_LATENCY_SECONDS:
+                time.sleep(settings.FAKE_LLM_LATENCY_SECONDS)
+            token_seconds = 1 / settings.FAKE_LLM_TOKENS_PER_SECOND if settings.FAKE_LLM_TOKENS_PER_SECOND else 0
+
+            digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+            yield f"# Generated {digest.hex()[:12]}\n\n"
+            for index in range(max(0, max_tokens - 1)):
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                if token_seconds:
+                    time.sleep(token_seconds)
+                yield FAKE_WORDS[digest[index % len(digest)] % len(FAKE_WORDS)] + ' '
+        finally:
+            with self._stats_lock:
+                self.calls += 1
+                self.busy_seconds += time.monotonic() - started
+
+    def model_id(self):
+        return 'fake'
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.calls = 0
+            self.busy_seconds = 0.0
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from ..batching import get_batching_engine
+from ..llm import get_llm, get_tokenizer_llm, warm_up
+from ..prefix_cache import restore_prefix
+from .base import InferenceBackend, BackendUnavailable
+
+# A llama-cpp Llama object is not safe for concurrent calls
+llm_lock = threading.Lock()
+
+
+class LlamaCppBackend(InferenceBackend):
+    """
+    Runs the GGUF model at LLAMA_CPP_PATH in this process.
+
+    With LLAMA_BATCH_SIZE above 1, concurrent requests are decoded together
+    by the batching engine, which does not stream: the whole completion
+    arrives as one piece. Otherwise the model drafts with prompt lookup when
+    LLAMA_PROMPT_LOOKUP_TOKENS is set, unless this backend was configured
+    with prompt_lookup=False. Backends configured that way share the same
+    model. A model that cannot be loaded raises BackendUnavailable, so the
+    router fails over to the next backend.
+    """
+
+    def __init__(self, name, prompt_lookup=True):
+        super().__init__(name)
+        self.prompt_lookup = prompt_lookup
+
+    def load(self, loader):
+        """Return loader() (get_llm or get_batching_engine), raising BackendUnavailable if the model cannot load"""
+        try:
+            return loader()
+        except (ImportError, OSError, ValueError) as e:
+            raise BackendUnavailable(f"{self.name} could not load {settings.LLAMA_CPP_PATH}: {str(e)}")
+
+    @contextmanager
+    def drafting(self, llm):
+        """Detach the model's draft for the duration of a call if this backend does not use it"""
+        draft_model = llm.draft_model
+        if not self.prompt_lookup:
+            llm.draft_model = None
+        try:
+            yield
+        finally:
+            llm.draft_model = draft_model
+
+    def stream(self, prompt, max_tokens, stop=None, cancel_event=None):
+        if settings.LLAMA_BATCH_SIZE > 1:
+            yield self.load(get_batching_engine).submit(prompt, max_tokens, stop=stop).result()
+            return
+
+        llm = self.load(get_llm)
+        with llm_lock, self.drafting(llm):
+            restore_prefix(llm, prompt)
+            completion = llm(prompt, max_tokens=max_tokens, stop=stop, stream=True)
+            try:
+                for chunk in completion:
+                    if cancel_event is not None and cancel_event.is_set():
+                        break
+                    yield chunk["choices"][0]["text"]
+            finally:
+                completion.close()
+
+    def complete(self, prompt, max_tokens, stop=None, cancel_event=None):
+        if settings.LLAMA_BATCH_SIZE > 1:
+            return self.load(get_batching_engine).submit(prompt, max_tokens, stop=stop).result()
+
+        llm = self.load(get_llm)
+        with llm_lock, self.drafting(llm):
+            restore_prefix(llm, prompt)
+            output = llm(prompt, max_tokens=max_tokens, stop=stop)
+        return output["choices"][0]["text"]
+
+    def health(self):
+        return os.path.exists(settings.LLAMA_CPP_PATH)
+
+    def model_id(self):
+        return f"llama_cpp:{settings.LLAMA_CPP_PATH}"
+
+    def tokenizer(self):
+        return get_tokenizer_llm()
+
+    def warm_up(self):
+        if settings.LLAMA_BATCH_SIZE > 1:
+            # Completions run on the engine's own model; the full single-sequence model would sit unused
+            started = time.monotonic()
+            self.load(get_batching_engine)
+            get_tokenizer_llm()
+            return time.monotonic() - started
+        return warm_up()
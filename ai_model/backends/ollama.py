@@ -0,0 +1,33 @@
+import json
+from django.conf import settings
+from .remote import RemoteBackend
+
+
+class OllamaBackend(RemoteBackend):
+    """Ollama-compatible server at OLLAMA_URL serving the AI_MODEL model through /api/generate"""
+
+    def __init__(self, name, url=None, model=None):
+        super().__init__(name, url or settings.OLLAMA_URL)
+        self.model = model or settings.AI_MODEL
+
+    def stream(self, prompt, max_tokens, stop=None, cancel_event=None):
+        payload = {
+            'model': self.model,
+            'prompt': prompt,
+            'stream': True,
+            'options': {'num_predict': max_tokens, 'temperature': settings.TEMPERATURE, 'stop': stop or []},
+        }
+        for line in self.post_lines('/api/generate', payload, cancel_event=cancel_event):
+            event = json.loads(line)
+            if event.get('error'):
+                raise Exception(f"{self.name} failed: {event['error']}")
+            if event.get('response'):
+                yield event['response']
+            if event.get('done'):
+                return
+
+    def health(self):
+        return self.get_ok('/api/tags')
+
+    def model_id(self):
+        return f"ollama:{self.model}"
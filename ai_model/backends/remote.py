@@ -0,0 +1,72 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from .base import InferenceBackend, BackendUnavailable
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_inference_session():
+    """Shared HTTP session for remote inference backends; connections are pooled across threads"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=settings.DOC_GENERATION_MAX_WORKERS * 2)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+
+class RemoteBackend(InferenceBackend):
+    """
+    Base for drivers that talk to an inference server over HTTP.
+
+    Connection errors, timeouts, 429 and 5xx responses raise
+    BackendUnavailable so the router fails over; closing the stream closes
+    the connection, which stops generation on servers that watch for it.
+
+    Args:
+        url (str): Base URL of the server
+    """
+
+    def __init__(self, name, url):
+        super().__init__(name)
+        self.url = url.rstrip('/')
+
+    def _timeout(self):
+        return (settings.INFERENCE_CONNECT_TIMEOUT, settings.INFERENCE_READ_TIMEOUT)
+
+    def post_lines(self, path, payload, cancel_event=None):
+        """POST payload as JSON and yield the non-empty lines of the streamed response"""
+        try:
+            response = get_inference_session().post(
+                f"{self.url}{path}", json=payload, stream=True, timeout=self._timeout()
+            )
+        except requests.RequestException as e:
+            raise BackendUnavailable(f"{self.name} unreachable: {str(e)}")
+
+        with response:
+            if response.status_code == 429 or response.status_code >= 500:
+                raise BackendUnavailable(f"{self.name} returned HTTP {response.status_code}")
+            if response.status_code != 200:
+                raise Exception(f"{self.name} returned HTTP {response.status_code}: {response.text[:500]}")
+            try:
+                for line in response.iter_lines():
+                    if cancel_event is not None and cancel_event.is_set():
+                        return
+                    if line:
+                        yield line
+            except requests.RequestException as e:
+                raise BackendUnavailable(f"{self.name} stream interrupted: {str(e)}")
+
+    def get_ok(self, path):
+        """True if GET path answers 200 within the connect timeout"""
+        try:
+            response = get_inference_session().get(f"{self.url}{path}", timeout=settings.INFERENCE_CONNECT_TIMEOUT)
+            return response.status_code == 200
+        except requests.RequestException:
+            return False
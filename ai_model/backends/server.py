@@ -0,0 +1,38 @@
+import os
+from django.conf import settings
+from ..inference_client import InferenceClient, InferenceServerError, InferenceServerUnavailable
+from ..llm import get_tokenizer_llm
+from .base import InferenceBackend, BackendUnavailable
+
+
+class InferenceServerBackend(InferenceBackend):
+    """
+    Sends requests to the server started by `manage.py run_inference_server` at INFERENCE_SERVER_URL.
+
+    Only an unreachable or overloaded server raises BackendUnavailable; a
+    rejected request or failed generation is raised as InferenceServerError
+    so one bad prompt does not mark the server down.
+    """
+
+    def stream(self, prompt, max_tokens, stop=None, cancel_event=None):
+        client = InferenceClient()
+        try:
+            yield from client.stream(prompt, max_tokens, stop=stop, cancel_event=cancel_event)
+        except InferenceServerUnavailable as e:
+            raise BackendUnavailable(str(e))
+
+    def health(self):
+        try:
+            InferenceClient().health()
+            return True
+        except InferenceServerError:
+            return False
+
+    def model_id(self):
+        return f"inference_server:{settings.LLAMA_CPP_PATH}"
+
+    def tokenizer(self):
+        # The server runs the same GGUF file; only its vocabulary is loaded here
+        if os.path.exists(settings.LLAMA_CPP_PATH):
+            return get_tokenizer_llm()
+        return None
@@ -0,0 +1,256 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Candidates kept when sampling with a temperature
+SAMPLING_TOP_K = 40
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+class BatchRequest:
+    """One prompt decoding as a sequence of a batch"""
+
+    def __init__(self, prompt, max_tokens, stop):
+        self.prompt = prompt
+        self.max_tokens = max_tokens
+        self.stop = stop or []
+        self.future = Future()
+        self.seq_id = None
+        self.n_past = 0
+        self.next_token = None
+        self.batch_index = None
+        self.generated = []
+
+
+class BatchingEngine:
+    """
+    Decode many prompts together with llama.cpp's multi-sequence batch API.
+
+    Prompts submitted from any thread wait up to wait_seconds for others to
+    join, then decode as one batch of up to max_batch_size sequences: every
+    step feeds one token of each sequence through the model in a single
+    llama_decode call, so the weights are read once per step instead of once
+    per sequence. Sequences that finish free their slot for waiting prompts
+    straight away (continuous batching).
+
+    The engine loads its own model and a context with a KV cache of
+    LLAMA_N_CTX tokens per sequence, separate from get_llm()'s.
+
+    Args:
+        max_batch_size (int): Sequences decoded together
+        wait_seconds (float): How long the first prompt of an idle engine
+            waits for others to batch with
+        n_threads (int): CPU threads used for decoding
+    """
+
+    def __init__(self, max_batch_size, wait_seconds, n_threads=None):
+        import llama_cpp
+        from llama_cpp._internals import LlamaBatch, LlamaContext, LlamaModel
+
+        self.max_batch_size = max_batch_size
+        self.wait_seconds = wait_seconds
+        self.generated_tokens = 0
+
+        n_threads = n_threads or max(1, (os.cpu_count() or 1) // 2)
+        model_params = llama_cpp.llama_model_default_params()
+        self.model = LlamaModel(path_model=settings.LLAMA_CPP_PATH, params=model_params, verbose=False)
+
+        context_params = llama_cpp.llama_context_default_params()
+        context_params.n_ctx = settings.LLAMA_N_CTX * max_batch_size
+        # A whole prompt is prefilled in one decode call
+        context_params.n_batch = settings.LLAMA_N_CTX
+        context_params.n_ubatch = min(512, settings.LLAMA_N_CTX)
+        context_params.n_seq_max = max_batch_size
+        context_params.n_threads = n_threads
+        context_params.n_threads_batch = n_threads
+        self.context = LlamaContext(model=self.model, params=context_params, verbose=False)
+        self.batch = LlamaBatch(n_tokens=settings.LLAMA_N_CTX, embd=0, n_seq_max=max_batch_size, verbose=False)
+        self.memory = llama_cpp.llama_get_memory(self.context.ctx)
+        self.vocab = llama_cpp.llama_model_get_vocab(self.model.model)
+        self._llama_cpp = llama_cpp
+
+        self.requests = queue.Queue()
+        self.free_seq_ids = list(range(max_batch_size))
+        self.active = {}
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name='llama-batch', daemon=True)
+        self.thread.start()
+
+    def submit(self, prompt, max_tokens, stop=None):
+        """
+        Queue a prompt for batched decoding.
+
+        Returns:
+            concurrent.futures.Future: resolves to the generated text
+        """
+        if self.closed:
+            raise RuntimeError("Batching engine is closed")
+        request = BatchRequest(prompt, max_tokens, stop)
+        self.requests.put(request)
+        return request.future
+
+    def close(self):
+        """Stop the decoding thread and free the model and KV cache"""
+        self.closed = True
+        self.requests.put(None)
+        self.thread.join()
+        self.batch.close()
+        self.context.close()
+        self.model.close()
+
+    def _run(self):
+        while not self.closed:
+            if not self.active:
+                request = self.requests.get()
+                if request is None:
+                    break
+                self._admit(request)
+                deadline = time.monotonic() + self.wait_seconds
+                while self.free_seq_ids and time.monotonic() < deadline:
+                    try:
+                        request = self.requests.get(timeout=max(0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if request is None:
+                        self.closed = True
+                        break
+                    self._admit(request)
+            else:
+                while self.free_seq_ids:
+                    try:
+                        request = self.requests.get_nowait()
+                    except queue.Empty:
+                        break
+                    if request is None:
+                        self.closed = True
+                        break
+                    self._admit(request)
+
+            if self.active:
+                self._step()
+
+        for request in list(self.active.values()):
+            self._finish(request, error=RuntimeError("Batching engine is closed"))
+
+    def _admit(self, request):
+        """Prefill a prompt into a free sequence slot and sample its first token"""
+        if not request.future.set_running_or_notify_cancel():
+            return
+
+        tokens = self.model.tokenize(request.prompt.encode('utf-8'), add_bos=True, special=False)
+        if len(tokens) + request.max_tokens > settings.LLAMA_N_CTX:
+            request.future.set_exception(ValueError(
+                f"Requested tokens ({len(tokens) + request.max_tokens}) exceed context window of {settings.LLAMA_N_CTX}"
+            ))
+            return
+
+        request.seq_id = self.free_seq_ids.pop()
+        self.batch.reset()
+        for position, token in enumerate(tokens):
+            self._add(token, position, request.seq_id, logits=position == len(tokens) - 1)
+        try:
+            self.context.decode(self.batch)
+        except Exception as e:
+            self._finish(request, error=e)
+            return
+
+        request.n_past = len(tokens)
+        request.next_token = self._sample(len(tokens) - 1)
+        self.active[request.seq_id] = request
+
+    def _step(self):
+        """Feed the last sampled token of every active sequence through the model in one decode"""
+        self.batch.reset()
+        stepping = []
+        for request in list(self.active.values()):
+            if self._llama_cpp.llama_vocab_is_eog(self.vocab, request.next_token):
+                self._finish(request)
+                continue
+
+            request.generated.append(request.next_token)
+            self.generated_tokens += 1
+            if len(request.generated) >= request.max_tokens or self._stop_index(request) is not None:
+                self._finish(request)
+                continue
+
+            request.batch_index = self.batch.n_tokens()
+            self._add(request.next_token, request.n_past, request.seq_id, logits=True)
+            request.n_past += 1
+            stepping.append(request)
+
+        if not stepping:
+            return
+        try:
+            self.context.decode(self.batch)
+        except Exception as e:
+            logger.error(f"Batched decode failed: {str(e)}")
+            for request in stepping:
+                self._finish(request, error=e)
+            return
+
+        for request in stepping:
+            request.next_token = self._sample(request.batch_index)
+
+    def _add(self, token, position, seq_id, logits):
+        batch = self.batch.batch
+        i = batch.n_tokens
+        batch.token[i] = token
+        batch.pos[i] = position
+        batch.seq_id[i][0] = seq_id
+        batch.n_seq_id[i] = 1
+        batch.logits[i] = logits
+        batch.n_tokens += 1
+
+    def _sample(self, index):
+        logits = np.ctypeslib.as_array(self.context.get_logits_ith(index), shape=(self.model.n_vocab(),))
+        if settings.TEMPERATURE <= 0:
+            return int(np.argmax(logits))
+        top = np.argpartition(logits, -SAMPLING_TOP_K)[-SAMPLING_TOP_K:]
+        scaled = logits[top] / settings.TEMPERATURE
+        probabilities = np.exp(scaled - scaled.max())
+        probabilities /= probabilities.sum()
+        return int(np.random.choice(top, p=probabilities))
+
+    def _text(self, request):
+        return self.model.detokenize(request.generated).decode('utf-8', errors='ignore')
+
+    def _stop_index(self, request):
+        text = self._text(request)
+        positions = [text.find(stop) for stop in request.stop if stop in text]
+        return min(positions) if positions else None
+
+    def _finish(self, request, error=None):
+        self.active.pop(request.seq_id, None)
+        self._llama_cpp.llama_memory_seq_rm(self.memory, request.seq_id, -1, -1)
+        self.free_seq_ids.append(request.seq_id)
+
+        if error is not None:
+            request.future.set_exception(error)
+            return
+        text = self._text(request)
+        stop_index = self._stop_index(request)
+        request.future.set_result(text[:stop_index] if stop_index is not None else text)
+
+
+def get_batching_engine():
+    """Process-wide batching engine, created on first use when LLAMA_BATCH_SIZE > 1"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                started = time.monotonic()
+                _engine = BatchingEngine(settings.LLAMA_BATCH_SIZE, settings.LLAMA_BATCH_WAIT_SECONDS)
+                logger.info(
+                    f"Loaded batching engine for {settings.LLAMA_BATCH_SIZE} sequences "
+                    f"in {time.monotonic() - started:.1f}s"
+                )
+    return _engine
@@ -0,0 +1,128 @@
+import http.client
+import json
+import logging
+import os
+import socket
+from django.conf import settings
+from .inference_server import parse_address
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceServerError(Exception):
+    """Raised when the inference server is unreachable, rejects a request or fails it"""
+
+
+class InferenceServerUnavailable(InferenceServerError):
+    """Raised when the server cannot take requests at all: unreachable, timed out, queue full or HTTP 5xx"""
+
+
+class InferenceCancelled(Exception):
+    """Raised when a request is cancelled by its caller before it completes"""
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix domain socket"""
+
+    def __init__(self, path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class InferenceClient:
+    """
+    Client for the server started by `manage.py run_inference_server`.
+
+    Each request uses its own connection, so closing it (on cancellation,
+    timeout or when the caller stops reading the stream) cancels the request
+    on the server and frees the model for the next one.
+
+    Args:
+        url: Server address, defaults to INFERENCE_SERVER_URL
+        client: Name the server's fair queue groups requests by, defaults to
+            this host and process
+    """
+
+    def __init__(self, url=None, client=None):
+        self.url = url or settings.INFERENCE_SERVER_URL
+        self.client = client or f'{socket.gethostname()}:{os.getpid()}'
+
+    def _connect(self):
+        transport, address = parse_address(self.url)
+        if transport == 'unix':
+            connection = UnixHTTPConnection(address, timeout=settings.INFERENCE_CONNECT_TIMEOUT)
+        else:
+            connection = http.client.HTTPConnection(*address, timeout=settings.INFERENCE_CONNECT_TIMEOUT)
+        connection.connect()
+        # Generation can legitimately take a while to start when the queue is long
+        connection.sock.settimeout(settings.INFERENCE_READ_TIMEOUT)
+        return connection
+
+    def stream(self, prompt, max_tokens, stop=None, cancel_event=None):
+        """
+        Stream the completion of prompt as it is generated.
+
+        Args:
+            cancel_event (threading.Event): Optional; once set, the request is
+                cancelled at the next token
+
+        Yields:
+            str: generated text, one token at a time
+
+        Raises:
+            InferenceServerUnavailable: on connection errors, timeouts, a
+                full queue or another 5xx response
+            InferenceServerError: if the server rejects the request (4xx)
+                or generation fails
+            InferenceCancelled: if cancel_event was set
+        """
+        body = json.dumps({'prompt': prompt, 'max_tokens': max_tokens, 'stop': stop, 'client': self.client})
+        connection = None
+        try:
+            connection = self._connect()
+            connection.request('POST', '/v1/completions', body=body, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            if response.status == 429 or response.status >= 500:
+                raise InferenceServerUnavailable(
+                    f"Inference server returned HTTP {response.status}: {response.read(500)!r}"
+                )
+            if response.status != 200:
+                raise InferenceServerError(f"Inference server returned HTTP {response.status}: {response.read(500)!r}")
+
+            for line in response:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise InferenceCancelled("Inference request cancelled")
+                event = json.loads(line)
+                if 'error' in event:
+                    raise InferenceServerError(f"Inference failed: {event['error']}")
+                if event.get('done'):
+                    return
+                yield event['text']
+            raise InferenceServerUnavailable("Inference server closed the stream early")
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            raise InferenceServerUnavailable(f"Inference server error: {str(e)}")
+        finally:
+            if connection is not None:
+                connection.close()
+
+    def complete(self, prompt, max_tokens, stop=None, cancel_event=None):
+        """Return the full completion of prompt; raises like stream()"""
+        return ''.join(self.stream(prompt, max_tokens, stop=stop, cancel_event=cancel_event))
+
+    def health(self):
+        """The server's pool state: {'instances', 'busy', 'queued'}"""
+        connection = None
+        try:
+            connection = self._connect()
+            connection.request('GET', '/health')
+            return json.loads(connection.getresponse().read())
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            raise InferenceServerUnavailable(f"Inference server error: {str(e)}")
+        finally:
+            if connection is not None:
+                connection.close()
@@ -0,0 +1,272 @@
+import json
+import logging
+import os
+import queue
+import select
+import socket
+import socketserver
+import threading
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from .llm import create_llm
+from .prefix_cache import restore_prefix
+
+logger = logging.getLogger(__name__)
+
+# How often a handler waiting on a queued request checks whether its client hung up
+DISCONNECT_POLL_SECONDS = 1
+
+
+def parse_address(url):
+    """
+    Split an inference server address into its transport and address.
+
+    Accepts unix:///path/to/socket, http://host:port or host:port.
+
+    Returns:
+        tuple: ('unix', path) or ('tcp', (host, port))
+    """
+    if url.startswith('unix://'):
+        return 'unix', url[len('unix://'):]
+    parsed = urlparse(url if '://' in url else f'http://{url}')
+    return 'tcp', (parsed.hostname or '127.0.0.1', parsed.port or 80)
+
+
+class InferenceRequest:
+    """One completion request, streamed token by token from a worker to its HTTP handler"""
+
+    def __init__(self, prompt, max_tokens, stop, client):
+        self.prompt = prompt
+        self.max_tokens = max_tokens
+        self.stop = stop
+        self.client = client
+        self.chunks = queue.Queue()
+        self.cancelled = threading.Event()
+        self.error = None
+        self.completion_tokens = 0
+
+    def push(self, text):
+        self.completion_tokens += 1
+        self.chunks.put(text)
+
+    def finish(self, error=None):
+        self.error = error
+        self.chunks.put(None)
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+class FairQueue:
+    """
+    Bounded request queue served round-robin across clients.
+
+    Each client (a web or ingestion worker process) has its own FIFO, so one
+    client submitting a whole repository cannot starve another's chat
+    request.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.queues = OrderedDict()
+        self.condition = threading.Condition()
+
+    def put(self, request):
+        """Queue a request, raising queue.Full when max_size requests are already waiting"""
+        with self.condition:
+            if self.size >= self.max_size:
+                raise queue.Full
+            self.queues.setdefault(request.client, deque()).append(request)
+            self.size += 1
+            self.condition.notify()
+
+    def get(self):
+        """Take the next request, rotating to the back the client it came from"""
+        with self.condition:
+            while not self.size:
+                self.condition.wait()
+            client, requests = self.queues.popitem(last=False)
+            request = requests.popleft()
+            if requests:
+                self.queues[client] = requests
+            self.size -= 1
+            return request
+
+
+class ModelWorker(threading.Thread):
+    """Serves queued requests one at a time on its own model instance"""
+
+    def __init__(self, llm, request_queue, name):
+        super().__init__(name=name, daemon=True)
+        self.llm = llm
+        self.request_queue = request_queue
+        self.busy = False
+
+    def run(self):
+        while True:
+            request = self.request_queue.get()
+            if request.cancelled.is_set():
+                request.finish()
+                continue
+
+            self.busy = True
+            error = None
+            try:
+                restore_prefix(self.llm, request.prompt)
+                for chunk in self.llm(request.prompt, max_tokens=request.max_tokens, stop=request.stop, stream=True):
+                    if request.cancelled.is_set():
+                        logger.info(f"{self.name}: request from {request.client} cancelled")
+                        break
+                    request.push(chunk['choices'][0]['text'])
+            except Exception as e:
+                logger.error(f"{self.name}: inference failed: {str(e)}")
+                error = str(e)
+            finally:
+                self.busy = False
+                request.finish(error)
+
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP interface of the inference server.
+
+    POST /v1/completions takes {'prompt', 'max_tokens', 'stop', 'client'} and
+    streams newline-delimited JSON: {'text'} per token, then a final
+    {'done': true, 'completion_tokens'} or {'error'}. Closing the connection
+    cancels the request, whether it is still queued or already generating.
+    GET /health reports the pool's state.
+    """
+
+    def do_GET(self):
+        if self.path != '/health':
+            self.send_json(404, {'error': 'Not found'})
+            return
+        self.send_json(200, {
+            'instances': len(self.server.workers),
+            'busy': sum(worker.busy for worker in self.server.workers),
+            'queued': self.server.request_queue.size,
+        })
+
+    def do_POST(self):
+        if self.path != '/v1/completions':
+            self.send_json(404, {'error': 'Not found'})
+            return
+
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+            request = InferenceRequest(
+                prompt=str(payload['prompt']),
+                max_tokens=int(payload['max_tokens']),
+                stop=payload.get('stop') or None,
+                client=str(payload.get('client') or 'anonymous'),
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {'error': f'Invalid request: {str(e)}'})
+            return
+
+        try:
+            self.server.request_queue.put(request)
+        except queue.Full:
+            self.send_json(503, {'error': 'Inference queue is full'})
+            return
+
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.end_headers()
+            self.stream(request)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info(f"Client {request.client} disconnected; cancelling its request")
+            request.cancel()
+
+    def stream(self, request):
+        while True:
+            try:
+                text = request.chunks.get(timeout=DISCONNECT_POLL_SECONDS)
+            except queue.Empty:
+                if self.client_disconnected():
+                    raise ConnectionResetError
+                continue
+
+            if text is None:
+                break
+            self.write_line({'text': text})
+
+        if request.error:
+            self.write_line({'error': request.error})
+        else:
+            self.write_line({'done': True, 'completion_tokens': request.completion_tokens})
+
+    def client_disconnected(self):
+        """True if the client closed its end while we had nothing to write"""
+        readable, _, _ = select.select([self.connection], [], [], 0)
+        if not readable:
+            return False
+        try:
+            return self.connection.recv(1, socket.MSG_PEEK) == b''
+        except OSError:
+            return True
+
+    def write_line(self, data):
+        self.wfile.write(json.dumps(data).encode('utf-8') + b'\n')
+        self.wfile.flush()
+
+    def send_json(self, code, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class TCPInferenceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class UnixInferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # A socket file left behind by a previous run would make bind fail
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+
+    def get_request(self):
+        # BaseHTTPRequestHandler expects a (host, port) style client address
+        connection, _ = super().get_request()
+        return connection, ('unix', 0)
+
+
+def create_server(bind, instances, threads, queue_size):
+    """
+    Load the model instances and return a server ready for serve_forever().
+
+    Args:
+        bind (str): unix:///path/to/socket or host:port
+        instances (int): Model instances, each serving one request at a time
+        threads (int): CPU threads each instance uses for decoding
+        queue_size (int): Queued requests beyond this are rejected with 503
+    """
+    request_queue = FairQueue(queue_size)
+    workers = []
+    for number in range(1, instances + 1):
+        llm = create_llm(n_threads=threads, n_threads_batch=threads)
+        workers.append(ModelWorker(llm, request_queue, name=f'inference-{number}'))
+        logger.info(f"Loaded model instance {number}/{instances} with {threads} threads")
+
+    transport, address = parse_address(bind)
+    server_class = UnixInferenceServer if transport == 'unix' else TCPInferenceServer
+    server = server_class(address, InferenceRequestHandler)
+    server.request_queue = request_queue
+    server.workers = workers
+
+    for worker in workers:
+        worker.start()
+    return server
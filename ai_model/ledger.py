@@ -0,0 +1,257 @@
+"""
+Token accounting: prompt and completion tokens per inference call, by user and organization.
+
+record_usage() only appends to an in-memory buffer. A background thread
+writes the buffer every TOKEN_LEDGER_FLUSH_SECONDS, and a full buffer of
+TOKEN_LEDGER_BATCH_SIZE calls is written at once. Each flush is one
+bulk_create of TokenUsage rows plus one update per (day, user,
+organization, source) of the DailyTokenUsage rollup. Quota checks and usage
+pages read the rollup plus whatever this process has not written yet.
+"""
+import atexit
+import datetime
+import logging
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import close_old_connections, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from rest_framework import status
+from repo2doc_api.prompt_builder import count_tokens
+from .admission import AdmissionRejected
+from .models import TokenUsage, DailyTokenUsage
+
+logger = logging.getLogger(__name__)
+
+
+class TokenQuotaExceeded(AdmissionRejected):
+    """A user or organization has used its daily tokens; retry_after counts down to local midnight"""
+
+    def __init__(self, message):
+        super().__init__(message, status.HTTP_429_TOO_MANY_REQUESTS, seconds_until_tomorrow())
+
+
+def seconds_until_tomorrow():
+    now = timezone.localtime()
+    tomorrow = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time(), tzinfo=now.tzinfo)
+    return max(1, int((tomorrow - now).total_seconds()))
+
+
+def account_user(user):
+    """user if it is a signed-in User, else None (anonymous API callers are recorded unattributed)"""
+    return user if user is not None and user.is_authenticated else None
+
+
+class TokenLedger:
+    def __init__(self):
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+
+    def record(self, user, organization, source, prompt_tokens, completion_tokens):
+        if not prompt_tokens and not completion_tokens:
+            return
+        user = account_user(user)
+        entry = TokenUsage(
+            user_id=user.pk if user else None,
+            organization_id=organization.pk if organization else None,
+            source=source,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            created_at=timezone.now(),
+        )
+        with self._lock:
+            self._pending.append(entry)
+            full = len(self._pending) >= settings.TOKEN_LEDGER_BATCH_SIZE
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_periodically, name='token-ledger', daemon=True)
+                self._flusher.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write buffered usage; entries are put back if the write fails. Returns the number written."""
+        with self._flush_lock:
+            with self._lock:
+                entries, self._pending = self._pending, []
+            if not entries:
+                return 0
+
+            rollups = defaultdict(lambda: {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0})
+            for entry in entries:
+                key = (timezone.localdate(entry.created_at), entry.user_id, entry.organization_id, entry.source)
+                rollup = rollups[key]
+                rollup['calls'] += 1
+                rollup['prompt_tokens'] += entry.prompt_tokens
+                rollup['completion_tokens'] += entry.completion_tokens
+
+            try:
+                with transaction.atomic():
+                    TokenUsage.objects.bulk_create(entries, batch_size=500)
+                    for (day, user_id, organization_id, source), totals in rollups.items():
+                        account = {'day': day, 'user_id': user_id, 'organization_id': organization_id, 'source': source}
+                        updated = DailyTokenUsage.objects.filter(**account).update(
+                            **{field: F(field) + value for field, value in totals.items()}
+                        )
+                        if not updated:
+                            DailyTokenUsage.objects.create(**account, **totals)
+            except Exception as e:
+                logger.error(f"Could not write {len(entries)} token usage entries: {str(e)}")
+                with self._lock:
+                    self._pending[:0] = entries
+                return 0
+            return len(entries)
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(settings.TOKEN_LEDGER_FLUSH_SECONDS)
+            close_old_connections()
+            self.flush()
+
+    def pending_tokens(self, day, user_id=None, organization_id=None):
+        """Tokens buffered in this process for an account on day"""
+        with self._lock:
+            return sum(
+                entry.prompt_tokens + entry.completion_tokens for entry in self._pending
+                if timezone.localdate(entry.created_at) == day
+                and (user_id is None or entry.user_id == user_id)
+                and (organization_id is None or entry.organization_id == organization_id)
+            )
+
+
+ledger = TokenLedger()
+atexit.register(ledger.flush)
+
+
+def record_usage(user, organization, source, prompt_tokens, completion_tokens):
+    """Record one call's tokens against user and organization (either may be None)"""
+    ledger.record(user, organization, source, prompt_tokens, completion_tokens)
+
+
+def record_completion(user, organization, source, prompt, text):
+    """Record a call from its prompt and generated text, counted with the model's tokenizer"""
+    ledger.record(user, organization, source, count_tokens(prompt), count_tokens(text))
+
+
+def tokens_used_today(user=None, organization=None):
+    """Prompt plus completion tokens used today by a user or an organization"""
+    day = timezone.localdate()
+    if user is not None:
+        account = {'user_id': user.pk}
+    else:
+        account = {'organization_id': organization.pk}
+    used = DailyTokenUsage.objects.filter(day=day, **account).aggregate(
+        total=Sum(F('prompt_tokens') + F('completion_tokens'))
+    )['total'] or 0
+    return used + ledger.pending_tokens(day, **account)
+
+
+def user_quota(user):
+    try:
+        quota = user.profile.daily_token_quota
+    except ObjectDoesNotExist:
+        quota = None
+    return settings.TOKEN_QUOTA_USER_DAILY if quota is None else quota
+
+
+def organization_quota(organization):
+    quota = organization.daily_token_quota
+    return settings.TOKEN_QUOTA_ORGANIZATION_DAILY if quota is None else quota
+
+
+def check_quota(user=None, organization=None):
+    """
+    Refuse new work for an account that has used its daily tokens.
+
+    Checked before a call, so the call that crosses the quota still
+    completes. A quota of 0 is unlimited.
+
+    Raises:
+        TokenQuotaExceeded: the user's or the organization's quota is used up
+    """
+    user = account_user(user)
+    if user is not None:
+        quota = user_quota(user)
+        if quota and tokens_used_today(user=user) >= quota:
+            raise TokenQuotaExceeded(f"Daily token quota of {quota} used up for {user.username}")
+    if organization is not None:
+        quota = organization_quota(organization)
+        if quota and tokens_used_today(organization=organization) >= quota:
+            raise TokenQuotaExceeded(f"Daily token quota of {quota} used up for {organization.name}")
+
+
+def batch_quota(user=None, organization=None):
+    """
+    check_quota for a batch of files, reading usage at most every TOKEN_QUOTA_CHECK_SECONDS.
+
+    Each check costs two aggregate queries, too many to run per file of a
+    large import. Usage in between checks is not seen, so a batch may run
+    past the quota by that many seconds' worth of tokens; once the quota is
+    found used up every later call raises without querying.
+
+    Returns:
+        callable: raises TokenQuotaExceeded like check_quota
+    """
+    lock = threading.Lock()
+    state = {'checked_at': None, 'exceeded': None}
+
+    def check():
+        with lock:
+            if state['exceeded'] is None:
+                now = time.monotonic()
+                if state['checked_at'] is not None and now - state['checked_at'] < settings.TOKEN_QUOTA_CHECK_SECONDS:
+                    return
+                state['checked_at'] = now
+                try:
+                    check_quota(user, organization)
+                    return
+                except TokenQuotaExceeded as e:
+                    state['exceeded'] = e
+            raise TokenQuotaExceeded(str(state['exceeded']))
+
+    return check
+
+
+def usage_report(user=None, organization=None, days=None):
+    """
+    Token usage of a user or an organization for the usage pages.
+
+    Returns:
+        dict: 'used_today', 'quota' (0 if unlimited), 'remaining' and
+        'percent' of the quota used, 'days' (per-day calls and tokens,
+        newest first), 'by_source' totals for the period and, for an
+        organization, 'by_user' totals
+    """
+    days = days or settings.TOKEN_USAGE_DAYS_SHOWN
+    since = timezone.localdate() - datetime.timedelta(days=days - 1)
+    if user is not None:
+        rows = DailyTokenUsage.objects.filter(user=user, day__gte=since)
+        quota = user_quota(user)
+        used_today = tokens_used_today(user=user)
+    else:
+        rows = DailyTokenUsage.objects.filter(organization=organization, day__gte=since)
+        quota = organization_quota(organization)
+        used_today = tokens_used_today(organization=organization)
+
+    totals = {
+        'calls': Sum('calls'),
+        'prompt_tokens': Sum('prompt_tokens'),
+        'completion_tokens': Sum('completion_tokens'),
+    }
+    report = {
+        'used_today': used_today,
+        'quota': quota,
+        'remaining': max(0, quota - used_today) if quota else None,
+        'percent': min(100, round(100 * used_today / quota)) if quota else None,
+        'days': list(rows.values('day').annotate(**totals).order_by('-day')),
+        'by_source': list(rows.values('source').annotate(**totals).order_by('-prompt_tokens')),
+    }
+    if organization is not None:
+        report['by_user'] = list(rows.values('user__username').annotate(**totals).order_by('-prompt_tokens'))
+    for row in report['days'] + report['by_source'] + report.get('by_user', []):
+        row['total_tokens'] = row['prompt_tokens'] + row['completion_tokens']
+    return report
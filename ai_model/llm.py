@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_llm = None
+_vocab_llm = None
+_llm_load_lock = threading.Lock()
+
+# Seconds the model took to load in this process, None until it is loaded
+load_seconds = None
+
+
+def prompt_lookup_draft(num_pred_tokens=None):
+    """
+    Prompt-lookup draft model, or None when disabled.
+
+    Drafts up to num_pred_tokens (default LLAMA_PROMPT_LOOKUP_TOKENS) by
+    finding the last few generated tokens earlier in the prompt and
+    proposing what followed them there. The model verifies the whole draft
+    in one forward pass, so docs that quote names and signatures from the
+    code decode several tokens per step.
+    """
+    if num_pred_tokens is None:
+        num_pred_tokens = settings.LLAMA_PROMPT_LOOKUP_TOKENS
+    if not num_pred_tokens:
+        return None
+    from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
+
+    return LlamaPromptLookupDecoding(max_ngram_size=settings.LLAMA_PROMPT_LOOKUP_MAX_NGRAM, num_pred_tokens=num_pred_tokens)
+
+
+def create_llm(**kwargs):
+    """Construct a llama model from settings; kwargs override Llama arguments (e.g. n_threads, draft_model)"""
+    from llama_cpp import Llama
+
+    if not kwargs.get('vocab_only'):
+        kwargs.setdefault('draft_model', prompt_lookup_draft())
+    if kwargs.get('draft_model') is not None:
+        # Drafts are verified against the logits of every drafted position
+        kwargs['logits_all'] = True
+    return Llama(model_path=settings.LLAMA_CPP_PATH, n_ctx=settings.LLAMA_N_CTX, **kwargs)
+
+
+def get_llm():
+    """
+    Return the process-wide llama model, loading it on first use.
+
+    Nothing is loaded at import time, so processes that never run inference
+    (migrations, the shell, dashboard-only web workers) never map the GGUF
+    file.
+    """
+    global _llm, load_seconds
+    if _llm is None:
+        with _llm_load_lock:
+            if _llm is None:
+                started = time.monotonic()
+                _llm = create_llm()
+                load_seconds = time.monotonic() - started
+                logger.info(f"Loaded model {settings.LLAMA_CPP_PATH} in {load_seconds:.1f}s")
+    return _llm
+
+
+def get_tokenizer_llm():
+    """
+    Return a model usable for tokenize/detokenize.
+
+    Reuses the full model when this process has loaded it; otherwise loads
+    only the vocabulary, which is fast and small. Processes that send
+    inference to the inference server use this for prompt sizing.
+    """
+    global _vocab_llm
+    if _llm is not None:
+        return _llm
+    if _vocab_llm is None:
+        with _llm_load_lock:
+            if _vocab_llm is None:
+                _vocab_llm = create_llm(vocab_only=True)
+    return _vocab_llm
+
+
+def is_loaded():
+    """True if this process has already loaded the model"""
+    return _llm is not None
+
+
+def warm_up():
+    """
+    Load the model ahead of the first request.
+
+    Call from processes that will run inference, e.g. a gunicorn post_fork
+    hook or the ingestion worker, so the first job does not pay the load.
+
+    Returns:
+        float: seconds the load took (0 if the model was already loaded)
+    """
+    if is_loaded():
+        return 0.0
+    get_llm()
+    return load_seconds
@@ -0,0 +1,79 @@
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ai_model.batching import BatchingEngine
+from message_resource.ai_model_config import AI_PROMPT
+
+
+class Command(BaseCommand):
+    help = "Measure aggregate decoding throughput (tokens/sec) of the batching engine at several batch sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-sizes',
+            default='1,2,4,8',
+            help="Comma-separated batch sizes to measure"
+        )
+        parser.add_argument(
+            '--prompts',
+            type=int,
+            default=8,
+            help="Documentation prompts decoded at each batch size"
+        )
+        parser.add_argument(
+            '--max-tokens',
+            type=int,
+            default=128,
+            help="Tokens generated per prompt"
+        )
+        parser.add_argument(
+            '--file',
+            default=os.path.join(settings.BASE_DIR, 'ai_model', 'views.py'),
+            help="Source file whose documentation prompt is benchmarked"
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=None,
+            help="CPU threads used for decoding"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            batch_sizes = [int(size) for size in options['batch_sizes'].split(',')]
+        except ValueError:
+            raise CommandError("--batch-sizes must be comma-separated integers")
+
+        with open(options['file'], encoding='utf-8', errors='ignore') as f:
+            code = f.read()[:4000]
+        # Distinct prompts, as a real import would send
+        prompts = [AI_PROMPT.getPromptForGenerateDoc(f"# Part {number}\n{code}") for number in range(options['prompts'])]
+
+        self.stdout.write(f"{'batch':>6} {'tokens':>8} {'seconds':>9} {'tokens/sec':>11}")
+        baseline = None
+        for batch_size in batch_sizes:
+            try:
+                engine = BatchingEngine(batch_size, wait_seconds=0.1, n_threads=options['threads'])
+            except Exception as e:
+                raise CommandError(f"Could not create a batching engine of size {batch_size}: {str(e)}")
+            try:
+                started = time.monotonic()
+                futures = [engine.submit(prompt, options['max_tokens']) for prompt in prompts]
+                for future in futures:
+                    future.result()
+                elapsed = time.monotonic() - started
+            finally:
+                engine.close()
+
+            throughput = engine.generated_tokens / elapsed
+            baseline = baseline or throughput
+            self.stdout.write(
+                f"{batch_size:>6} {engine.generated_tokens:>8} {elapsed:>9.1f} {throughput:>11.1f}"
+                f"  ({throughput / baseline:.2f}x)"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            "Set LLAMA_BATCH_SIZE to the smallest size near the peak; larger batches need more KV cache memory"
+        ))
@@ -0,0 +1,160 @@
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ai_model.llm import create_llm, prompt_lookup_draft
+from message_resource.ai_model_config import AI_PROMPT
+from repo2doc_api.file_selection import FileSelector
+from repo2doc_api.prompt_builder import build_doc_prompt
+
+
+def corpus_prompts(root, limit, max_tokens):
+    """
+    Documentation prompts for up to limit source files under root.
+
+    Files are picked by the same selector as ingestion, largest first, and
+    prompted the way the pipeline would (the first chunk of a chunked file).
+    """
+    selector = FileSelector()
+    candidates = []
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for file_name in sorted(filenames):
+            full_path = os.path.join(directory, file_name)
+            path = os.path.relpath(full_path, root).replace(os.sep, '/')
+            size = os.path.getsize(full_path)
+            if selector.skip_reason_for_path(path, size) is None:
+                candidates.append((size, path, full_path))
+
+    prompts = []
+    for size, path, full_path in sorted(candidates, reverse=True):
+        if len(prompts) >= limit:
+            break
+        with open(full_path, 'rb') as f:
+            data = f.read()
+        if not selector.is_selected(path, data):
+            continue
+        plan = build_doc_prompt(data.decode('utf-8', errors='ignore'), max_tokens, path=path)
+        if plan['strategy'] == 'chunk':
+            chunks = plan['chunks']
+            prompt = AI_PROMPT.getPromptForGenerateChunkDoc(chunks[0]['code'], chunks[0]['name'], 1, len(chunks))
+        else:
+            prompt = plan['prompt']
+        prompts.append((path, prompt))
+    return prompts
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure decoding speed (tokens/sec) of documentation generation with and without "
+        "prompt-lookup decoding, on real source files"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=str(settings.BASE_DIR),
+            help="Repository whose source files make up the corpus"
+        )
+        parser.add_argument(
+            '--files',
+            type=int,
+            default=8,
+            help="Source files documented per configuration"
+        )
+        parser.add_argument(
+            '--draft-tokens',
+            default='0,4,10',
+            help="Comma-separated draft lengths to measure; 0 is plain decoding"
+        )
+        parser.add_argument(
+            '--max-tokens',
+            type=int,
+            default=256,
+            help="Tokens generated per file"
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=None,
+            help="CPU threads used for decoding"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            draft_lengths = [int(length) for length in options['draft_tokens'].split(',')]
+        except ValueError:
+            raise CommandError("--draft-tokens must be comma-separated integers")
+
+        prompts = corpus_prompts(options['path'], options['files'], options['max_tokens'])
+        if not prompts:
+            raise CommandError(f"No documentable source files under {options['path']}")
+        self.stdout.write(f"Corpus: {len(prompts)} files from {options['path']}")
+
+        llm_options = {'n_threads': options['threads']} if options['threads'] else {}
+        results = {}
+        for length in draft_lengths:
+            try:
+                llm = create_llm(draft_model=prompt_lookup_draft(length), verbose=False, **llm_options)
+            except Exception as e:
+                raise CommandError(f"Could not load the model with {length} draft tokens: {str(e)}")
+            # Untimed run so page faults and thread start-up do not count against the first configuration
+            llm(prompts[0][1], max_tokens=8, temperature=0)
+            results[length] = [self.decode(llm, prompt, options['max_tokens']) for path, prompt in prompts]
+            del llm
+
+        self.report(prompts, draft_lengths, results)
+
+    def decode(self, llm, prompt, max_tokens):
+        """
+        Generate greedily and time decoding separately from prompt evaluation.
+
+        Returns:
+            dict: 'text', 'tokens' generated and 'decode_seconds' from the
+            first token to the last
+        """
+        llm.reset()
+        pieces = []
+        first_token_at = None
+        for chunk in llm(prompt, max_tokens=max_tokens, temperature=0, stream=True):
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            pieces.append(chunk['choices'][0]['text'])
+        finished_at = time.perf_counter()
+        text = ''.join(pieces)
+        return {
+            'text': text,
+            'tokens': len(llm.tokenize(text.encode('utf-8'), add_bos=False)) if text else 0,
+            'decode_seconds': finished_at - first_token_at if first_token_at else 0.0,
+        }
+
+    def report(self, prompts, draft_lengths, results):
+        def speed(runs):
+            # The first token comes out of prompt evaluation, so it is not part of decoding time
+            tokens = sum(max(0, run['tokens'] - 1) for run in runs)
+            seconds = sum(run['decode_seconds'] for run in runs)
+            return tokens / seconds if seconds else 0.0
+
+        baseline_length = draft_lengths[0]
+        header = ''.join(f"{f'draft {length}':>12}" for length in draft_lengths)
+        self.stdout.write(f"\n{'file':<40}{header}   (decode tokens/sec)")
+        for index, (path, prompt) in enumerate(prompts):
+            row = ''.join(f"{speed([results[length][index]]):>12.1f}" for length in draft_lengths)
+            self.stdout.write(f"{path[-40:]:<40}{row}")
+
+        baseline = speed(results[baseline_length])
+        self.stdout.write(f"\n{'draft':>6} {'tokens':>8} {'seconds':>9} {'tokens/sec':>11} {'speedup':>8} {'same output':>12}")
+        for length in draft_lengths:
+            runs = results[length]
+            throughput = speed(runs)
+            same = sum(run['text'] == base['text'] for run, base in zip(runs, results[baseline_length]))
+            self.stdout.write(
+                f"{length:>6} {sum(run['tokens'] for run in runs):>8} "
+                f"{sum(run['decode_seconds'] for run in runs):>9.1f} {throughput:>11.1f} "
+                f"{throughput / baseline if baseline else 0:>7.2f}x {same:>6}/{len(runs)}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            "Set LLAMA_PROMPT_LOOKUP_TOKENS to the fastest draft length; greedy outputs should match the first column"
+        ))
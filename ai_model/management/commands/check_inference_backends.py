@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ai_model.backends import health_report
+
+
+class Command(BaseCommand):
+    help = "Run the health check of every configured inference backend"
+
+    def handle(self, *args, **options):
+        report = health_report()
+        for name, healthy in report.items():
+            status = self.style.SUCCESS('ok') if healthy else self.style.ERROR('unavailable')
+            self.stdout.write(f"{name}: {status}")
+        if not any(report.values()):
+            raise CommandError("No inference backend is available")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from ai_model.metrics import get_metrics, reset_metrics
+from ai_model.single_flight import single_flight_stats
+
+
+class Command(BaseCommand):
+    help = "Show inference counters shared by this host's processes, including calls saved by coalescing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset every counter')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            reset_metrics()
+            self.stdout.write(self.style.SUCCESS("Reset inference counters"))
+
+        stats = single_flight_stats('inference')
+        self.stdout.write(f"Inference calls executed:  {stats['executed']}")
+        self.stdout.write(f"Inference calls saved:     {stats['coalesced']} ({stats['saved_ratio'] * 100:.1f}%)")
+
+        for name, value in get_metrics().items():
+            if not name.startswith('inference.'):
+                self.stdout.write(f"{name}: {value}")
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ai_model.inference_server import create_server
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the llama model to web and ingestion workers over a Unix socket or HTTP. "
+        "Point INFERENCE_SERVER_URL at the bind address so those workers stop loading the model themselves."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bind',
+            default=settings.INFERENCE_SERVER_BIND,
+            help="unix:///path/to/socket or host:port to listen on"
+        )
+        parser.add_argument(
+            '--instances',
+            type=int,
+            default=settings.INFERENCE_INSTANCES,
+            help="Model instances to load; each serves one request at a time"
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=settings.INFERENCE_THREADS_PER_INSTANCE,
+            help="CPU threads each model instance decodes with"
+        )
+        parser.add_argument(
+            '--queue-size',
+            type=int,
+            default=settings.INFERENCE_QUEUE_SIZE,
+            help="Queued requests beyond this are rejected"
+        )
+
+    def handle(self, *args, **options):
+        if options['instances'] < 1 or options['threads'] < 1:
+            raise CommandError("--instances and --threads must be at least 1")
+
+        self.stdout.write(
+            f"Loading {options['instances']} instance(s) of {settings.LLAMA_CPP_PATH} "
+            f"with {options['threads']} thread(s) each"
+        )
+        try:
+            server = create_server(options['bind'], options['instances'], options['threads'], options['queue_size'])
+        except Exception as e:
+            raise CommandError(f"Could not start the inference server: {str(e)}")
+
+        self.stdout.write(self.style.SUCCESS(f"Inference server listening on {options['bind']}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("Inference server stopping")
+        finally:
+            server.server_close()
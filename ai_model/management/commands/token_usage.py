@@ -0,0 +1,35 @@
+import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from ai_model.ledger import ledger
+from ai_model.models import TokenUsage, DailyTokenUsage
+
+
+class Command(BaseCommand):
+    help = "Show the heaviest token consumers and prune per-call ledger rows past retention"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=1, help='Days of usage to report, including today')
+        parser.add_argument('--top', type=int, default=10, help='Users and organizations to list')
+        parser.add_argument('--prune', action='store_true',
+                            help='Delete per-call rows older than TOKEN_USAGE_RETENTION_DAYS')
+
+    def handle(self, *args, **options):
+        ledger.flush()
+        since = timezone.localdate() - datetime.timedelta(days=options['days'] - 1)
+        rows = DailyTokenUsage.objects.filter(day__gte=since)
+        total = Sum(F('prompt_tokens') + F('completion_tokens'))
+
+        for label, field in (('Users', 'user__username'), ('Organizations', 'organization__name')):
+            self.stdout.write(self.style.SUCCESS(f"{label} since {since}"))
+            top = rows.exclude(**{field: None}).values(field).annotate(tokens=total, calls=Sum('calls'))
+            for row in top.order_by('-tokens')[:options['top']]:
+                self.stdout.write(f"  {row[field]:<30} {row['tokens']:>12} tokens  {row['calls']:>8} calls")
+
+        if options['prune']:
+            cutoff = timezone.now() - datetime.timedelta(days=settings.TOKEN_USAGE_RETENTION_DAYS)
+            deleted, _ = TokenUsage.objects.filter(created_at__lt=cutoff).delete()
+            self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} token usage rows older than {cutoff:%Y-%m-%d}"))
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ai_model.llm import warm_up
+
+
+class Command(BaseCommand):
+    help = "Load the llama model and report how long it takes"
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Loading {settings.LLAMA_CPP_PATH}")
+        try:
+            seconds = warm_up()
+        except Exception as e:
+            raise CommandError(f"Could not load the model: {str(e)}")
+        self.stdout.write(self.style.SUCCESS(f"Model loaded in {seconds:.1f}s"))
@@ -0,0 +1,45 @@
+import logging
+import threading
+from diskcache import Cache
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_metrics_store():
+    """
+    Counters shared by every process on this host.
+
+    Kept in a diskcache store under INFERENCE_METRICS_DIR so web workers,
+    ingestion workers and management commands all see the same totals.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = Cache(settings.INFERENCE_METRICS_DIR)
+    return _store
+
+
+def incr_metric(name, delta=1):
+    """Atomically add delta to a counter; metrics never break the request they describe"""
+    try:
+        get_metrics_store().incr(name, delta, default=0)
+    except Exception as e:
+        logger.debug(f"Could not record metric {name}: {str(e)}")
+
+
+def get_metrics(prefix=''):
+    """Counters whose name starts with prefix, keyed by name"""
+    store = get_metrics_store()
+    return {key: store.get(key, 0) for key in sorted(store.iterkeys()) if key.startswith(prefix)}
+
+
+def reset_metrics(prefix=''):
+    store = get_metrics_store()
+    for key in list(store.iterkeys()):
+        if key.startswith(prefix):
+            store.delete(key)
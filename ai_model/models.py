@@ -1,3 +1,57 @@
 from django.db import models
+from django.contrib.auth.models import User
+from django.utils import timezone
 
-# Create your models here.
+
+class TokenUsage(models.Model):
+    """One inference call's token cost, written in batches by ai_model.ledger"""
+
+    SOURCE_CHOICES = [
+        ('upload', 'Uploaded ZIP'),
+        ('github', 'GitHub import'),
+        ('webhook', 'Webhook sync'),
+        ('chat', 'Chat'),
+        ('api', 'Model API'),
+        ('docs_api', 'Documentation API'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='token_usage')
+    organization = models.ForeignKey('organization.Organization', on_delete=models.SET_NULL, null=True, blank=True, related_name='token_usage')
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    prompt_tokens = models.IntegerField(default=0)
+    completion_tokens = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.source}: {self.prompt_tokens}+{self.completion_tokens} tokens"
+
+
+class DailyTokenUsage(models.Model):
+    """
+    Per-day rollup of TokenUsage by user, organization and source.
+
+    Quotas and usage pages read these rows instead of summing every call.
+    Concurrent flushes may write more than one row per key, so readers
+    always aggregate.
+    """
+
+    day = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='daily_token_usage')
+    organization = models.ForeignKey('organization.Organization', on_delete=models.SET_NULL, null=True, blank=True, related_name='daily_token_usage')
+    source = models.CharField(max_length=10, choices=TokenUsage.SOURCE_CHOICES)
+    calls = models.IntegerField(default=0)
+    prompt_tokens = models.BigIntegerField(default=0)
+    completion_tokens = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day']
+        indexes = [
+            models.Index(fields=['user', 'day']),
+            models.Index(fields=['organization', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.source}: {self.prompt_tokens + self.completion_tokens} tokens"
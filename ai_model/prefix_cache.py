@@ -0,0 +1,100 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+from django.conf import settings
+from message_resource.ai_model_config import AI_PROMPT
+
+logger = logging.getLogger(__name__)
+
+# Constant prompt prefixes whose evaluated state is kept and reused
+PROMPT_PREFIXES = [AI_PROMPT.GENERATE_DOC_PROMPT_PREFIX]
+
+# LlamaState after each prefix, keyed by prefix_state_key
+_prefix_states = {}
+_prefix_states_lock = threading.Lock()
+
+
+def prefix_state_key(prefix):
+    """
+    States are only valid for the model, context size and logits layout they were evaluated with.
+
+    Prompt-lookup decoding keeps the logits of every position, which changes
+    the saved state, so it gets states of its own.
+    """
+    logits = 'all' if settings.LLAMA_PROMPT_LOOKUP_TOKENS else 'last'
+    key = f"{settings.LLAMA_CPP_PATH}:{settings.LLAMA_N_CTX}:{logits}:{prefix}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def get_prefix_state(llm, prefix):
+    """
+    Return the model state after evaluating prefix.
+
+    The state comes from memory, then from LLAMA_PREFIX_STATE_PATH, and is
+    only evaluated on llm (and saved to disk for the next restart) when
+    neither has it. The caller must hold llm's lock.
+    """
+    key = prefix_state_key(prefix)
+    with _prefix_states_lock:
+        state = _prefix_states.get(key)
+    if state is not None:
+        return state
+
+    path = os.path.join(settings.LLAMA_PREFIX_STATE_PATH, f'{key}.state')
+    try:
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        logger.info(f"Loaded {state.n_tokens}-token prompt prefix state from {path}")
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+        started = time.monotonic()
+        llm.reset()
+        llm.eval(llm.tokenize(prefix.encode('utf-8')))
+        state = llm.save_state()
+        logger.info(f"Evaluated {state.n_tokens}-token prompt prefix in {time.monotonic() - started:.1f}s")
+
+        os.makedirs(settings.LLAMA_PREFIX_STATE_PATH, exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not save prompt prefix state: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    with _prefix_states_lock:
+        _prefix_states[key] = state
+    return state
+
+
+def restore_prefix(llm, prompt):
+    """
+    Put llm in the state after prompt's constant prefix, if it has one.
+
+    llama-cpp only evaluates the part of a prompt that differs from the
+    tokens already in its KV cache, so the following llm(prompt) call
+    evaluates just the code. Nothing is loaded when llm already holds the
+    prefix, e.g. from the previous file. The caller must hold llm's lock.
+
+    Returns:
+        bool: True if a saved state was loaded
+    """
+    prefix = next((prefix for prefix in PROMPT_PREFIXES if prompt.startswith(prefix)), None)
+    if prefix is None:
+        return False
+
+    try:
+        state = get_prefix_state(llm, prefix)
+        if llm.n_tokens >= state.n_tokens and (llm.input_ids[:state.n_tokens] == state.input_ids[:state.n_tokens]).all():
+            return False
+        llm.load_state(state)
+        return True
+    except Exception as e:
+        # Prefix reuse is an optimisation; the prompt is simply evaluated in full
+        logger.warning(f"Could not restore prompt prefix state: {str(e)}")
+        return False
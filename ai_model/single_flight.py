@@ -0,0 +1,71 @@
+import hashlib
+import threading
+from concurrent.futures import Future
+from .metrics import incr_metric, get_metrics
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time; concurrent callers share its outcome.
+
+    The first caller for a key (the leader) runs the function. Callers that
+    arrive while it runs wait for it and receive the same result or
+    exception instead of repeating the work. Executed and coalesced calls
+    are counted under '<name>.executed' and '<name>.coalesced'.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            incr_metric(f'{self.name}.coalesced')
+            return future.result()
+
+        incr_metric(f'{self.name}.executed')
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+def prompt_key(*parts):
+    """Hash identifying a generation request by everything that affects its output"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8', errors='surrogatepass'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def single_flight_stats(name):
+    """Executed and coalesced call counts of a SingleFlight across processes, and the share saved"""
+    metrics = get_metrics(f'{name}.')
+    executed = metrics.get(f'{name}.executed', 0)
+    coalesced = metrics.get(f'{name}.coalesced', 0)
+    total = executed + coalesced
+    return {
+        'executed': executed,
+        'coalesced': coalesced,
+        'saved_ratio': coalesced / total if total else 0.0,
+    }
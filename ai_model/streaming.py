@@ -0,0 +1,68 @@
+import json
+import logging
+import time
+from django.http import StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+
+def wants_stream(request):
+    """True if a DRF request opted into a text/event-stream response"""
+    if 'text/event-stream' in request.META.get('HTTP_ACCEPT', ''):
+        return True
+    return request.data.get('stream') in (True, 'true', '1', 1)
+
+
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events):
+    """
+    Serve an iterator of SSE strings as text/event-stream.
+
+    When the client disconnects the WSGI server closes the response, which
+    closes the iterator and, through it, the generation feeding it.
+    """
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream until it completes
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def completion_events(pieces, result_key='response', summary=None, on_complete=None):
+    """
+    SSE events for a streamed completion.
+
+    Emits a 'token' event per piece of text, then a 'done' event with the
+    full text under result_key, the number of pieces and the elapsed
+    seconds (plus any summary fields), or an 'error' event if generation
+    failed. on_complete, if given, receives the text once generation
+    stops: the full text before 'done', or whatever was generated before
+    an error or a client disconnect, so a stream cut short is still billed.
+    """
+    started = time.monotonic()
+    text = []
+    try:
+        for piece in pieces:
+            text.append(piece)
+            yield sse_event('token', {'text': piece})
+    except Exception as e:
+        logger.error(f"Streamed generation failed: {str(e)}")
+        yield sse_event('error', {'error': str(e)})
+        return
+    finally:
+        # Reached with GeneratorExit when the client disconnects mid-stream
+        if hasattr(pieces, 'close'):
+            pieces.close()
+        if on_complete and text:
+            on_complete(''.join(text))
+
+    yield sse_event('done', {
+        result_key: ''.join(text),
+        'tokens': len(text),
+        'seconds': round(time.monotonic() - started, 2),
+        **(summary or {}),
+    })
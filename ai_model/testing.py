@@ -0,0 +1,17 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from diskcache import Cache
+
+
+def isolate_metrics(test_case):
+    """Count metrics in a throwaway store for the rest of test_case instead of the host's shared one"""
+    work_dir = tempfile.mkdtemp(prefix='repo2doc-metrics-')
+    test_case.addCleanup(shutil.rmtree, work_dir, ignore_errors=True)
+    store = Cache(work_dir)
+    test_case.addCleanup(store.close)
+    patcher = mock.patch('ai_model.metrics._store', store)
+    patcher.start()
+    test_case.addCleanup(patcher.stop)
+    return store
@@ -1,3 +1,542 @@
-from django.test import TestCase
+import datetime
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from organization.models import Organization
+from users.models import Profile
+
+from .admission import AdmissionController, AdmissionRejected, AdmittedStream, rejected_response
+from . import backends
+from .backends import InferenceRouter, get_backend
+from .backends.base import BackendUnavailable, InferenceBackend
+from .backends.llama_cpp import LlamaCppBackend
+from .backends.ollama import OllamaBackend
+from .ledger import TokenLedger, TokenQuotaExceeded, batch_quota, check_quota, record_usage, usage_report
+from .metrics import get_metrics
+from .models import DailyTokenUsage, TokenUsage
+from .single_flight import SingleFlight, single_flight_stats
+from .testing import isolate_metrics
+from .views import INFERENCE_ERROR_MESSAGE, ai_model_api, generate_ai_response
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for condition")
+        time.sleep(0.01)
+
+
+class MetricsTestCase(SimpleTestCase):
+    """Counts metrics in a throwaway store instead of the host's shared one"""
+
+    def setUp(self):
+        isolate_metrics(self)
+
+
+class ScriptedBackend(InferenceBackend):
+    """Streams pieces, raising error (if any) after the first fail_after of them"""
+
+    def __init__(self, name, pieces=('ok',), error=None, fail_after=0):
+        super().__init__(name)
+        self.pieces = pieces
+        self.error = error
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def stream(self, prompt, max_tokens, stop=None, cancel_event=None):
+        self.calls += 1
+        for index, piece in enumerate(self.pieces):
+            if self.error is not None and index == self.fail_after:
+                raise self.error
+            yield piece
+        if self.error is not None and self.fail_after >= len(self.pieces):
+            raise self.error
+
+
+@override_settings(INFERENCE_HEALTH_CHECK_INTERVAL=60)
+class InferenceRouterTests(SimpleTestCase):
+    def router(self, *backend_list):
+        for backend in backend_list:
+            self.addCleanup(backends._down_until.pop, backend.name, None)
+        return InferenceRouter(list(backend_list))
+
+    def test_unavailable_backend_fails_over_and_is_skipped_until_its_interval_passes(self):
+        primary = ScriptedBackend('test-primary', error=BackendUnavailable("connection refused"))
+        secondary = ScriptedBackend('test-secondary', pieces=('from ', 'secondary'))
+        router = self.router(primary, secondary)
+
+        self.assertEqual(router.complete('prompt', 8), 'from secondary')
+        self.assertEqual(router.complete('prompt', 8), 'from secondary')
+        self.assertEqual((primary.calls, secondary.calls), (1, 2))
+
+    def test_generation_errors_are_raised_without_failing_over(self):
+        primary = ScriptedBackend('test-primary', error=ValueError("prompt too long"))
+        secondary = ScriptedBackend('test-secondary')
+        router = self.router(primary, secondary)
+
+        with self.assertRaises(ValueError):
+            router.complete('prompt', 8)
+        self.assertEqual(secondary.calls, 0)
+        self.assertNotIn('test-primary', backends._down_until)
+
+    def test_stream_fails_over_only_before_its_first_piece(self):
+        secondary = ScriptedBackend('test-secondary', pieces=('b',))
+        router = self.router(ScriptedBackend('test-primary', error=BackendUnavailable("overloaded")), secondary)
+        self.assertEqual(list(router.stream('prompt', 8)), ['b'])
+
+        router = self.router(
+            ScriptedBackend('test-broken', pieces=('a', 'b'), error=BackendUnavailable("dropped"), fail_after=1),
+            ScriptedBackend('test-spare', pieces=('c',)),
+        )
+        pieces = []
+        with self.assertRaises(BackendUnavailable):
+            for piece in router.stream('prompt', 8):
+                pieces.append(piece)
+        self.assertEqual(pieces, ['a'])
+
+    def test_every_backend_unavailable_raises_backend_unavailable(self):
+        router = self.router(
+            ScriptedBackend('test-primary', error=BackendUnavailable("down")),
+            ScriptedBackend('test-secondary', error=BackendUnavailable("down too")),
+        )
+
+        with self.assertRaisesMessage(BackendUnavailable, 'down; down too'):
+            router.complete('prompt', 8)
+
+    @override_settings(LLAMA_CPP_PATH='/nonexistent/model.gguf', LLAMA_BATCH_SIZE=1)
+    def test_llama_model_that_cannot_load_fails_over(self):
+        secondary = ScriptedBackend('test-secondary', pieces=('fallback',))
+        router = self.router(LlamaCppBackend('test-llama'), secondary)
+
+        self.assertEqual(router.complete('prompt', 8), 'fallback')
+        self.assertEqual(list(router.stream('prompt', 8)), ['fallback'])
+        self.assertIn('test-llama', backends._down_until)
+
+    def test_model_id_names_every_backend_model(self):
+        router = self.router(ScriptedBackend('test-primary'), get_backend('fake'))
+
+        self.assertEqual(router.model_id(), 'test-primary+fake')
+        self.assertEqual(OllamaBackend('test-ollama', model='codellama:13b').model_id(), 'ollama:codellama:13b')
+
+
+class LlamaCppWarmUpTests(SimpleTestCase):
+    @override_settings(LLAMA_BATCH_SIZE=4)
+    @mock.patch('ai_model.backends.llama_cpp.warm_up')
+    @mock.patch('ai_model.backends.llama_cpp.get_tokenizer_llm')
+    @mock.patch('ai_model.backends.llama_cpp.get_batching_engine')
+    def test_batching_warms_the_engine_not_a_second_model(self, get_batching_engine, get_tokenizer_llm, warm_up):
+        LlamaCppBackend('test-llama').warm_up()
+
+        get_batching_engine.assert_called_once_with()
+        get_tokenizer_llm.assert_called_once_with()
+        warm_up.assert_not_called()
+
+    @override_settings(LLAMA_BATCH_SIZE=1)
+    @mock.patch('ai_model.backends.llama_cpp.warm_up', return_value=2.5)
+    @mock.patch('ai_model.backends.llama_cpp.get_batching_engine')
+    def test_without_batching_the_model_is_loaded(self, get_batching_engine, warm_up):
+        self.assertEqual(LlamaCppBackend('test-llama').warm_up(), 2.5)
+        get_batching_engine.assert_not_called()
+
+
+class SingleFlightTests(MetricsTestCase):
+    def run_concurrently(self, count, func):
+        results = [None] * count
+
+        def call(index):
+            try:
+                results[index] = func()
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=call, args=(index,)) for index in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    @override_settings(INFERENCE_BACKENDS=['fake'], INFERENCE_ROUTES={}, INFERENCE_SINGLE_FLIGHT=True,
+                       FAKE_LLM_LATENCY_SECONDS=0.3, FAKE_LLM_TOKENS_PER_SECOND=0)
+    def test_concurrent_identical_prompts_call_the_backend_once(self):
+        fake = get_backend('fake')
+        fake.reset_stats()
+
+        threads, results = self.run_concurrently(5, lambda: generate_ai_response('Document this', 8, raise_errors=True))
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(fake.calls, 1)
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(single_flight_stats('inference'), {'executed': 1, 'coalesced': 4, 'saved_ratio': 0.8})
+
+    def test_error_reaches_every_waiter(self):
+        flight = SingleFlight('test')
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise ValueError("model crashed")
+
+        threads, results = self.run_concurrently(4, lambda: flight.do('key', fail))
+        wait_until(lambda: get_metrics('test.').get('test.coalesced') == 3)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([type(result) for result in results], [ValueError] * 4)
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_key_is_released_after_the_call(self):
+        flight = SingleFlight('test')
+        calls = []
+
+        def work():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(flight.do('key', work), 1)
+        self.assertEqual(flight.in_flight(), 0)
+        self.assertEqual(flight.do('key', work), 2)
+
+        with self.assertRaises(ValueError):
+            flight.do('key', lambda: int('not a number'))
+        self.assertEqual(flight.do('key', work), 3)
+
+    def test_different_keys_are_not_coalesced(self):
+        flight = SingleFlight('test')
+        release = threading.Event()
+
+        threads, results = self.run_concurrently(1, lambda: flight.do('a', lambda: release.wait(5) and 'a'))
+        wait_until(lambda: flight.in_flight() == 1)
+        self.assertEqual(flight.do('b', lambda: 'b'), 'b')
+        release.set()
+        threads[0].join()
+
+        self.assertEqual(results, ['a'])
+        self.assertEqual(single_flight_stats('test')['coalesced'], 0)
+
+
+class AdmissionControllerTests(MetricsTestCase):
+    def queue(self, controller, route, admitted, errors, weight=1):
+        """Start a request on route in the background; returns once it is waiting for a slot"""
+        def request():
+            try:
+                ticket = controller.acquire(route, weight=weight)
+            except AdmissionRejected as e:
+                errors.append((route, e))
+                return
+            admitted.append(route)
+            ticket.release()
+
+        queued = controller.snapshot()['queued']
+        thread = threading.Thread(target=request)
+        thread.start()
+        wait_until(lambda: controller.snapshot()['queued'] == queued + 1)
+        return thread
+
+    def test_waiters_are_admitted_by_priority_then_arrival(self):
+        controller = AdmissionController(slots=1, queue_size=8, max_wait=5)
+        ticket = controller.acquire('default')
+        admitted, errors = [], []
+
+        threads = [self.queue(controller, route, admitted, errors) for route in ('docs', 'default', 'chat', 'docs')]
+        self.assertEqual(controller.snapshot()['queued_by_route'], {'docs': 2, 'default': 1, 'chat': 1})
+        ticket.release()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(admitted, ['chat', 'default', 'docs', 'docs'])
+        self.assertEqual(errors, [])
+        self.assertEqual(controller.snapshot()['active'], 0)
+
+    def test_full_queue_rejects_with_429_and_retry_after(self):
+        controller = AdmissionController(slots=1, queue_size=1, max_wait=5)
+        ticket = controller.acquire('default')
+        admitted, errors = [], []
+        thread = self.queue(controller, 'default', admitted, errors)
+
+        with self.assertRaises(AdmissionRejected) as rejected:
+            controller.acquire('docs')
+        self.assertEqual(rejected.exception.status_code, 429)
+        self.assertGreaterEqual(rejected.exception.retry_after, 1)
+
+        response = rejected_response(rejected.exception)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], str(rejected.exception.retry_after))
+
+        ticket.release()
+        thread.join()
+        self.assertEqual(admitted, ['default'])
+
+    def test_higher_priority_request_displaces_the_lowest_waiter(self):
+        controller = AdmissionController(slots=1, queue_size=1, max_wait=5)
+        ticket = controller.acquire('default')
+        admitted, errors = [], []
+        displaced = self.queue(controller, 'docs', admitted, errors)
+
+        chat = threading.Thread(target=lambda: controller.acquire('chat').release())
+        chat.start()
+        displaced.join()
+        self.assertEqual([(route, error.status_code) for route, error in errors], [('docs', 429)])
+
+        ticket.release()
+        chat.join()
+        self.assertEqual(controller.snapshot()['active'], 0)
+
+    def test_wait_past_max_wait_is_rejected_with_503(self):
+        controller = AdmissionController(slots=1, queue_size=4, max_wait=0.1)
+        ticket = controller.acquire('default')
+
+        with self.assertRaises(AdmissionRejected) as rejected:
+            controller.acquire('chat')
+        self.assertEqual(rejected.exception.status_code, 503)
+        self.assertGreaterEqual(rejected.exception.retry_after, 1)
+        self.assertEqual(controller.snapshot()['queued'], 0)
+        ticket.release()
+
+    def test_ticket_is_released_when_the_request_raises(self):
+        controller = AdmissionController(slots=1, queue_size=4, max_wait=0.1)
+
+        with self.assertRaises(ValueError):
+            with controller.acquire('default'):
+                raise ValueError("inference failed")
+        self.assertEqual(controller.snapshot()['active'], 0)
+
+        def failing_events():
+            yield 'token'
+            raise ValueError("stream broke")
+
+        stream = AdmittedStream(failing_events(), controller.acquire('default'))
+        with self.assertRaises(ValueError):
+            list(stream)
+        self.assertEqual(controller.snapshot()['active'], 0)
+
+        # A streaming response that is never iterated still gives its slot back when closed
+        AdmittedStream(failing_events(), controller.acquire('default')).close()
+        self.assertEqual(controller.snapshot()['active'], 0)
+
+    def test_weighted_ticket_holds_that_many_slots(self):
+        controller = AdmissionController(slots=4, queue_size=4, max_wait=5)
+        batch = controller.acquire('docs', weight=3)
+        single = controller.acquire('default')
+        self.assertEqual(controller.snapshot()['active'], 4)
+
+        admitted, errors = [], []
+        # The second batch waits for three free slots and holds back the request queued behind it
+        threads = [
+            self.queue(controller, 'docs', admitted, errors, weight=3),
+            self.queue(controller, 'docs', admitted, errors),
+        ]
+        single.release()
+        self.assertEqual(controller.snapshot()['queued'], 2)
+
+        batch.release()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(controller.snapshot()['active'], 0)
+
+    def test_weight_is_capped_at_the_slot_count(self):
+        controller = AdmissionController(slots=2, queue_size=4, max_wait=0.1)
+
+        ticket = controller.acquire('docs', weight=10)
+        self.assertEqual(controller.snapshot()['active'], 2)
+        ticket.release()
+        self.assertEqual(controller.snapshot()['active'], 0)
+
+    def test_rejections_are_counted_outside_the_lock(self):
+        controller = AdmissionController(slots=1, queue_size=0, max_wait=5)
+        ticket = controller.acquire('default')
+        locked = []
+
+        with mock.patch('ai_model.admission.incr_metric', side_effect=lambda name: locked.append(controller._lock.locked())):
+            with self.assertRaises(AdmissionRejected):
+                controller.acquire('default')
+        self.assertEqual(locked, [False])
+        ticket.release()
+
+    def test_release_is_idempotent(self):
+        controller = AdmissionController(slots=2, queue_size=4, max_wait=0.1)
+        ticket = controller.acquire('default')
+        controller.acquire('default')
+
+        ticket.release()
+        ticket.release()
+        self.assertEqual(controller.snapshot()['active'], 1)
+
+    def test_endpoint_answers_429_with_retry_after_when_the_queue_is_full(self):
+        controller = AdmissionController(slots=1, queue_size=0, max_wait=5)
+        ticket = controller.acquire('default')
+        request = APIRequestFactory().post('/ai_model/', {'prompt': 'Hello'}, format='json')
+
+        with mock.patch('ai_model.views.get_admission_controller', return_value=controller):
+            response = ai_model_api(request)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], str(response.data['retry_after']))
+        ticket.release()
+
+
+class LedgerTestCase(TestCase):
+    """Records usage in a ledger of its own, written only when the test flushes it"""
+
+    def setUp(self):
+        isolate_metrics(self)
+        overrides = override_settings(TOKEN_LEDGER_FLUSH_SECONDS=3600, TOKEN_LEDGER_BATCH_SIZE=100)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.ledger = TokenLedger()
+        patcher = mock.patch('ai_model.ledger.ledger', self.ledger)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create(username='user')
+        self.organization = Organization.objects.create(name='org', creator=self.user)
+
+
+class TokenLedgerTests(LedgerTestCase):
+    def test_flush_writes_calls_and_rolls_them_up_per_day_account_and_source(self):
+        record_usage(self.user, None, 'chat', 10, 5)
+        record_usage(self.user, None, 'chat', 20, 7)
+        record_usage(self.user, self.organization, 'github', 100, 40)
+
+        self.assertEqual(self.ledger.flush(), 3)
+        self.assertEqual(TokenUsage.objects.count(), 3)
+        self.assertEqual(
+            set(DailyTokenUsage.objects.values_list('user', 'organization', 'source', 'calls', 'prompt_tokens', 'completion_tokens')),
+            {(self.user.pk, None, 'chat', 2, 30, 12), (self.user.pk, self.organization.pk, 'github', 1, 100, 40)}
+        )
+
+        # A later flush adds to the day's existing rollup row
+        record_usage(self.user, None, 'chat', 1, 1)
+        self.ledger.flush()
+        rollup = DailyTokenUsage.objects.get(source='chat')
+        self.assertEqual((rollup.calls, rollup.prompt_tokens, rollup.completion_tokens), (3, 31, 13))
+
+    def test_calls_that_cost_no_tokens_are_not_recorded(self):
+        record_usage(self.user, None, 'chat', 0, 0)
+
+        self.assertEqual(self.ledger.flush(), 0)
+        self.assertFalse(TokenUsage.objects.exists())
+
+    def test_failed_write_keeps_entries_for_the_next_flush(self):
+        record_usage(self.user, None, 'chat', 10, 5)
+
+        with mock.patch.object(TokenUsage.objects, 'bulk_create', side_effect=RuntimeError("database is locked")):
+            self.assertEqual(self.ledger.flush(), 0)
+        self.assertEqual(self.ledger.flush(), 1)
+        self.assertEqual(DailyTokenUsage.objects.get().calls, 1)
+
+    def test_usage_report_totals_the_rollup(self):
+        record_usage(self.user, None, 'chat', 30, 10)
+        record_usage(self.user, None, 'upload', 50, 10)
+        self.ledger.flush()
+        DailyTokenUsage.objects.create(
+            day=timezone.localdate() - datetime.timedelta(days=1), user=self.user, source='chat',
+            calls=1, prompt_tokens=5, completion_tokens=5
+        )
+
+        with override_settings(TOKEN_QUOTA_USER_DAILY=200):
+            report = usage_report(user=self.user)
+
+        self.assertEqual((report['used_today'], report['quota'], report['remaining'], report['percent']), (100, 200, 100, 50))
+        self.assertEqual([day['total_tokens'] for day in report['days']], [100, 10])
+        self.assertEqual({row['source']: row['total_tokens'] for row in report['by_source']}, {'chat': 50, 'upload': 60})
+
+
+class TokenQuotaTests(LedgerTestCase):
+    @override_settings(TOKEN_QUOTA_USER_DAILY=100)
+    def test_user_over_quota_is_refused_counting_unflushed_usage(self):
+        record_usage(self.user, None, 'chat', 60, 30)
+        check_quota(self.user)
+
+        record_usage(self.user, None, 'chat', 5, 5)
+        with self.assertRaises(TokenQuotaExceeded) as exceeded:
+            check_quota(self.user)
+        self.assertEqual(exceeded.exception.status_code, 429)
+        self.assertGreaterEqual(exceeded.exception.retry_after, 1)
+
+        # Flushed usage counts the same as buffered usage
+        self.ledger.flush()
+        with self.assertRaises(TokenQuotaExceeded):
+            check_quota(self.user)
+
+    @override_settings(TOKEN_QUOTA_USER_DAILY=100)
+    def test_profile_quota_overrides_the_default_and_zero_is_unlimited(self):
+        profile, _ = Profile.objects.get_or_create(user=self.user)
+        profile.daily_token_quota = 1000
+        profile.save()
+        record_usage(self.user, None, 'chat', 500, 0)
+        check_quota(User.objects.get(pk=self.user.pk))
+
+        profile.daily_token_quota = 0
+        profile.save()
+        record_usage(self.user, None, 'chat', 5000, 0)
+        check_quota(User.objects.get(pk=self.user.pk))
+
+    @override_settings(TOKEN_QUOTA_USER_DAILY=0, TOKEN_QUOTA_ORGANIZATION_DAILY=100)
+    def test_organization_quota_counts_every_member(self):
+        other = User.objects.create(username='other')
+        record_usage(self.user, self.organization, 'github', 60, 0)
+        record_usage(other, self.organization, 'github', 40, 0)
+
+        check_quota(self.user)
+        with self.assertRaises(TokenQuotaExceeded):
+            check_quota(self.user, self.organization)
+
+    @override_settings(TOKEN_QUOTA_USER_DAILY=100, TOKEN_QUOTA_CHECK_SECONDS=3600)
+    def test_batch_quota_reads_usage_once_per_interval(self):
+        check = batch_quota(self.user)
+        check()
+        record_usage(self.user, None, 'github', 200, 0)
+
+        # Usage since the last check is not seen until the interval passes
+        check()
+        with override_settings(TOKEN_QUOTA_CHECK_SECONDS=0):
+            with self.assertRaises(TokenQuotaExceeded):
+                check()
+        with mock.patch('ai_model.ledger.check_quota') as checked:
+            with self.assertRaises(TokenQuotaExceeded):
+                check()
+        checked.assert_not_called()
+
+
+@override_settings(
+    INFERENCE_BACKENDS=['fake'], INFERENCE_ROUTES={}, INFERENCE_SINGLE_FLIGHT=False,
+    FAKE_LLM_LATENCY_SECONDS=0, FAKE_LLM_TOKENS_PER_SECOND=0, TOKEN_QUOTA_USER_DAILY=0,
+)
+class ModelApiBillingTests(LedgerTestCase):
+    def post(self, data):
+        request = APIRequestFactory().post('/ai_model/', data, format='json')
+        force_authenticate(request, user=self.user)
+        return ai_model_api(request)
+
+    def test_successful_call_is_billed(self):
+        response = self.post({'prompt': 'Hello', 'max_tokens': 4})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.ledger.flush(), 1)
+
+    def test_failed_call_is_not_billed(self):
+        with mock.patch('ai_model.views.get_router', side_effect=BackendUnavailable("no backend")):
+            response = self.post({'prompt': 'Hello'})
+
+        self.assertEqual(response.data['response'], INFERENCE_ERROR_MESSAGE)
+        self.assertEqual(self.ledger.flush(), 0)
+
+    def test_stream_cut_short_by_a_disconnect_is_billed_for_what_was_generated(self):
+        response = self.post({'prompt': 'Hello', 'max_tokens': 20, 'stream': True})
+        events = iter(response.streaming_content)
+        next(events)
+        next(events)
+        response.close()
+
+        usage = self.ledger._pending
+        self.assertEqual(len(usage), 1)
+        self.assertGreater(usage[0].completion_tokens, 0)
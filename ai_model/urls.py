@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import ai_model_api
+from .views import ai_model_api, admission_status
 
 urlpatterns = [
     path('api/', ai_model_api, name='ai_model_api'),
+    path('admission/', admission_status, name='admission_status'),
 ]
\ No newline at end of file
@@ -5,39 +5,77 @@ import logging
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from llama_cpp import Llama
+from .backends import get_router
+from .single_flight import SingleFlight, prompt_key
+from .admission import get_admission_controller, AdmissionRejected, AdmittedStream, rejected_response
+from .ledger import check_quota, record_completion
+from .streaming import wants_stream, sse_response, completion_events
 
 
 logger = logging.getLogger(__name__)
 
-llm = Llama(model_path=settings.LLAMA_CPP_PATH, n_ctx=4096)
+# Concurrent identical prompts, e.g. the same file from two imports, share one generation
+inference_flight = SingleFlight('inference')
 
+INFERENCE_ERROR_MESSAGE = "I encountered an error processing your request. Please try again later."
 
-def generate_ai_response(prompt, max_tokens):
+
+def generate_ai_response(prompt, max_tokens, raise_errors=False, cancel_event=None, route='default'):
     """
     Generates a response from the AI language model using the provided prompt.
     
-    This function uses llama-cpp-python to directly interact with the Llama model.
+    The prompt goes to the inference backends configured for route (see
+    ai_model.backends), failing over to the next backend if one is down.
+    While a prompt is being generated, identical requests wait for and
+    share its result rather than running inference again.
     
     Args:
         prompt (str): The input prompt for the language model
         max_tokens (int): Maximum number of tokens to generate in response
+        raise_errors (bool): Re-raise inference errors instead of returning
+            a user-facing error message
+        cancel_event (threading.Event): Optional; setting it cancels the request
+        route (str): Key of INFERENCE_ROUTES selecting the backends to use
         
     Returns:
         str: The generated text response from the language model
     """
     try:
-        output = llm(prompt, max_tokens=max_tokens, stop=["</s>"])
-        
-        # Extract text from output
-        generated_text = output["choices"][0]["text"]
+        router = get_router(route)
+        def complete():
+            return router.complete(prompt, max_tokens, stop=["</s>"], cancel_event=cancel_event)
+
+        # A cancellable request must not hand its cancellation to other callers
+        if settings.INFERENCE_SINGLE_FLIGHT and cancel_event is None:
+            generated_text = inference_flight.do(prompt_key(router.name, max_tokens, prompt), complete)
+        else:
+            generated_text = complete()
         
         logger.info(f"Generated response of length: {len(generated_text)} characters")
         return generated_text
     except Exception as e:
         print(e)
         logger.error(f"Error in LLM processing: {str(e)}")
-        return "I encountered an error processing your request. Please try again later."
+        if raise_errors:
+            raise
+        return INFERENCE_ERROR_MESSAGE
+
+
+def stream_ai_response(prompt, max_tokens, cancel_event=None, route='default'):
+    """
+    Stream the model's response to prompt as it is generated.
+
+    Uses the same backends as generate_ai_response. Closing the generator
+    (e.g. when an HTTP client disconnects) stops generation.
+
+    Yields:
+        str: pieces of generated text, usually one token each
+
+    Raises:
+        Exception: if inference fails
+    """
+    yield from get_router(route).stream(prompt, max_tokens, stop=["</s>"], cancel_event=cancel_event)
+
 
 @api_view(['POST'])
 def ai_model_api(request):
@@ -47,9 +85,13 @@ def ai_model_api(request):
     Expects a JSON payload with:
     - prompt: The text prompt to process
     - max_tokens: (Optional) Maximum tokens to generate
+    - stream: (Optional) Stream tokens as server-sent events
     
     Returns:
-    - response: The generated AI response
+    - response: The generated AI response, or with stream a 'token' event
+      per token and a final 'done' event carrying the response
+    - 429 or 503 with Retry-After when inference is at capacity or the
+      caller's daily token quota is used up
     """
     prompt = request.data.get('prompt')
     max_tokens = request.data.get('max_tokens', settings.MAX_TOKENS)
@@ -60,6 +102,39 @@ def ai_model_api(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    response_text = generate_ai_response(prompt, max_tokens)
+    try:
+        check_quota(request.user)
+        ticket = get_admission_controller().acquire('default')
+    except AdmissionRejected as e:
+        return rejected_response(e)
+
+    def record(text):
+        record_completion(request.user, None, 'api', prompt, text)
+
+    if wants_stream(request):
+        events = completion_events(stream_ai_response(prompt, max_tokens), on_complete=record)
+        return sse_response(AdmittedStream(events, ticket))
+
+    try:
+        with ticket:
+            response_text = generate_ai_response(prompt, max_tokens, raise_errors=True)
+    except Exception:
+        # A failed call is not billed
+        return Response({"response": INFERENCE_ERROR_MESSAGE})
+    record(response_text)
     
     return Response({"response": response_text})
+
+
+@api_view(['GET'])
+def admission_status(request):
+    """
+    Inference load of the web process that answers, for autoscaling.
+
+    Admission is per process, so a scraper should sum the answers of every
+    worker (told apart by pid) rather than read one as the total.
+
+    Returns pid, slots, active, queued, queued_by_route, queue_size,
+    max_wait_seconds and retry_after_seconds.
+    """
+    return Response(get_admission_controller().snapshot())
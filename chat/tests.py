@@ -1,3 +1,55 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from ai_model.backends.base import BackendUnavailable
+from ai_model.ledger import TokenLedger
+from ai_model.testing import isolate_metrics
+from .views import ChatAPIView
+
+
+@override_settings(
+    INFERENCE_BACKENDS=['fake'], INFERENCE_ROUTES={}, INFERENCE_SINGLE_FLIGHT=False,
+    FAKE_LLM_LATENCY_SECONDS=0, FAKE_LLM_TOKENS_PER_SECOND=0,
+    TOKEN_QUOTA_USER_DAILY=0, TOKEN_LEDGER_FLUSH_SECONDS=3600, MAX_TOKENS=20,
+)
+class ChatBillingTests(TestCase):
+    def setUp(self):
+        isolate_metrics(self)
+        self.ledger = TokenLedger()
+        patcher = mock.patch('ai_model.ledger.ledger', self.ledger)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create(username='user')
+
+    def post(self, **data):
+        request = APIRequestFactory().post('/chat/api/', {
+            'message': 'What does this do?', 'file_content': 'def main():\n    return 1\n', 'file_name': 'app.py', **data
+        }, format='json')
+        force_authenticate(request, user=self.user)
+        return ChatAPIView.as_view()(request)
+
+    def test_answer_is_billed(self):
+        response = self.post()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.ledger._pending), 1)
+        self.assertEqual(self.ledger._pending[0].source, 'chat')
+
+    def test_failed_answer_is_not_billed(self):
+        with mock.patch('ai_model.views.get_router', side_effect=BackendUnavailable("no backend")):
+            response = self.post()
+
+        self.assertIn("couldn't process your request", response.data['response'])
+        self.assertEqual(self.ledger._pending, [])
+
+    def test_stream_cut_short_by_a_disconnect_is_billed(self):
+        response = self.post(stream=True)
+        events = iter(response.streaming_content)
+        next(events)
+        response.close()
+
+        self.assertEqual(len(self.ledger._pending), 1)
+        self.assertGreater(self.ledger._pending[0].completion_tokens, 0)
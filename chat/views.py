@@ -3,11 +3,20 @@ from rest_framework.response import Response
 from rest_framework import status
 from .serializers import ChatMessageSerializer
 from django.conf import settings
-from ai_model.views import generate_ai_response
+from ai_model.views import generate_ai_response, stream_ai_response
+from ai_model.streaming import wants_stream, sse_response, completion_events
+from ai_model.admission import get_admission_controller, AdmissionRejected, AdmittedStream, rejected_response
+from ai_model.ledger import check_quota, record_completion
 
 class ChatAPIView(APIView):
     """
     API endpoint for chat interactions with the AI model about code files.
+
+    Send stream=true (or Accept: text/event-stream) to receive the answer as
+    server-sent events: a 'token' event per token and a final 'done' event.
+    Chat is admitted to inference ahead of documentation requests; at
+    capacity, or once the user's daily token quota is used up, the response
+    is 429 or 503 with Retry-After. Tokens are recorded against the user.
     """
     def post(self, request, format=None):
         serializer = ChatMessageSerializer(data=request.data)
@@ -16,6 +25,12 @@ class ChatAPIView(APIView):
             message = serializer.validated_data['message']
             file_content = serializer.validated_data['file_content']
             file_name = serializer.validated_data['file_name']
+
+            try:
+                check_quota(request.user)
+                ticket = get_admission_controller().acquire('chat')
+            except AdmissionRejected as e:
+                return rejected_response(e)
             
             try:
                 # Create prompt with context
@@ -32,10 +47,24 @@ class ChatAPIView(APIView):
                 Please provide a detailed and helpful response focused specifically on this code.
                 """
                 
+                def record(text):
+                    record_completion(request.user, None, 'chat', prompt, text)
+
+                if wants_stream(request):
+                    events = completion_events(
+                        stream_ai_response(prompt, max_tokens=settings.MAX_TOKENS, route='chat'), on_complete=record
+                    )
+                    return sse_response(AdmittedStream(events, ticket))
+
                 # Generate AI response using the language model
-                ai_response = generate_ai_response(prompt, max_tokens=settings.MAX_TOKENS)
+                with ticket:
+                    ai_response = generate_ai_response(
+                        prompt, max_tokens=settings.MAX_TOKENS, raise_errors=True, route='chat'
+                    )
+                record(ai_response)
                 
             except Exception as e:
+                ticket.release()
                 # Fallback response if AI service fails
                 ai_response = f"I'm sorry, I couldn't process your request. Error: {str(e)}"
             
@@ -2,4 +2,22 @@ from django.contrib import admin
 from .models import *
 
 # Register your models here.
-admin.site.register(GeneratedDocFolder)
\ No newline at end of file
+admin.site.register(GeneratedDocFolder)
+
+class IngestionFileInline(admin.TabularInline):
+    model = IngestionFile
+    extra = 0
+    readonly_fields = ['path', 'strategy', 'code_tokens', 'prompt_tokens', 'completion_tokens', 'error_message']
+
+@admin.register(IngestionJob)
+class IngestionJobAdmin(admin.ModelAdmin):
+    inlines = [IngestionFileInline]
+    list_display = ['id', 'source_type', 'user', 'status', 'processed_files', 'total_files', 'failed_files', 'created_at']
+    list_filter = ['status', 'source_type', 'created_at']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
+
+
+@admin.register(RepositoryGeneration)
+class RepositoryGenerationAdmin(admin.ModelAdmin):
+    list_display = ['source_key', 'commit_sha', 'doc_folder', 'file_count', 'created_at']
+    search_fields = ['source_key', 'commit_sha']
@@ -0,0 +1,327 @@
+import json
+import logging
+import os
+import threading
+import uuid
+from urllib.parse import quote
+import requests
+from diskcache import Cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+GITHUB_API_URL = 'https://api.github.com'
+GITHUB_CODELOAD_URL = 'https://codeload.github.com'
+GITHUB_RAW_URL = 'https://raw.githubusercontent.com'
+
+_session = None
+_session_lock = threading.Lock()
+_blob_cache = None
+_blob_cache_lock = threading.Lock()
+
+
+class GitHubFetchError(Exception):
+    """Raised when a repository cannot be resolved or its archive cannot be downloaded"""
+
+
+def get_github_session():
+    """
+    Shared HTTP session for GitHub requests.
+
+    Connections are pooled across jobs and threads, and idempotent requests
+    are retried with backoff on connection errors, rate limiting and 5xx
+    responses.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=settings.GITHUB_HTTP_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=['GET', 'HEAD'],
+                respect_retry_after_header=True
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.GITHUB_HTTP_POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = 'repo2doc'
+            _session = session
+        return _session
+
+
+def get_blob_cache():
+    """Process-wide cache of file contents fetched from GitHub, keyed by blob SHA"""
+    global _blob_cache
+    if _blob_cache is None:
+        with _blob_cache_lock:
+            if _blob_cache is None:
+                _blob_cache = Cache(
+                    settings.GITHUB_BLOB_CACHE_DIR,
+                    size_limit=settings.GITHUB_BLOB_CACHE_SIZE_LIMIT,
+                    eviction_policy='least-recently-used',
+                )
+    return _blob_cache
+
+
+class GitHubArchiveFetcher:
+    """
+    Download repository archives from GitHub, cached on disk by commit.
+
+    The default branch head is resolved with a conditional request to the
+    commits API, so a re-import of an unchanged repository costs a single
+    304 (which does not count against the API rate limit). Archives are
+    stored under GITHUB_ARCHIVE_CACHE_DIR/<owner>/<repo>/<sha>.zip and only
+    the newest GITHUB_ARCHIVE_CACHE_KEEP per repository are kept.
+
+    For repositories too large to download whole, list_tree and read_blob
+    support a sparse fetch of individual files instead.
+
+    Args:
+        token: Optional GitHub token, needed for private repositories and
+            raising the API rate limit
+    """
+
+    def __init__(self, token=None, session=None):
+        self.token = token
+        self.session = session or get_github_session()
+
+    def _headers(self, accept='application/vnd.github.v3+json', etag=None):
+        headers = {'Accept': accept}
+        if self.token:
+            headers['Authorization'] = f'token {self.token}'
+        if etag:
+            headers['If-None-Match'] = etag
+        return headers
+
+    def _get(self, url, **kwargs):
+        try:
+            return self.session.get(url, timeout=settings.GITHUB_HTTP_TIMEOUT, **kwargs)
+        except requests.RequestException as e:
+            raise GitHubFetchError(f"Could not reach GitHub: {str(e)}")
+
+    @staticmethod
+    def _raise_for_status(response, owner, repo):
+        if response.status_code == 404:
+            raise GitHubFetchError(f"Repository {owner}/{repo} not found or not accessible")
+        if response.status_code == 403 and response.headers.get('X-RateLimit-Remaining') == '0':
+            raise GitHubFetchError("GitHub API rate limit exceeded; add a GitHub token to your profile")
+        if response.status_code != 200:
+            raise GitHubFetchError(f"GitHub request failed: HTTP {response.status_code}")
+
+    def repo_cache_dir(self, owner, repo):
+        return os.path.join(settings.GITHUB_ARCHIVE_CACHE_DIR, owner.lower(), repo.lower())
+
+    def _load_meta(self, owner, repo):
+        try:
+            with open(os.path.join(self.repo_cache_dir(owner, repo), 'meta.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_meta(self, owner, repo, meta):
+        cache_dir = self.repo_cache_dir(owner, repo)
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = os.path.join(cache_dir, f'meta.json.{uuid.uuid4().hex}.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, os.path.join(cache_dir, 'meta.json'))
+
+    def resolve(self, owner, repo):
+        """
+        Resolve the default branch and its head commit.
+
+        Returns:
+            tuple: (branch, sha)
+        """
+        meta = self._load_meta(owner, repo)
+
+        response = self._get(
+            f"{GITHUB_API_URL}/repos/{owner}/{repo}/commits/HEAD",
+            headers=self._headers('application/vnd.github.sha', etag=meta.get('commit_etag'))
+        )
+        if response.status_code == 304 and meta.get('sha') and meta.get('branch'):
+            return meta['branch'], meta['sha']
+        self._raise_for_status(response, owner, repo)
+
+        meta['sha'] = response.text.strip()
+        meta['commit_etag'] = response.headers.get('ETag')
+
+        # The branch name only needs refreshing when the head moved
+        response = self._get(
+            f"{GITHUB_API_URL}/repos/{owner}/{repo}",
+            headers=self._headers(etag=meta.get('repo_etag') if meta.get('branch') else None)
+        )
+        if response.status_code != 304:
+            self._raise_for_status(response, owner, repo)
+            repo_info = response.json()
+            meta['branch'] = repo_info.get('default_branch', 'main')
+            meta['size_kb'] = repo_info.get('size', 0)
+            meta['private'] = repo_info.get('private', True)
+            meta['repo_etag'] = response.headers.get('ETag')
+
+        self._save_meta(owner, repo, meta)
+        return meta['branch'], meta['sha']
+
+    def estimated_size(self, owner, repo):
+        """Repository size in bytes as last reported by GitHub (includes history, so an upper bound)"""
+        return self._load_meta(owner, repo).get('size_kb', 0) * 1024
+
+    def is_public(self, owner, repo):
+        """True if GitHub last reported the repository as public"""
+        return self._load_meta(owner, repo).get('private') is False
+
+    def fetch(self, owner, repo):
+        """
+        Return a local archive of the default branch head, downloading it if not cached.
+
+        Returns:
+            tuple: (zip_path, branch, sha)
+        """
+        branch, sha = self.resolve(owner, repo)
+        return self.fetch_archive(owner, repo, sha), branch, sha
+
+    def fetch_archive(self, owner, repo, sha):
+        """Return a local archive of commit sha, downloading it if not cached"""
+        cache_dir = self.repo_cache_dir(owner, repo)
+        zip_path = os.path.join(cache_dir, f'{sha}.zip')
+
+        if os.path.exists(zip_path):
+            os.utime(zip_path)
+            logger.info(f"Using cached archive of {owner}/{repo}@{sha}")
+            return zip_path
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._download(owner, repo, sha, zip_path)
+        self._prune(cache_dir, '.zip')
+        return zip_path
+
+    def list_tree(self, owner, repo, sha):
+        """
+        List every file of commit sha with the recursive Git trees API.
+
+        Listings are immutable per commit and cached beside the archives.
+
+        Returns:
+            list or None: {'path', 'sha', 'size'} dicts, or None if GitHub
+            truncated the listing
+        """
+        cache_dir = self.repo_cache_dir(owner, repo)
+        tree_path = os.path.join(cache_dir, f'{sha}.tree.json')
+        try:
+            with open(tree_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        response = self._get(
+            f"{GITHUB_API_URL}/repos/{owner}/{repo}/git/trees/{sha}",
+            params={'recursive': '1'},
+            headers=self._headers()
+        )
+        self._raise_for_status(response, owner, repo)
+        listing = response.json()
+        if listing.get('truncated'):
+            logger.info(f"Tree of {owner}/{repo}@{sha} is truncated; sparse fetch unavailable")
+            return None
+
+        tree = [
+            {'path': entry['path'], 'sha': entry['sha'], 'size': entry.get('size', 0)}
+            for entry in listing.get('tree', [])
+            if entry.get('type') == 'blob'
+        ]
+
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{tree_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(tree, f)
+        os.replace(temp_path, tree_path)
+        self._prune(cache_dir, '.tree.json')
+        return tree
+
+    def read_blob(self, owner, repo, sha, entry):
+        """
+        Return the bytes of one tree entry, from the blob cache when possible.
+
+        Raises:
+            GitHubFetchError: if the file cannot be downloaded or exceeds
+                INGESTION_MAX_FILE_BYTES
+        """
+        cache = get_blob_cache()
+        data = cache.get(entry['sha'])
+        if data is not None:
+            return data
+
+        # Private repositories go through the API; public ones skip its rate limit
+        if self.token:
+            url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/git/blobs/{entry['sha']}"
+            headers = self._headers('application/vnd.github.raw')
+        else:
+            url = f"{GITHUB_RAW_URL}/{owner}/{repo}/{sha}/{quote(entry['path'])}"
+            headers = self._headers()
+
+        max_bytes = settings.INGESTION_MAX_FILE_BYTES
+        response = self._get(url, headers=headers, stream=True)
+        with response:
+            self._raise_for_status(response, owner, repo)
+            try:
+                data = response.raw.read(max_bytes + 1, decode_content=True)
+            except Exception as e:
+                raise GitHubFetchError(f"Could not download {entry['path']}: {str(e)}")
+        if len(data) > max_bytes:
+            raise GitHubFetchError(f"{entry['path']} is larger than {max_bytes} bytes")
+
+        cache.set(entry['sha'], data)
+        return data
+
+    def prefetch_blob(self, owner, repo, sha, entry):
+        """Download a tree entry into the blob cache without keeping it in memory"""
+        self.read_blob(owner, repo, sha, entry)
+
+    def _download(self, owner, repo, sha, zip_path):
+        # Private repositories go through the API; public ones skip its rate limit
+        if self.token:
+            url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/zipball/{sha}"
+        else:
+            url = f"{GITHUB_CODELOAD_URL}/{owner}/{repo}/zip/{sha}"
+
+        max_bytes = settings.GITHUB_ARCHIVE_MAX_BYTES
+        response = self._get(url, headers=self._headers(), stream=True)
+        with response:
+            self._raise_for_status(response, owner, repo)
+            if int(response.headers.get('Content-Length') or 0) > max_bytes:
+                raise GitHubFetchError(f"Repository archive is larger than {max_bytes} bytes")
+
+            temp_path = f"{zip_path}.{uuid.uuid4().hex}.tmp"
+            received = 0
+            try:
+                with open(temp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        received += len(chunk)
+                        if received > max_bytes:
+                            raise GitHubFetchError(f"Repository archive is larger than {max_bytes} bytes")
+                        f.write(chunk)
+                os.replace(temp_path, zip_path)
+            except requests.RequestException as e:
+                raise GitHubFetchError(f"Archive download interrupted: {str(e)}")
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+        logger.info(f"Downloaded {owner}/{repo}@{sha} ({received} bytes)")
+
+    @staticmethod
+    def _prune(cache_dir, suffix):
+        """Keep only the most recently used archives (or tree listings) of a repository"""
+        archives = sorted(
+            (entry for entry in os.scandir(cache_dir) if entry.name.endswith(suffix)),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True
+        )
+        for entry in archives[settings.GITHUB_ARCHIVE_CACHE_KEEP:]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
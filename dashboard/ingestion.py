@@ -0,0 +1,1064 @@
+import os
+import functools
+import hashlib
+import json
+import logging
+import posixpath
+import shutil
+import threading
+import uuid
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from repo2doc_api.services import DocGenerationService
+from ai_model.backends import get_router
+from ai_model.ledger import batch_quota, record_usage, TokenQuotaExceeded
+from repo2doc_api.file_selection import FileSelector, GitIgnore, SKIP_EMPTY, parse_globs
+from repo2doc_api.scheduler import tenant_key
+from message_resource.ai_model_config import AI_PROMPT
+from .models import GeneratedDocFolder, IngestionJob, IngestionFile, RepositoryGeneration
+from .github_archive import GitHubArchiveFetcher, GitHubFetchError
+from webhook.models import GitHubRepository
+from message_resource.api_message_resource import ErrorMessages
+
+logger = logging.getLogger(__name__)
+
+
+GITIGNORE_MAX_BYTES = 64 * 1024
+
+
+class ArchiveLimitExceeded(Exception):
+    """Raised when an archive exceeds the configured entry count or uncompressed size caps"""
+
+
+class JobLost(Exception):
+    """Raised when a running job was requeued or claimed by another worker in the meantime"""
+
+
+def is_safe_member_path(name):
+    """Reject absolute member names and names escaping the archive root"""
+    normalized = posixpath.normpath(name)
+    return not (normalized.startswith('/') or normalized == '..' or normalized.startswith('../'))
+
+
+def select_archive_members(zip_ref, repository):
+    """
+    Pick the archive entries worth documenting using only the central directory.
+
+    The archive's .gitignore files and the repository's include/exclude globs
+    are applied to names and declared sizes before anything else is
+    decompressed. The entry count and total uncompressed size are capped so
+    a zip bomb cannot exhaust a worker.
+
+    Returns:
+        tuple: (members, selector) where members is a list of (rel_path, read)
+        pairs, rel_path being relative to the repository (the archive's
+        top-level directory stripped), and read() returns the member's bytes
+    """
+    infos = [info for info in zip_ref.infolist() if not info.is_dir()]
+    if len(infos) > settings.INGESTION_MAX_ENTRIES:
+        raise ArchiveLimitExceeded(
+            f"Archive has {len(infos)} entries, the limit is {settings.INGESTION_MAX_ENTRIES}"
+        )
+
+    infos = [info for info in infos if is_safe_member_path(info.filename)]
+
+    gitignore = GitIgnore()
+    for info in infos:
+        if posixpath.basename(info.filename) == '.gitignore' and info.file_size <= GITIGNORE_MAX_BYTES:
+            base_dir = posixpath.dirname(posixpath.normpath(info.filename))
+            gitignore.add(base_dir, read_archive_member(zip_ref, info).decode('utf-8', errors='ignore'))
+
+    # GitHub archives and most uploads wrap the repository in one top-level directory
+    top_levels = {posixpath.normpath(info.filename).split('/')[0] for info in infos}
+    root = top_levels.pop() if len(top_levels) == 1 and all('/' in info.filename for info in infos) else ''
+
+    selector = FileSelector.for_repository(repository, gitignore=gitignore, root=root)
+
+    members = []
+    total_bytes = 0
+    for info in infos:
+        name = posixpath.normpath(info.filename)
+        if selector.skip_reason_for_path(name, info.file_size):
+            continue
+
+        total_bytes += info.file_size
+        if total_bytes > settings.INGESTION_MAX_TOTAL_BYTES:
+            raise ArchiveLimitExceeded(
+                f"Archive expands to more than {settings.INGESTION_MAX_TOTAL_BYTES} bytes"
+            )
+
+        # Docs mirror the repository, not the archive, so GitHub's per-commit "repo-<sha>/" root is dropped
+        members.append((repository_path(name, root), functools.partial(read_archive_member, zip_ref, info)))
+
+    return members, selector
+
+
+def read_archive_member(zip_ref, info):
+    """Decompress a single member, never reading past its size cap"""
+    with zip_ref.open(info) as member:
+        data = member.read(settings.INGESTION_MAX_FILE_BYTES + 1)
+    if len(data) > settings.INGESTION_MAX_FILE_BYTES:
+        raise ArchiveLimitExceeded(f"{info.filename} expands past {settings.INGESTION_MAX_FILE_BYTES} bytes")
+    return data
+
+
+def doc_output_path(rel_path):
+    """Path of a source file's generated .md, relative to the docs output root"""
+    return os.path.splitext(rel_path)[0] + ".md"
+
+
+def write_doc_file(md_path, documentation):
+    """
+    Write generated documentation, creating parent directories as needed.
+
+    The file is written beside the target and renamed over it, so readers
+    never see a partial doc and a hard-linked doc shared with another
+    import is replaced rather than modified.
+    """
+    os.makedirs(os.path.dirname(md_path), exist_ok=True)
+    temp_path = f"{md_path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as doc_file:
+        doc_file.write(documentation)
+    os.replace(temp_path, md_path)
+
+
+def reuse_doc_file(source_path, md_path):
+    """
+    Make an existing doc available at md_path, hard-linking it when possible.
+
+    Returns:
+        bool: False if the source doc no longer exists
+    """
+    if source_path == md_path:
+        return os.path.exists(md_path)
+    if not os.path.exists(source_path):
+        return False
+
+    os.makedirs(os.path.dirname(md_path), exist_ok=True)
+    if os.path.lexists(md_path):
+        os.remove(md_path)
+    try:
+        os.link(source_path, md_path)
+    except OSError:
+        shutil.copy2(source_path, md_path)
+    return True
+
+
+def generate_docs(source_files, docs_output_root, selector=None, max_workers=None,
+                  on_progress=None, on_file=None, checkpoints=None, reusable=None, quota=None, flow=None,
+                  before_file=None):
+    """
+    Fan source files out to the documentation generator.
+
+    Files are read one at a time as worker slots free up, and each .md output
+    is written as soon as its file finishes, mirroring the source layout
+    under docs_output_root.
+
+    Args:
+        source_files: List of (rel_path, read) pairs; read() returns the file's bytes
+        selector: Optional FileSelector whose content checks (binary, minified,
+            generated) are applied once each file is read
+        on_progress: Optional callable receiving the running summary after the
+            file list is known and again after every finished file
+        on_file: Optional callable receiving each file's outcome: a dict with
+            'path', 'status' ('done', 'failed' or 'skipped'), 'source_hash',
+            'output_path', 'error' and, for generated files, the strategy and
+            token counts
+        checkpoints: Optional dict of rel_path -> source hash for files an
+            earlier attempt of the same job already documented; they are
+            skipped if their output still exists
+        reusable: Optional dict of rel_path -> (source hash, absolute doc path)
+            from a previous import of the repository. A file whose hash still
+            matches keeps (or links) that doc instead of being sent to the model.
+        quota: Optional callable run before each file is sent to the model;
+            if it raises TokenQuotaExceeded the file fails with that message
+            and can be retried once the quota resets
+        flow: (job class, tenant) the files are scheduled under; see
+            repo2doc_api.scheduler
+        before_file: Optional callable run before each file is read; an
+            exception it raises (e.g. JobLost) stops the whole run
+
+    Returns:
+        dict: 'total' files, counts of 'done', 'reused' and 'skipped' files
+        and a 'failed' list of {'path': ..., 'error': ...} entries
+    """
+    summary = {'total': len(source_files), 'done': 0, 'reused': 0, 'skipped': 0, 'failed': []}
+    checkpoints = checkpoints or {}
+    reusable = reusable or {}
+    source_hashes = {}
+
+    def report():
+        if on_progress:
+            on_progress(summary)
+
+    def finish(outcome):
+        if outcome['status'] == 'done':
+            summary['done'] += 1
+        elif outcome['status'] == 'skipped':
+            summary['skipped'] += 1
+        else:
+            summary['failed'].append({'path': outcome['path'], 'error': outcome['error']})
+        if on_file:
+            on_file(outcome)
+        report()
+
+    def iter_items():
+        for rel_path, read in source_files:
+            if before_file:
+                before_file()
+            outcome = {'path': rel_path, 'source_hash': None, 'output_path': None, 'error': None}
+            try:
+                data = read()
+            except Exception as e:
+                finish({**outcome, 'status': 'failed', 'error': f"Could not read file: {str(e)}"})
+                continue
+
+            source_hash = hashlib.sha256(data).hexdigest()
+            outcome['source_hash'] = source_hash
+
+            md_path = os.path.join(docs_output_root, doc_output_path(rel_path))
+            if checkpoints.get(rel_path) == source_hash and os.path.exists(md_path):
+                summary['done'] += 1
+                summary['reused'] += 1
+                report()
+                continue
+
+            previous_hash, previous_doc = reusable.get(rel_path, (None, None))
+            if previous_hash == source_hash and reuse_doc_file(previous_doc, md_path):
+                summary['reused'] += 1
+                finish({**outcome, 'status': 'done', 'strategy': 'reused', 'output_path': doc_output_path(rel_path)})
+                continue
+
+            if not data.strip():
+                skip_reason = SKIP_EMPTY
+            else:
+                skip_reason = selector.skip_reason_for_content(rel_path, data) if selector else None
+            if skip_reason:
+                finish({**outcome, 'status': 'skipped', 'error': skip_reason})
+                continue
+
+            if quota:
+                try:
+                    quota()
+                except TokenQuotaExceeded as e:
+                    finish({**outcome, 'status': 'failed', 'error': str(e)})
+                    continue
+
+            source_hashes[rel_path] = source_hash
+            yield rel_path, data.decode('utf-8', errors='ignore')
+
+    report()
+
+    service = DocGenerationService(max_workers=max_workers, flow=flow)
+    for result in service.generate_batch(iter_items()):
+        rel_path = result['path']
+        outcome = {**result, 'source_hash': source_hashes.pop(rel_path, None), 'output_path': None}
+        outcome.pop('documentation', None)
+
+        if result['error']:
+            finish({**outcome, 'status': 'failed'})
+            continue
+
+        try:
+            write_doc_file(os.path.join(docs_output_root, doc_output_path(rel_path)), result['documentation'])
+            finish({**outcome, 'status': 'done', 'output_path': doc_output_path(rel_path)})
+        except OSError as e:
+            finish({**outcome, 'status': 'failed', 'error': f"Could not write documentation: {str(e)}"})
+
+    return summary
+
+
+def spool_upload(uploaded_file):
+    """
+    Persist an uploaded ZIP under INGESTION_UPLOAD_DIR so a worker can pick it up.
+
+    The original file name is kept because it names the generated docs folder.
+
+    Returns:
+        str: path of the spooled archive
+    """
+    upload_dir = os.path.join(settings.INGESTION_UPLOAD_DIR, uuid.uuid4().hex)
+    os.makedirs(upload_dir, exist_ok=True)
+
+    upload_path = os.path.join(upload_dir, os.path.basename(uploaded_file.name))
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        # Large uploads are already spooled to disk by Django; move rather than copy
+        file_move_safe(uploaded_file.temporary_file_path(), upload_path)
+    else:
+        with open(upload_path, 'wb') as f:
+            for chunk in uploaded_file.chunks():
+                f.write(chunk)
+    return upload_path
+
+
+def parse_github_url(github_url):
+    """Return (owner, repo) for a https://github.com/owner/repo URL, or None if malformed"""
+    parts = github_url.rstrip('/').split('/')
+    if len(parts) < 5:
+        return None
+    return parts[-2], parts[-1]
+
+
+def github_token_for(user):
+    """The GitHub token stored on a user's profile, or None"""
+    if not user:
+        return None
+    try:
+        profile = user.profile
+        if profile.has_github_token():
+            return profile.get_github_token()
+    except Exception:
+        pass
+    return None
+
+
+def process_github_repository(job):
+    """
+    Resolve the default branch head of the job's GitHub repository and document it.
+
+    A public repository already documented at the same commit with the same
+    settings reuses that output without downloading anything. Otherwise
+    small repositories are fetched as one archive, and when the tree at the
+    head exceeds GITHUB_SPARSE_FETCH_THRESHOLD bytes only the selected files
+    are fetched.
+
+    Returns:
+        GeneratedDocFolder: the folder holding the generated docs
+    """
+    parsed = parse_github_url(job.github_url)
+    if not parsed:
+        raise GitHubFetchError("Invalid GitHub URL format")
+    owner, repo = parsed
+
+    fetcher = GitHubArchiveFetcher(token=github_token_for(job.user))
+    branch, sha = fetcher.resolve(owner, repo)
+    github_info = {
+        'url': job.github_url,
+        'owner': owner,
+        'repo': repo,
+        'branch': branch,
+        'sha': sha,
+        'public': fetcher.is_public(owner, repo),
+    }
+
+    generation = find_generation(job, github_info)
+    if generation:
+        doc_folder = reuse_generation(job, generation, github_info)
+        if doc_folder:
+            return doc_folder
+
+    # The repository size from GitHub includes history, so only list the tree when it could be large
+    threshold = settings.GITHUB_SPARSE_FETCH_THRESHOLD
+    if fetcher.estimated_size(owner, repo) >= threshold:
+        tree = fetcher.list_tree(owner, repo, sha)
+        if tree is not None and sum(entry['size'] for entry in tree) >= threshold:
+            return process_github_tree(job, fetcher, github_info, tree)
+
+    zip_path = fetcher.fetch_archive(owner, repo, sha)
+    return process_zip_file(job, zip_path, github_info=github_info)
+
+
+def process_zip_file(job, zip_path, github_info=None):
+    """
+    Document a repository archive for an ingestion job.
+
+    Members are streamed straight out of the archive; nothing is extracted
+    to disk.
+
+    Returns:
+        GeneratedDocFolder: the folder holding the generated docs
+    """
+    folder_name = github_info['repo'] if github_info else os.path.splitext(os.path.basename(zip_path))[0]
+
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        source_files, selector = select_archive_members(zip_ref, job)
+        return document_repository(job, source_files, selector, folder_name, github_info)
+
+
+def select_tree_members(job, fetcher, github_info, tree, executor):
+    """
+    Pick the files of a GitHub tree listing worth documenting and start fetching them.
+
+    The same selection rules and caps as for archives are applied to the
+    listing's paths and sizes, so unselected files are never downloaded.
+    Selected blobs are prefetched into the blob cache on executor.
+
+    Returns:
+        tuple: (members, selector) where members is a list of (rel_path, read)
+        pairs and read() returns the file's bytes
+    """
+    if len(tree) > settings.INGESTION_MAX_ENTRIES:
+        raise ArchiveLimitExceeded(
+            f"Repository has {len(tree)} files, the limit is {settings.INGESTION_MAX_ENTRIES}"
+        )
+
+    owner, repo, sha = github_info['owner'], github_info['repo'], github_info['sha']
+
+    gitignore = GitIgnore()
+    gitignore_entries = [
+        entry for entry in tree
+        if posixpath.basename(entry['path']) == '.gitignore' and entry['size'] <= GITIGNORE_MAX_BYTES
+    ]
+    for entry, data in zip(gitignore_entries, executor.map(
+            lambda entry: fetcher.read_blob(owner, repo, sha, entry), gitignore_entries)):
+        gitignore.add(posixpath.dirname(entry['path']), data.decode('utf-8', errors='ignore'))
+
+    selector = FileSelector.for_repository(job, gitignore=gitignore)
+
+    selected = []
+    total_bytes = 0
+    for entry in tree:
+        if not is_safe_member_path(entry['path']) or selector.skip_reason_for_path(entry['path'], entry['size']):
+            continue
+
+        total_bytes += entry['size']
+        if total_bytes > settings.INGESTION_MAX_TOTAL_BYTES:
+            raise ArchiveLimitExceeded(
+                f"Selected files exceed {settings.INGESTION_MAX_TOTAL_BYTES} bytes"
+            )
+        selected.append(entry)
+
+    members = []
+    for entry in selected:
+        prefetch = executor.submit(fetcher.prefetch_blob, owner, repo, sha, entry)
+        read = functools.partial(fetcher.read_blob, owner, repo, sha, entry)
+        members.append((entry['path'], functools.partial(read_prefetched_blob, prefetch, read)))
+
+    return members, selector
+
+
+def read_prefetched_blob(prefetch, read):
+    """Wait for a blob's prefetch to land in the blob cache, then read it"""
+    prefetch.result()
+    return read()
+
+
+def process_github_tree(job, fetcher, github_info, tree):
+    """
+    Document a GitHub repository by fetching only its selected files.
+
+    Used instead of the archive for repositories whose tree is larger than
+    GITHUB_SPARSE_FETCH_THRESHOLD, typically monorepos with large assets.
+
+    Returns:
+        GeneratedDocFolder: the folder holding the generated docs
+    """
+    executor = ThreadPoolExecutor(max_workers=settings.GITHUB_BLOB_FETCH_WORKERS, thread_name_prefix='blobfetch')
+    try:
+        source_files, selector = select_tree_members(job, fetcher, github_info, tree, executor)
+        logger.info(f"Ingestion job {job.id} fetching {len(source_files)} of {len(tree)} files")
+        return document_repository(job, source_files, selector, github_info['repo'], github_info)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def document_repository(job, source_files, selector, folder_name, github_info=None):
+    """
+    Generate the docs of a selected set of repository files for an ingestion job.
+
+    The doc folder is created before any file is documented and every
+    selected file gets a manifest entry that is checkpointed as it finishes,
+    so a restarted or retried job only regenerates files that are not done
+    or whose source changed. Files unchanged since the previous import of
+    the same repository reuse its docs, so only new and modified files are
+    sent to the model. Progress counts are written to the job row as files
+    finish so the progress endpoint can report them while the job runs.
+
+    Returns:
+        GeneratedDocFolder: the folder holding the generated docs
+    """
+    def record_progress(summary):
+        updated = claimed_job(job).update(
+            total_files=summary['total'],
+            processed_files=summary['done'] + summary['skipped'] + len(summary['failed']),
+            failed_files=len(summary['failed']),
+            heartbeat_at=timezone.now()
+        )
+        if not updated:
+            raise JobLost(f"Ingestion job {job.id} is no longer claimed by worker {job.worker_id}")
+
+    def record_file(outcome):
+        IngestionFile.objects.filter(job=job, path=outcome['path']).update(
+            status=outcome['status'],
+            source_hash=outcome['source_hash'],
+            output_path=outcome['output_path'],
+            strategy=outcome.get('strategy'),
+            code_tokens=outcome.get('code_tokens', 0),
+            prompt_tokens=outcome.get('prompt_tokens', 0),
+            completion_tokens=outcome.get('completion_tokens', 0),
+            wait_seconds=outcome.get('wait_seconds', 0),
+            error_message=outcome['error'],
+            updated_at=timezone.now()
+        )
+        # Reused, skipped and cached files cost nothing and are not written to the ledger
+        if outcome.get('prompt_tokens') or outcome.get('completion_tokens'):
+            record_usage(job.user, job.organization, job.source_type,
+                         outcome.get('prompt_tokens', 0), outcome.get('completion_tokens', 0))
+
+    source_type = 'github' if github_info else 'upload'
+    doc_folder = get_or_create_doc_folder(job, folder_name, source_type)
+    paths = [rel_path for rel_path, _ in source_files]
+
+    if github_info:
+        source_key = github_source_key(github_info)
+    else:
+        # The owner's uploads into the same doc folder are snapshots of one project, whatever their archive root
+        source_key = f"upload:{folder_name}"
+    previous_folder = find_previous_import(job, doc_folder, source_key)
+    if not previous_folder and github_info:
+        # Near match: another user's import of this public repository at an earlier commit
+        generation = find_generation(job, github_info, exact=False)
+        previous_folder = generation.doc_folder if generation else None
+
+    reusable = previous_import_docs(previous_folder)
+    checkpoints = load_checkpoints(job, paths)
+    if checkpoints:
+        logger.info(f"Ingestion job {job.id} resuming with {len(checkpoints)} files already documented")
+    if previous_folder:
+        logger.info(f"Ingestion job {job.id} diffing against doc folder {previous_folder.id}")
+
+    summary = generate_docs(
+        source_files, doc_folder.folder_path, selector=selector,
+        on_progress=record_progress, on_file=record_file,
+        checkpoints=checkpoints, reusable=reusable,
+        quota=batch_quota(job.user, job.organization),
+        flow=('import', job.tenant),
+        before_file=functools.partial(ensure_claimed, job)
+    )
+    job.failed_paths = summary['failed']
+    claimed_job(job).update(failed_paths=job.failed_paths)
+
+    save_source_manifest(job, doc_folder, source_key, paths, previous_folder)
+
+    if github_info:
+        if github_info['public'] and not summary['failed']:
+            RepositoryGeneration.objects.create(
+                source_key=source_key,
+                commit_sha=github_info['sha'],
+                generation_key=generation_key(job),
+                doc_folder=doc_folder,
+                file_count=len(doc_folder.source_manifest)
+            )
+        link_github_repository(job, doc_folder, github_info)
+
+    return doc_folder
+
+
+def link_github_repository(job, doc_folder, github_info):
+    """Record the GitHub source of a signed-in user's doc folder and set up auto-sync if requested"""
+    if not job.user:
+        return
+
+    GitHubRepository.objects.get_or_create(
+        doc_folder=doc_folder,
+        defaults={
+            'github_url': github_info['url'],
+            'owner': github_info['owner'],
+            'repo_name': github_info['repo'],
+            'branch': github_info['branch'],
+            'last_commit_sha': github_info['sha'],
+            'auto_sync_enabled': False,
+        }
+    )
+
+    if job.auto_sync_requested:
+        setup_auto_sync(job, doc_folder, github_info)
+
+
+def github_source_key(github_info):
+    return f"github:{github_info['owner']}/{github_info['repo']}".lower()
+
+
+def generation_key(job):
+    """Hash of everything other than the commit that shapes an import's output; see doc_cache_key"""
+    router = get_router('docs')
+    params = json.dumps([
+        AI_PROMPT.GENERATE_DOC_PROMPT_VERSION,
+        router.name,
+        router.model_id(),
+        settings.LLAMA_N_CTX,
+        settings.MAX_TOKENS,
+        settings.TEMPERATURE,
+        parse_globs(job.include_globs),
+        parse_globs(job.exclude_globs),
+    ])
+    return hashlib.sha256(params.encode('utf-8')).hexdigest()
+
+
+def find_generation(job, github_info, exact=True):
+    """
+    Look up a completed import of the same public repository and settings.
+
+    Args:
+        exact: Only match the same commit; otherwise return the latest
+            generation at any commit
+
+    Returns:
+        RepositoryGeneration or None
+    """
+    if not github_info['public']:
+        return None
+
+    generations = RepositoryGeneration.objects.filter(
+        source_key=github_source_key(github_info),
+        generation_key=generation_key(job)
+    ).select_related('doc_folder')
+    if exact:
+        generations = generations.filter(commit_sha=github_info['sha'])
+    if job.doc_folder_id:
+        generations = generations.exclude(doc_folder_id=job.doc_folder_id)
+
+    for generation in generations[:5]:
+        if os.path.isdir(generation.doc_folder.folder_path):
+            return generation
+    return None
+
+
+def reuse_generation(job, generation, github_info):
+    """
+    Give the job its own doc folder backed by an identical earlier generation.
+
+    The new folder gets the job's visibility and organization. When it maps
+    to the same directory it simply references the existing output;
+    otherwise the docs are hard-linked (or copied) across. Any file rows of
+    an earlier attempt are replaced by the reused ones.
+
+    Returns:
+        GeneratedDocFolder or None: None, with the generation deleted, if
+        some of its docs no longer exist; the job then generates normally
+    """
+    source_folder = generation.doc_folder
+    manifest = source_folder.source_manifest
+    doc_folder = get_or_create_doc_folder(job, github_info['repo'], 'github')
+
+    if os.path.normpath(doc_folder.folder_path) != os.path.normpath(source_folder.folder_path):
+        invalidate_generations(doc_folder)
+    missing = [
+        path for path, entry in manifest.items()
+        if not reuse_doc_file(
+            os.path.join(source_folder.folder_path, entry['output']),
+            os.path.join(doc_folder.folder_path, entry['output'])
+        )
+    ]
+    if missing:
+        logger.warning(
+            f"Ingestion job {job.id} cannot reuse generation {generation.id} of {generation}: "
+            f"{len(missing)} docs are gone, e.g. {missing[0]}"
+        )
+        generation.delete()
+        return None
+
+    doc_folder.source_key = source_folder.source_key
+    doc_folder.source_manifest = manifest
+    doc_folder.save(update_fields=['source_key', 'source_manifest'])
+
+    with transaction.atomic():
+        job.files.all().delete()
+        IngestionFile.objects.bulk_create(
+            [
+                IngestionFile(job=job, path=path, status='done', strategy='reused',
+                              source_hash=entry['hash'], output_path=entry['output'])
+                for path, entry in manifest.items()
+            ],
+            batch_size=500
+        )
+    job.failed_paths = []
+    claimed_job(job).update(
+        total_files=len(manifest), processed_files=len(manifest), failed_files=0, failed_paths=[]
+    )
+    logger.info(f"Ingestion job {job.id} reused generation {generation.id} of {generation}")
+
+    link_github_repository(job, doc_folder, github_info)
+    return doc_folder
+
+
+def invalidate_generations(doc_folder):
+    """
+    Forget the registered generations stored in doc_folder's directory.
+
+    Called whenever docs there are rewritten in place, e.g. by a re-import of
+    another commit or a webhook sync, since they no longer match the commit
+    the generation was registered for.
+    """
+    RepositoryGeneration.objects.filter(doc_folder__folder_path=doc_folder.folder_path).delete()
+
+
+def get_or_create_doc_folder(job, folder_name, source_type):
+    """Return the job's doc folder, creating it (and linking it to the job) on the first attempt"""
+    if job.doc_folder_id:
+        return job.doc_folder
+
+    docs_output_root = os.path.join(settings.PUBLIC_DOCS_PATH, folder_name)
+    # Keep different owners' imports of same-named repositories apart
+    if GeneratedDocFolder.objects.filter(folder_path=docs_output_root).exclude(user=job.user).exists():
+        docs_output_root = os.path.join(settings.PUBLIC_DOCS_PATH, f"{folder_name}-{job.id}")
+    os.makedirs(docs_output_root, exist_ok=True)
+
+    if job.user:
+        doc_folder = GeneratedDocFolder.objects.create(
+            folder_path=docs_output_root,
+            user=job.user,
+            visibility=job.visibility,
+            organization=job.organization,
+            source_type=source_type,
+            include_globs=job.include_globs,
+            exclude_globs=job.exclude_globs
+        )
+    else:
+        doc_folder = GeneratedDocFolder.objects.create(
+            folder_path=docs_output_root,
+            visibility='public',
+            source_type=source_type,
+            include_globs=job.include_globs,
+            exclude_globs=job.exclude_globs
+        )
+
+    job.doc_folder = doc_folder
+    IngestionJob.objects.filter(pk=job.pk).update(doc_folder=doc_folder)
+    return doc_folder
+
+
+def load_checkpoints(job, paths):
+    """
+    Add pending manifest entries for paths new to the job and return the
+    source hashes of the entries already done.
+
+    Returns:
+        dict: rel_path -> source hash
+    """
+    known = set(job.files.values_list('path', flat=True))
+    IngestionFile.objects.bulk_create(
+        [IngestionFile(job=job, path=path) for path in paths if path not in known],
+        batch_size=500
+    )
+    return dict(job.files.filter(status='done').values_list('path', 'source_hash'))
+
+
+def repository_path(rel_path, root):
+    """Strip the archive's top-level directory so paths match across snapshots"""
+    return rel_path[len(root) + 1:] if root and rel_path.startswith(root + '/') else rel_path
+
+
+def find_previous_import(job, doc_folder, source_key):
+    """The latest other doc folder of the same owner and repository that has a source manifest"""
+    candidates = GeneratedDocFolder.objects.filter(
+        user=job.user,
+        source_key=source_key
+    ).exclude(pk=doc_folder.pk).order_by('-uploaded_at')
+
+    for folder in candidates[:5]:
+        if folder.source_manifest:
+            return folder
+    return None
+
+
+def previous_import_docs(previous_folder):
+    """
+    Map the previous import's manifest to the absolute paths of its docs.
+
+    Returns:
+        dict: rel_path -> (source hash, absolute doc path)
+    """
+    if not previous_folder:
+        return {}
+
+    return {
+        path: (entry['hash'], os.path.join(previous_folder.folder_path, entry['output']))
+        for path, entry in previous_folder.source_manifest.items()
+    }
+
+
+def save_source_manifest(job, doc_folder, source_key, paths, previous_folder=None):
+    """
+    Store the folder's path -> hash -> output manifest for the next re-import.
+
+    When the owner's previous import wrote to the same directory, docs of
+    files that were removed from the repository are deleted.
+    """
+    manifest = {
+        path: {'hash': source_hash, 'output': output_path}
+        for path, source_hash, output_path in job.files.filter(status='done').values_list(
+            'path', 'source_hash', 'output_path'
+        )
+        if output_path
+    }
+
+    doc_folder.source_key = source_key
+    doc_folder.source_manifest = manifest
+    doc_folder.save(update_fields=['source_key', 'source_manifest'])
+    invalidate_generations(doc_folder)
+
+    if (not previous_folder or previous_folder.user_id != doc_folder.user_id
+            or os.path.normpath(previous_folder.folder_path) != os.path.normpath(doc_folder.folder_path)):
+        return
+
+    current_outputs = {doc_output_path(path) for path in paths}
+    for entry in previous_folder.source_manifest.values():
+        if entry['output'] in current_outputs:
+            continue
+        remove_doc_file(doc_folder.folder_path, entry['output'])
+
+
+def update_source_manifest(doc_folder, synced, removed):
+    """
+    Bring the folder's manifest in line with a webhook sync of its docs.
+
+    Args:
+        synced: rel_path -> hash of the source each rewritten doc was generated from
+        removed: rel_paths of files whose docs were deleted
+    """
+    manifest = dict(doc_folder.source_manifest or {})
+    for path in removed:
+        manifest.pop(path, None)
+    for path, source_hash in synced.items():
+        manifest[path] = {'hash': source_hash, 'output': doc_output_path(path)}
+
+    doc_folder.source_manifest = manifest
+    doc_folder.save(update_fields=['source_manifest'])
+
+
+def remove_doc_file(docs_output_root, output_path):
+    """Delete a stale doc and any directories it leaves empty"""
+    md_path = os.path.join(docs_output_root, output_path)
+    if not os.path.exists(md_path):
+        return
+    os.remove(md_path)
+
+    directory = os.path.dirname(md_path)
+    while os.path.normpath(directory) != os.path.normpath(docs_output_root):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+
+
+def setup_auto_sync(job, doc_folder, github_info):
+    """Create the GitHub webhook for a finished import using the owner's stored token"""
+    github_token = github_token_for(job.user)
+    if not github_token:
+        job.auto_sync_error = 'GitHub token is required to enable auto-sync'
+    else:
+        try:
+            from webhook.services import GitHubWebhookService
+            service = GitHubWebhookService()
+            success, message = service.setup_webhook(
+                github_info['url'],
+                github_token,
+                doc_folder
+            )
+            if not success:
+                job.auto_sync_error = f'Auto-sync setup failed: {message}'
+        except Exception as e:
+            job.auto_sync_error = f'Auto-sync setup error: {str(e)}'
+
+    if job.auto_sync_error:
+        claimed_job(job).update(auto_sync_error=job.auto_sync_error)
+
+
+def claimed_job(job):
+    """
+    The job's row, matched only while it is still this claim of it.
+
+    A requeued job loses its worker_id and a re-claimed one gets another
+    worker_id or attempt number, so writes through this queryset update
+    nothing once the job has been taken over.
+    """
+    return IngestionJob.objects.filter(pk=job.pk, worker_id=job.worker_id, attempts=job.attempts)
+
+
+# Job pk -> JobHeartbeat of the jobs this process is running
+_heartbeats = {}
+_heartbeats_lock = threading.Lock()
+
+
+def ensure_claimed(job):
+    """Raise JobLost once the job's heartbeat has found it taken over by another worker"""
+    with _heartbeats_lock:
+        heartbeat = _heartbeats.get(job.pk)
+    if heartbeat is not None and heartbeat.lost.is_set():
+        raise JobLost(f"Ingestion job {job.id} is no longer claimed by worker {job.worker_id}")
+
+
+class JobHeartbeat:
+    """
+    Refresh a running job's heartbeat_at every INGESTION_HEARTBEAT_SECONDS from a background thread.
+
+    Progress writes only happen when a file finishes, so without this a job
+    busy with a long download, a chunked file or a wait for scheduler
+    capacity would look stale and be requeued while it runs. Once the job
+    has been taken over the thread stops refreshing and sets lost, and the
+    job stops before its next file (see ensure_claimed) or at its next
+    progress write, whichever comes first.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'heartbeat-{job.pk}', daemon=True)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(settings.INGESTION_HEARTBEAT_SECONDS):
+                try:
+                    updated = claimed_job(self.job).filter(status='running').update(heartbeat_at=timezone.now())
+                except Exception as e:
+                    logger.warning(f"Could not refresh the heartbeat of ingestion job {self.job.id}: {str(e)}")
+                    continue
+                if not updated:
+                    logger.warning(
+                        f"Ingestion job {self.job.id} was taken over; worker {self.job.worker_id} stops before its next file"
+                    )
+                    self.lost.set()
+                    return
+        finally:
+            # The thread has its own database connection
+            connection.close()
+
+    def __enter__(self):
+        with _heartbeats_lock:
+            _heartbeats[self.job.pk] = self
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        with _heartbeats_lock:
+            _heartbeats.pop(self.job.pk, None)
+
+
+def requeue_stale_jobs():
+    """
+    Hand running jobs whose worker stopped heartbeating back to the queue.
+
+    A job that has already used INGESTION_MAX_ATTEMPTS attempts is failed
+    instead. Resumed jobs pick up from their per-file checkpoints.
+    """
+    stale_before = timezone.now() - timedelta(seconds=settings.INGESTION_JOB_STALE_SECONDS)
+    stale_jobs = IngestionJob.objects.filter(status='running', heartbeat_at__lt=stale_before)
+
+    for job in stale_jobs:
+        if job.attempts >= settings.INGESTION_MAX_ATTEMPTS:
+            updated = IngestionJob.objects.filter(pk=job.pk, status='running', heartbeat_at=job.heartbeat_at).update(
+                status='failed',
+                error_message=f'Worker {job.worker_id} stopped responding',
+                finished_at=timezone.now()
+            )
+        else:
+            updated = IngestionJob.objects.filter(pk=job.pk, status='running', heartbeat_at=job.heartbeat_at).update(
+                status='queued',
+                worker_id=None
+            )
+        if updated:
+            logger.warning(f"Ingestion job {job.id} on worker {job.worker_id} went stale")
+
+
+def claim_next_job(worker_id):
+    """
+    Atomically claim a queued job for worker_id, fair-sharing jobs across tenants.
+
+    Among the oldest queued jobs, one whose tenant (organization, else
+    user) has the fewest jobs running is claimed first, oldest first within
+    that. So one tenant queueing many imports cannot hold every worker slot.
+    The claim is a conditional UPDATE on the status column so several
+    workers can poll the same table without picking the same job.
+
+    Returns:
+        IngestionJob or None
+    """
+    requeue_stale_jobs()
+
+    running = Counter(
+        tenant_key(user_id, organization_id) for user_id, organization_id in
+        IngestionJob.objects.filter(status='running').values_list('user_id', 'organization_id')
+    )
+    queued = IngestionJob.objects.filter(status='queued').order_by('created_at').values_list(
+        'id', 'user_id', 'organization_id'
+    )[:50]
+    candidates = sorted(queued, key=lambda row: running[tenant_key(row[1], row[2])])
+
+    for job_id, user_id, organization_id in candidates[:10]:
+        now = timezone.now()
+        claimed = IngestionJob.objects.filter(id=job_id, status='queued').update(
+            status='running',
+            worker_id=worker_id,
+            attempts=F('attempts') + 1,
+            started_at=now,
+            heartbeat_at=now
+        )
+        if claimed:
+            logger.info(
+                f"Worker {worker_id} claimed ingestion job {job_id} for {tenant_key(user_id, organization_id)} "
+                f"({running[tenant_key(user_id, organization_id)]} of its jobs already running)"
+            )
+            return IngestionJob.objects.get(id=job_id)
+    return None
+
+
+def requeue_failed_files(job):
+    """
+    Requeue a finished job so that only its failed and unfinished files are regenerated.
+
+    Raises:
+        Exception: if the job has nothing to retry or its source is gone
+    """
+    if not job.can_retry:
+        raise Exception(ErrorMessages.NOTHING_TO_RETRY.value)
+
+    job.status = 'queued'
+    job.error_message = None
+    job.auto_sync_error = None
+    job.finished_at = None
+    job.save(update_fields=['status', 'error_message', 'auto_sync_error', 'finished_at'])
+    return job
+
+
+def run_ingestion_job(job):
+    """
+    Run a claimed ingestion job to completion, recording its final status.
+
+    The outcome is only written while the job is still this worker's claim;
+    a job that was requeued or re-claimed meanwhile is left to its new owner.
+    """
+    try:
+        with JobHeartbeat(job):
+            if job.source_type == 'github':
+                doc_folder = process_github_repository(job)
+            else:
+                doc_folder = process_zip_file(job, job.upload_path)
+
+        job.doc_folder = doc_folder
+        job.status = 'done'
+    except JobLost as e:
+        logger.warning(str(e))
+        job.status = 'failed'
+        job.error_message = str(e)
+    except Exception as e:
+        logger.exception(f"Ingestion job {job.id} failed")
+        job.status = 'failed'
+        job.error_message = str(e)
+    finally:
+        job.finished_at = timezone.now()
+        finished = claimed_job(job).update(
+            status=job.status,
+            error_message=job.error_message,
+            finished_at=job.finished_at,
+            doc_folder=job.doc_folder
+        )
+        job.refresh_from_db(fields=['total_files', 'processed_files', 'failed_files'])
+        if not finished:
+            logger.warning(f"Ingestion job {job.id} was taken over; worker {job.worker_id} leaves its status alone")
+        # Keep the upload while files may still be retried
+        elif job.status == 'done' and not job.failed_files and job.upload_path and os.path.exists(job.upload_path):
+            shutil.rmtree(os.path.dirname(job.upload_path), ignore_errors=True)
+
+    return job
@@ -0,0 +1,277 @@
+import os
+import random
+import resource
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import defaultdict
+from contextlib import contextmanager
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+
+from ai_model.backends import get_backend
+from dashboard.ingestion import spool_upload, select_archive_members, document_repository
+from dashboard.models import GeneratedDocFolder, IngestionJob
+from webhook.models import GitHubRepository, WebhookEvent
+from webhook.views import GitHubWebhookView
+
+BENCHMARK_USERNAME = 'ingestion-benchmark'
+
+
+class StageTimer:
+    """Wall-clock seconds per pipeline stage, plus database query time via a connection wrapper"""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.queries = 0
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - started
+
+    def timed(self, name, func):
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def database(self, execute, sql, params, many, context):
+        self.queries += 1
+        with self.stage('database'):
+            return execute(sql, params, many, context)
+
+
+class PeakRSS:
+    """Samples the resident set size while a path runs; falls back to the process-lifetime peak"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current():
+        try:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+class BenchmarkWebhookView(GitHubWebhookView):
+    """Webhook view whose file downloads come from the synthetic repository instead of GitHub"""
+
+    def __init__(self, contents, timer):
+        super().__init__()
+        self.contents = contents
+        self.timer = timer
+
+    def download_file_content(self, github_repo, file_path, commit_sha):
+        with self.timer.stage('download'):
+            return self.contents[file_path]
+
+
+def python_source(rng, size, nonce):
+    """Plausible Python module of roughly size bytes; nonce keeps every run's content unique"""
+    lines = [f'"""Synthetic module {nonce}"""', 'import os', '']
+    length = sum(len(line) + 1 for line in lines)
+    number = 0
+    while length < size:
+        number += 1
+        body = [
+            f"def function_{number}(value, scale={rng.randint(1, 9)}):",
+            f'    """Return value transformed by step {number}"""',
+            f"    result = value * scale + {rng.randint(0, 1000)}",
+            f"    if result > {rng.randint(1000, 9999)}:",
+            f"        return os.path.join(str(result), 'part_{number}')",
+            "    return result",
+            "",
+        ]
+        lines.extend(body)
+        length += sum(len(line) + 1 for line in body)
+    return '\n'.join(lines)
+
+
+def synthetic_repository(file_count, mean_size, depth, seed):
+    """
+    Build {path: bytes} for a repository of file_count Python files.
+
+    Sizes follow a log-normal distribution around mean_size, capped below
+    the file selection limit, and files are spread over directories nested
+    up to depth levels.
+    """
+    rng = random.Random(seed)
+    nonce = uuid.uuid4().hex
+    max_size = settings.FILE_SELECTION_MAX_FILE_BYTES - 1024
+    contents = {}
+    for number in range(file_count):
+        directories = [f"pkg_{rng.randint(0, 4)}" for _ in range(rng.randint(0, depth))]
+        path = '/'.join(directories + [f"module_{number}.py"])
+        size = min(max_size, max(64, int(rng.lognormvariate(0, 0.8) * mean_size)))
+        contents[path] = python_source(rng, size, nonce).encode('utf-8')
+    return contents
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the upload and webhook ingestion paths end to end on synthetic repositories, "
+        "with the fake inference backend standing in for the model"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=200, help="Files in the synthetic repository")
+        parser.add_argument('--mean-size', type=int, default=4096, help="Typical file size in bytes")
+        parser.add_argument('--depth', type=int, default=3, help="Maximum directory nesting depth")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the repository layout")
+        parser.add_argument('--latency', type=float, default=settings.FAKE_LLM_LATENCY_SECONDS,
+                            help="Fake model seconds before the first token")
+        parser.add_argument('--tokens-per-second', type=float, default=settings.FAKE_LLM_TOKENS_PER_SECOND,
+                            help="Fake model generation speed (0 is instant)")
+        parser.add_argument('--paths', default='upload,webhook',
+                            help="Comma-separated ingestion paths to run: upload, webhook")
+        parser.add_argument('--keep', action='store_true',
+                            help="Keep the generated docs, database rows and working directory")
+
+    def handle(self, *args, **options):
+        work_dir = tempfile.mkdtemp(prefix='repo2doc-benchmark-')
+        contents = synthetic_repository(options['files'], options['mean_size'], options['depth'], options['seed'])
+        total_bytes = sum(len(data) for data in contents.values())
+        self.stdout.write(f"Synthetic repository: {len(contents)} files, {total_bytes} bytes, working in {work_dir}")
+
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+        fake = get_backend('fake')
+        overrides = override_settings(
+            INFERENCE_BACKENDS=['fake'],
+            INFERENCE_ROUTES={},
+            FAKE_LLM_LATENCY_SECONDS=options['latency'],
+            FAKE_LLM_TOKENS_PER_SECOND=options['tokens_per_second'],
+            DOC_CACHE_ENABLED=False,
+            TOKEN_QUOTA_USER_DAILY=0,
+            PUBLIC_DOCS_PATH=os.path.join(work_dir, 'docs'),
+            INGESTION_UPLOAD_DIR=os.path.join(work_dir, 'uploads'),
+        )
+
+        created = []
+        try:
+            with overrides:
+                for path in [path.strip() for path in options['paths'].split(',') if path.strip()]:
+                    fake.reset_stats()
+                    timer = StageTimer()
+                    if path == 'upload':
+                        wall, rss, files = self.run_upload(user, contents, work_dir, timer, created)
+                    elif path == 'webhook':
+                        wall, rss, files = self.run_webhook(user, contents, work_dir, timer, created)
+                    else:
+                        self.stderr.write(f"Unknown path {path}")
+                        continue
+                    self.report(path, wall, rss, files, timer, fake)
+        finally:
+            if not options['keep']:
+                for obj in reversed(created):
+                    obj.delete()
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    def run_upload(self, user, contents, work_dir, timer, created):
+        """ZIP upload: spool, select from the central directory, then document as the ingestion worker does"""
+        zip_path = os.path.join(work_dir, 'bench-repo.zip')
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+            for path, data in contents.items():
+                zip_ref.writestr(f"bench-repo/{path}", data)
+
+        with PeakRSS() as rss:
+            started = time.perf_counter()
+            with timer.stage('spool'), open(zip_path, 'rb') as f:
+                upload_path = spool_upload(File(f, name=os.path.basename(zip_path)))
+            job = IngestionJob.objects.create(
+                user=user, visibility='private', source_type='upload', upload_path=upload_path, status='running'
+            )
+            created.append(job)
+
+            with zipfile.ZipFile(upload_path) as zip_ref:
+                with timer.stage('select'):
+                    source_files, selector = select_archive_members(zip_ref, job)
+                source_files = [(path, timer.timed('read', read)) for path, read in source_files]
+                with timer.stage('document'), connection.execute_wrapper(timer.database):
+                    doc_folder = document_repository(job, source_files, selector, 'bench-repo')
+            created.append(doc_folder)
+            wall = time.perf_counter() - started
+
+        return wall, rss.peak, len(source_files)
+
+    def run_webhook(self, user, contents, work_dir, timer, created):
+        """Push event: every synthetic file arrives as added in one push and is regenerated"""
+        doc_folder = GeneratedDocFolder.objects.create(
+            user=user, visibility='private', source_type='github',
+            folder_path=os.path.join(work_dir, 'docs', 'bench-webhook')
+        )
+        created.append(doc_folder)
+        github_repo = GitHubRepository.objects.create(
+            doc_folder=doc_folder, github_url='https://github.com/benchmark/bench-repo',
+            owner='benchmark', repo_name='bench-repo'
+        )
+        payload = {'commits': [{'id': uuid.uuid4().hex, 'added': list(contents), 'modified': [], 'removed': []}]}
+        view = BenchmarkWebhookView(contents, timer)
+
+        with PeakRSS() as rss:
+            started = time.perf_counter()
+            webhook_event = WebhookEvent.objects.create(
+                github_repo=github_repo, event_type='push',
+                github_delivery_id=uuid.uuid4().hex, payload=payload, status='pending'
+            )
+            with timer.stage('document'), connection.execute_wrapper(timer.database):
+                view.handle_push_event(webhook_event, payload)
+            wall = time.perf_counter() - started
+
+        webhook_event.refresh_from_db()
+        return wall, rss.peak, webhook_event.files_processed
+
+    def report(self, path, wall, rss, files, timer, fake):
+        self.stdout.write(self.style.SUCCESS(f"\n{path}"))
+        self.stdout.write(f"  files          {files}")
+        self.stdout.write(f"  wall           {wall:.2f}s")
+        self.stdout.write(f"  files/sec      {files / wall if wall else 0:.1f}")
+        self.stdout.write(f"  peak RSS       {rss / (1024 * 1024):.1f} MB")
+        self.stdout.write("  stages (calling thread):")
+        for stage in ('spool', 'select', 'download', 'read', 'database'):
+            if stage in timer.seconds:
+                extra = f" ({timer.queries} queries)" if stage == 'database' else ''
+                self.stdout.write(f"    {stage:<15} {timer.seconds[stage]:.2f}s{extra}")
+        # Reads, downloads and queries happen inside the document stage, on the calling thread
+        other = timer.seconds['document'] - sum(
+            timer.seconds[stage] for stage in ('read', 'download', 'database') if stage in timer.seconds
+        )
+        self.stdout.write(f"    {'generate+write':<15} {other:.2f}s")
+        parallelism = fake.busy_seconds / timer.seconds['document'] if timer.seconds['document'] else 0
+        self.stdout.write(
+            f"  inference      {fake.calls} calls, {fake.busy_seconds:.2f}s summed across workers "
+            f"(x{parallelism:.1f} parallel)"
+        )
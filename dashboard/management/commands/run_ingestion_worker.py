@@ -0,0 +1,70 @@
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from ai_model.backends import get_router
+from dashboard.ingestion import claim_next_job, run_ingestion_job
+
+
+class Command(BaseCommand):
+    help = "Claim queued ingestion jobs and generate their documentation"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process at most one job and exit')
+        parser.add_argument('--no-warm-up', action='store_true',
+                            help='Prepare the inference backend on the first job instead of at startup')
+        parser.add_argument('--poll-interval', type=float, default=settings.INGESTION_WORKER_POLL_INTERVAL,
+                            help='Seconds to wait between polls when the queue is empty')
+        parser.add_argument('--concurrency', type=int, default=settings.INGESTION_WORKER_CONCURRENCY,
+                            help='Jobs to run at once; their files share the fair-share generation scheduler')
+
+    def handle(self, *args, **options):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stdout.write(f"Ingestion worker {worker_id} started")
+
+        if not options['no_warm_up']:
+            self.stdout.write(f"Inference backend ready in {get_router('docs').warm_up():.1f}s")
+
+        concurrency = 1 if options['once'] else max(1, options['concurrency'])
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ingestion') as executor:
+            running = set()
+            while True:
+                job = claim_next_job(worker_id) if len(running) < concurrency else None
+
+                if job is not None:
+                    self.stdout.write(f"Processing ingestion job {job.id} ({job.source_type}) for {job.tenant}")
+                    running.add(executor.submit(self.run_job, job))
+                    if not options['once']:
+                        continue
+
+                if not running:
+                    if options['once']:
+                        return
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                # Poll again once a job finishes or the interval passes, whichever comes first
+                done, running = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.report(future.result())
+                if options['once'] and not running:
+                    return
+
+    def run_job(self, job):
+        try:
+            return run_ingestion_job(job)
+        finally:
+            # Each job thread has its own database connection
+            connection.close()
+
+    def report(self, job):
+        if job.status == 'done':
+            self.stdout.write(self.style.SUCCESS(
+                f"Job {job.id} done: {job.processed_files}/{job.total_files} files, {job.failed_files} failed"
+            ))
+        else:
+            self.stdout.write(self.style.ERROR(f"Job {job.id} failed: {job.error_message}"))
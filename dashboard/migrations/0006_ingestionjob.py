@@ -0,0 +1,45 @@
+# Generated by Django 4.2.23 on 2026-10-18 18:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('organization', '0001_initial'),
+        ('dashboard', '0005_generateddocfolder_auto_sync_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('visibility', models.CharField(choices=[('public', 'Public'), ('private', 'Private'), ('organization', 'Organization')], default='public', max_length=20)),
+                ('source_type', models.CharField(choices=[('upload', 'Uploaded ZIP'), ('github', 'GitHub Repository')], default='upload', max_length=10)),
+                ('github_url', models.URLField(blank=True, max_length=500, null=True)),
+                ('upload_path', models.TextField(blank=True, null=True)),
+                ('auto_sync_requested', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('worker_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('auto_sync_error', models.TextField(blank=True, null=True)),
+                ('total_files', models.IntegerField(default=0)),
+                ('processed_files', models.IntegerField(default=0)),
+                ('failed_files', models.IntegerField(default=0)),
+                ('failed_paths', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('doc_folder', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ingestion_jobs', to='dashboard.generateddocfolder')),
+                ('organization', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ingestion_jobs', to='organization.organization')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ingestion_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
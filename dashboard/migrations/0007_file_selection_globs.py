@@ -0,0 +1,33 @@
+# Generated by Django 4.2.23 on 2026-10-18 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generateddocfolder',
+            name='exclude_globs',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='generateddocfolder',
+            name='include_globs',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='exclude_globs',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='include_globs',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.23 on 2026-10-18 18:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_file_selection_globs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.TextField()),
+                ('strategy', models.CharField(blank=True, choices=[('cached', 'Cached'), ('whole', 'Whole file'), ('trim', 'Trimmed'), ('chunk', 'Chunked')], max_length=10, null=True)),
+                ('code_tokens', models.IntegerField(default=0)),
+                ('prompt_tokens', models.IntegerField(default=0)),
+                ('completion_tokens', models.IntegerField(default=0)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='files', to='dashboard.ingestionjob')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.23 on 2026-10-18 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_ingestion_checkpoints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generateddocfolder',
+            name='source_key',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='generateddocfolder',
+            name='source_manifest',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='ingestionfile',
+            name='strategy',
+            field=models.CharField(blank=True, choices=[('reused', 'Reused from a previous import'), ('cached', 'Cached'), ('whole', 'Whole file'), ('trim', 'Trimmed'), ('chunk', 'Chunked')], max_length=10, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-18 18:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_source_manifest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepositoryGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_key', models.CharField(db_index=True, max_length=255)),
+                ('commit_sha', models.CharField(max_length=40)),
+                ('generation_key', models.CharField(max_length=64)),
+                ('file_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('doc_folder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='generations', to='dashboard.generateddocfolder')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['source_key', 'generation_key', 'commit_sha'], name='dashboard_r_source__27bb39_idx')],
+            },
+        ),
+    ]
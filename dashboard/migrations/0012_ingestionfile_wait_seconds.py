@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0011_repositorygeneration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestionfile',
+            name='wait_seconds',
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -2,6 +2,7 @@
 from django.db import models
 import os
 from django.contrib.auth.models import User
+from repo2doc_api.scheduler import tenant_key
 
 class GeneratedDocFolder(models.Model):
     VISIBILITY_CHOICES = [
@@ -26,6 +27,15 @@ class GeneratedDocFolder(models.Model):
     auto_sync = models.BooleanField(default=False)
     github_token = models.CharField(max_length=255, null=True, blank=True)
     
+    # Per-repository file selection globs (comma or newline separated)
+    include_globs = models.TextField(blank=True, default='')
+    exclude_globs = models.TextField(blank=True, default='')
+    
+    # Identifies re-imports of the same repository, e.g. "github:owner/repo"
+    source_key = models.CharField(max_length=255, blank=True, default='', db_index=True)
+    # Repository-relative source path -> {'hash': sha256 of the source, 'output': .md path relative to folder_path}
+    source_manifest = models.JSONField(default=dict, blank=True)
+    
     @property
     def folder_name(self):
         return os.path.basename(self.folder_path)
@@ -41,3 +51,138 @@ class GeneratedDocFolder(models.Model):
         if self.is_github_repo:
             return self.github_repo.is_webhook_active
         return False
+
+
+class RepositoryGeneration(models.Model):
+    """
+    Registry of completed imports of public GitHub repositories.
+
+    Lets an import of the same repository at the same commit, with the same
+    selection rules and model settings, reuse an existing doc folder instead
+    of generating it again, and a later commit reuse every unchanged doc.
+    """
+
+    source_key = models.CharField(max_length=255, db_index=True)  # e.g. "github:owner/repo"
+    commit_sha = models.CharField(max_length=40)
+    generation_key = models.CharField(max_length=64)  # Hash of prompt version, model settings and globs
+    doc_folder = models.ForeignKey(GeneratedDocFolder, on_delete=models.CASCADE, related_name='generations')
+    file_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['source_key', 'generation_key', 'commit_sha'])]
+
+    def __str__(self):
+        return f"{self.source_key}@{self.commit_sha[:7]}"
+
+
+class IngestionJob(models.Model):
+    """Background job that downloads, extracts and documents a repository"""
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='ingestion_jobs')
+    visibility = models.CharField(max_length=20, choices=GeneratedDocFolder.VISIBILITY_CHOICES, default='public')
+    organization = models.ForeignKey('organization.Organization', on_delete=models.SET_NULL, null=True, blank=True, related_name='ingestion_jobs')
+
+    # Source of the repository
+    source_type = models.CharField(max_length=10, choices=GeneratedDocFolder.SOURCE_CHOICES, default='upload')
+    github_url = models.URLField(max_length=500, null=True, blank=True)
+    upload_path = models.TextField(null=True, blank=True)  # Spooled ZIP for uploads
+    auto_sync_requested = models.BooleanField(default=False)
+    include_globs = models.TextField(blank=True, default='')
+    exclude_globs = models.TextField(blank=True, default='')
+
+    # Processing status
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    worker_id = models.CharField(max_length=100, null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # Refreshed by the worker while the job runs
+    error_message = models.TextField(null=True, blank=True)
+    auto_sync_error = models.TextField(null=True, blank=True)
+
+    # Per-file progress
+    total_files = models.IntegerField(default=0)
+    processed_files = models.IntegerField(default=0)
+    failed_files = models.IntegerField(default=0)
+    failed_paths = models.JSONField(default=list, blank=True)
+
+    doc_folder = models.ForeignKey(GeneratedDocFolder, on_delete=models.SET_NULL, null=True, blank=True, related_name='ingestion_jobs')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"Ingestion job {self.id} - {self.status}"
+
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed')
+
+    @property
+    def tenant(self):
+        """Tenant the job's files are fair-shared under (see repo2doc_api.scheduler)"""
+        return tenant_key(self.user_id, self.organization_id)
+
+    @property
+    def can_retry(self):
+        """Finished with failures and the source can still be read"""
+        if not self.is_finished or not (self.status == 'failed' or self.failed_files):
+            return False
+        return self.source_type == 'github' or bool(self.upload_path and os.path.exists(self.upload_path))
+
+
+class IngestionFile(models.Model):
+    """
+    Per-file manifest entry of an ingestion job.
+
+    Entries are written as pending once the archive is listed and checkpointed
+    as each file finishes, so a restarted or retried job can skip files whose
+    documentation already exists for the same source hash.
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+    ]
+
+    STRATEGY_CHOICES = [
+        ('reused', 'Reused from a previous import'),
+        ('cached', 'Cached'),
+        ('whole', 'Whole file'),
+        ('trim', 'Trimmed'),
+        ('chunk', 'Chunked'),
+    ]
+
+    job = models.ForeignKey(IngestionJob, on_delete=models.CASCADE, related_name='files')
+    path = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    source_hash = models.CharField(max_length=64, null=True, blank=True)
+    output_path = models.TextField(null=True, blank=True)  # Relative to the doc folder
+    strategy = models.CharField(max_length=10, choices=STRATEGY_CHOICES, null=True, blank=True)
+    code_tokens = models.IntegerField(default=0)
+    prompt_tokens = models.IntegerField(default=0)
+    completion_tokens = models.IntegerField(default=0)
+    wait_seconds = models.FloatField(default=0)  # Time queued in the fair-share scheduler before generation
+    error_message = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['id']
+        unique_together = ('job', 'path')
+
+    def __str__(self):
+        return f"{self.path} ({self.job_id}) - {self.status}"
@@ -141,53 +141,54 @@ document.addEventListener('DOMContentLoaded', function() {
       // Show loading overlay
       loadingOverlay.style.display = 'flex';
       
-      // Simulate loading progress
-      let progress = 0;
-      const interval = setInterval(() => {
-        progress += Math.random() * 3;
-        if (progress > 95) progress = 95; // Stop at 95% until completion
-        
+      function showProgress(progress) {
         loadingBar.style.width = progress + '%';
         loadingPercentage.textContent = Math.round(progress) + '%';
-      }, 200);
+      }
+      
+      // Poll the ingestion job until the worker has finished it
+      function pollJob(statusUrl) {
+        fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+        .then(response => response.json())
+        .then(job => {
+          if (job.total_files > 0) {
+            showProgress(Math.min(99, (job.processed_files / job.total_files) * 100));
+          }
+          
+          if (job.status === 'done') {
+            showProgress(100);
+            if (job.failed_files > 0) {
+              loadingPercentage.textContent = `100% (${job.failed_files} file(s) could not be documented)`;
+            }
+            viewDocLink.setAttribute('href', `/doc_view/view/${job.doc_id}/`);
+            loadingComplete.style.display = 'block';
+          } else if (job.status === 'failed') {
+            loadingPercentage.textContent = 'Error: ' + (job.error || 'ingestion failed');
+          } else {
+            setTimeout(() => pollJob(statusUrl), 2000);
+          }
+        })
+        .catch(error => {
+          console.error('Error polling job status:', error);
+          setTimeout(() => pollJob(statusUrl), 5000);
+        });
+      }
       
-      // Submit the form in the background
+      showProgress(0);
+      
+      // Queue the ingestion job; the response carries the job's status URL
       fetch(uploadForm.action || window.location.href, {
         method: 'POST',
-        body: formData
+        body: formData,
+        headers: { 'Accept': 'application/json' }
       })
-      .then(response => response.text())
-      .then(html => {
-        // Parsing completed - set to 100%
-        clearInterval(interval);
-        progress = 100;
-        loadingBar.style.width = '100%';
-        loadingPercentage.textContent = '100%';
-        
-        // Parse the response to get the ID of the generated doc
-        const parser = new DOMParser();
-        const doc = parser.parseFromString(html, 'text/html');
-        
-        // Try to get latest doc ID from the response
-        const latestDocIdEl = doc.getElementById('latest-doc-id');
-        if (latestDocIdEl) {
-          const latestDocId = latestDocIdEl.value;
-          viewDocLink.setAttribute('href', `/doc_view/view/${latestDocId}/`);
-        } else {
-          // Fallback to first doc in the list
-          const docLinks = doc.querySelectorAll('.doc-link');
-          if (docLinks.length > 0) {
-            const latestDocLink = docLinks[0].getAttribute('href');
-            viewDocLink.setAttribute('href', latestDocLink);
-          }
-        }
-        
-        // Show completion message
-        loadingComplete.style.display = 'block';
+      .then(response => {
+        if (!response.ok) throw new Error('HTTP ' + response.status);
+        return response.json();
       })
+      .then(job => pollJob(job.status_url))
       .catch(error => {
         console.error('Error submitting form:', error);
-        clearInterval(interval);
         loadingPercentage.textContent = 'Error';
         // Allow form to submit normally if fetch fails
         uploadForm.submit();
@@ -1,3 +1,239 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from ai_model.ledger import ledger
+from ai_model.testing import isolate_metrics
+from webhook.models import GitHubRepository, WebhookEvent
+from webhook.views import GitHubWebhookView
+from .ingestion import JobHeartbeat, JobLost, process_github_repository, process_zip_file
+from .models import IngestionFile, IngestionJob, RepositoryGeneration
+
+
+class FakeFetcher:
+    """Serves GitHub archives of in-memory commits, wrapped in GitHub's "<repo>-<sha>/" root"""
+
+    def __init__(self, work_dir, commits):
+        self.work_dir = work_dir
+        self.commits = commits
+        self.head = None
+
+    def resolve(self, owner, repo):
+        return 'main', self.head
+
+    def is_public(self, owner, repo):
+        return True
+
+    def estimated_size(self, owner, repo):
+        return 0
+
+    def fetch_archive(self, owner, repo, sha):
+        return write_archive(os.path.join(self.work_dir, f'{repo}-{sha}.zip'), f'{repo}-{sha}', self.commits[sha])
+
+
+def write_archive(zip_path, root, files):
+    with zipfile.ZipFile(zip_path, 'w') as zip_ref:
+        for path, code in files.items():
+            zip_ref.writestr(f'{root}/{path}', code)
+    return zip_path
+
+
+def module(name, value):
+    return f'def {name}():\n    return {value}\n'
+
+
+class IngestionTestCase(TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='repo2doc-tests-')
+        self.addCleanup(shutil.rmtree, self.work_dir, ignore_errors=True)
+        self.docs_root = os.path.join(self.work_dir, 'docs')
+
+        overrides = override_settings(
+            INFERENCE_BACKENDS=['fake'],
+            INFERENCE_ROUTES={},
+            FAKE_LLM_LATENCY_SECONDS=0,
+            FAKE_LLM_TOKENS_PER_SECOND=0,
+            DOC_CACHE_ENABLED=False,
+            TOKEN_QUOTA_USER_DAILY=0,
+            TOKEN_LEDGER_FLUSH_SECONDS=3600,
+            PUBLIC_DOCS_PATH=self.docs_root,
+            INGESTION_UPLOAD_DIR=os.path.join(self.work_dir, 'uploads'),
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        isolate_metrics(self)
+        # Write the usage ledger inside the test transaction rather than after the test database is gone
+        self.addCleanup(ledger.flush)
+
+        self.owner = User.objects.create(username='owner')
+
+    def create_job(self, user, **fields):
+        return IngestionJob.objects.create(
+            user=user, visibility='public', status='running', worker_id='test-worker', attempts=1, **fields
+        )
+
+    def file_strategies(self, job):
+        return dict(job.files.values_list('path', 'strategy'))
+
+    def doc_files(self, doc_folder):
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), doc_folder.folder_path)
+            for directory, _, names in os.walk(doc_folder.folder_path) for name in names
+        )
+
+
+class IncrementalUploadTests(IngestionTestCase):
+    def import_snapshot(self, root, files):
+        job = self.create_job(self.owner, source_type='upload')
+        zip_path = write_archive(os.path.join(self.work_dir, 'proj.zip'), root, files)
+        doc_folder = process_zip_file(job, zip_path)
+        return job, doc_folder
+
+    def test_reimport_reuses_unchanged_docs_and_removes_deleted_ones(self):
+        first_job, first_folder = self.import_snapshot('proj', {
+            'a.py': module('a', 1), 'b.py': module('b', 2), 'pkg/c.py': module('c', 3),
+        })
+        self.assertEqual(set(self.file_strategies(first_job).values()), {'whole'})
+
+        # Next week's snapshot is wrapped in a different root directory
+        job, doc_folder = self.import_snapshot('proj-v2', {
+            'a.py': module('a', 1), 'b.py': module('b', 20), 'd.py': module('d', 4),
+        })
+
+        self.assertEqual(doc_folder.folder_path, first_folder.folder_path)
+        self.assertEqual(self.file_strategies(job), {'a.py': 'reused', 'b.py': 'whole', 'd.py': 'whole'})
+        self.assertEqual(self.doc_files(doc_folder), ['a.md', 'b.md', 'd.md'])
+        self.assertEqual(set(doc_folder.source_manifest), {'a.py', 'b.py', 'd.py'})
+
+    def test_docs_mirror_the_repository_not_the_archive_root(self):
+        job, doc_folder = self.import_snapshot('proj-main', {'src/app.py': module('app', 1)})
+
+        self.assertEqual(self.doc_files(doc_folder), ['src/app.md'])
+        self.assertEqual(list(job.files.values_list('path', 'output_path')), [('src/app.py', 'src/app.md')])
+
+    def test_upload_whose_root_is_named_like_a_build_directory_is_documented(self):
+        job, doc_folder = self.import_snapshot('build', {'app.py': module('app', 1)})
+
+        self.assertEqual(self.doc_files(doc_folder), ['app.md'])
+
+    @override_settings(INGESTION_HEARTBEAT_SECONDS=3600)
+    def test_job_taken_over_stops_before_its_next_file(self):
+        job = self.create_job(self.owner, source_type='upload')
+        zip_path = write_archive(os.path.join(self.work_dir, 'proj.zip'), 'proj', {
+            'a.py': module('a', 1), 'b.py': module('b', 2),
+        })
+
+        with JobHeartbeat(job) as heartbeat, mock.patch('repo2doc_api.services.document_code') as document:
+            heartbeat.lost.set()
+            with self.assertRaises(JobLost):
+                process_zip_file(job, zip_path)
+
+        document.assert_not_called()
+        self.assertFalse(job.files.exclude(status='pending').exists())
+
+
+@mock.patch('dashboard.ingestion.link_github_repository')
+class GitHubReimportTests(IngestionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fetcher = FakeFetcher(self.work_dir, {
+            'aaa': {'a.py': module('a', 1), 'b.py': module('b', 2)},
+            'bbb': {'a.py': module('a', 1), 'b.py': module('b', 20)},
+        })
+        patcher = mock.patch('dashboard.ingestion.GitHubArchiveFetcher', return_value=self.fetcher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def import_commit(self, user, sha, job=None):
+        self.fetcher.head = sha
+        job = job or self.create_job(user, source_type='github', github_url='https://github.com/o/r')
+        return job, process_github_repository(job)
+
+    def test_reimport_of_a_new_commit_keeps_doc_paths(self, link):
+        _, first_folder = self.import_commit(self.owner, 'aaa')
+        job, doc_folder = self.import_commit(self.owner, 'bbb')
+
+        self.assertEqual(doc_folder.folder_path, first_folder.folder_path)
+        self.assertEqual(self.doc_files(doc_folder), ['a.md', 'b.md'])
+        self.assertEqual(self.file_strategies(job), {'a.py': 'reused', 'b.py': 'whole'})
+
+    def test_identical_import_reuses_the_generation(self, link):
+        _, first_folder = self.import_commit(self.owner, 'aaa')
+        job, doc_folder = self.import_commit(User.objects.create(username='other'), 'aaa')
+
+        self.assertNotEqual(doc_folder.folder_path, first_folder.folder_path)
+        self.assertEqual(self.file_strategies(job), {'a.py': 'reused', 'b.py': 'reused'})
+        self.assertEqual(self.doc_files(doc_folder), ['a.md', 'b.md'])
+
+    def test_generation_overwritten_by_a_later_commit_is_not_reused(self, link):
+        self.import_commit(self.owner, 'aaa')
+        self.import_commit(self.owner, 'bbb')
+        self.assertFalse(RepositoryGeneration.objects.filter(commit_sha='aaa').exists())
+
+        job, doc_folder = self.import_commit(User.objects.create(username='other'), 'aaa')
+
+        self.assertEqual(self.doc_files(doc_folder), ['a.md', 'b.md'])
+        # b.py at aaa is regenerated rather than served from the bbb docs now in that directory
+        self.assertEqual(self.file_strategies(job)['b.py'], 'whole')
+
+    def test_generation_with_missing_docs_falls_back_to_generating(self, link):
+        _, first_folder = self.import_commit(self.owner, 'aaa')
+        os.remove(os.path.join(first_folder.folder_path, 'b.md'))
+
+        job, doc_folder = self.import_commit(User.objects.create(username='other'), 'aaa')
+
+        self.assertEqual(self.doc_files(doc_folder), ['a.md', 'b.md'])
+        self.assertEqual(self.file_strategies(job)['b.py'], 'whole')
+        self.assertEqual(IngestionJob.objects.get(pk=job.pk).processed_files, 2)
+
+    def sync_push(self, doc_folder, sha, modified=(), removed=()):
+        """Run a webhook push of commit sha that modified and removed the given files"""
+        github_repo = GitHubRepository.objects.create(
+            doc_folder=doc_folder, github_url='https://github.com/o/r', owner='o', repo_name='r'
+        )
+        event = WebhookEvent.objects.create(github_repo=github_repo, event_type='push', github_delivery_id=sha)
+        payload = {'commits': [{'id': sha, 'modified': list(modified), 'removed': list(removed)}]}
+        files = self.fetcher.commits[sha]
+        with mock.patch.object(GitHubWebhookView, 'download_file_content',
+                               side_effect=lambda repo, path, commit_sha: files[path].encode('utf-8')):
+            response = GitHubWebhookView().handle_push_event(event, payload)
+        self.assertEqual(response.status_code, 200)
+
+    def test_webhook_sync_updates_the_manifest(self, link):
+        _, doc_folder = self.import_commit(self.owner, 'aaa')
+        self.fetcher.commits['ccc'] = {'b.py': module('b', 20)}
+
+        self.sync_push(doc_folder, 'ccc', modified=['b.py'], removed=['a.py'])
+
+        doc_folder.refresh_from_db()
+        self.assertEqual(set(doc_folder.source_manifest), {'b.py'})
+        self.assertEqual(self.doc_files(doc_folder), ['b.md'])
+
+        # Reverting b.py regenerates its doc rather than reusing the one written for the synced content
+        job, _ = self.import_commit(self.owner, 'aaa')
+        self.assertEqual(self.file_strategies(job), {'a.py': 'whole', 'b.py': 'whole'})
+
+    def test_retried_job_reusing_a_generation_drops_earlier_failures(self, link):
+        self.import_commit(self.owner, 'aaa')
+        job = self.create_job(
+            User.objects.create(username='other'), source_type='github', github_url='https://github.com/o/r',
+            failed_files=1, failed_paths=[{'path': 'b.py', 'error': 'model timed out'}]
+        )
+        IngestionFile.objects.create(job=job, path='a.py', status='done', source_hash='old')
+        IngestionFile.objects.create(job=job, path='b.py', status='failed', error_message='model timed out')
+
+        self.import_commit(None, 'aaa', job=job)
+
+        job.refresh_from_db()
+        self.assertEqual((job.total_files, job.processed_files, job.failed_files), (2, 2, 0))
+        self.assertEqual(job.failed_paths, [])
+        self.assertEqual(
+            set(job.files.values_list('path', 'status', 'strategy')),
+            {('a.py', 'done', 'reused'), ('b.py', 'done', 'reused')}
+        )
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import index
+from .views import index, ingestion_job_status, retry_failed_files
 from .list_views import (
     public_repos_list,
     private_repos_list,
@@ -9,6 +9,8 @@ from .list_views import (
 
 urlpatterns = [
     path('', index, name='index'),
+    path('jobs/<int:job_id>/', ingestion_job_status, name='ingestion_job_status'),
+    path('docs/<int:doc_id>/retry-failed/', retry_failed_files, name='retry_failed_files'),
     path('list/public/', public_repos_list, name='public_repos_list'),
     path('list/private/', private_repos_list, name='private_repos_list'),
     path('list/my/', my_repos_list, name='my_repos_list'),
@@ -1,13 +1,16 @@
-import os, zipfile, tempfile
-import requests
-from django.shortcuts import render, redirect
+import zipfile
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
+from django.urls import reverse
+from django.db.models import Sum, Max
 from django.conf import settings
+from rest_framework import status
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from message_resource.api_message_resource import *
-from .models import GeneratedDocFolder
+from .models import GeneratedDocFolder, IngestionJob
+from .ingestion import parse_github_url, spool_upload, requeue_failed_files
 from django.contrib.auth.models import User  
 from organization.models import Organization, OrganizationMember
-from webhook.models import GitHubRepository
 
 def index(request):
     context = {}
@@ -68,162 +71,105 @@ def index(request):
             except Organization.DoesNotExist:
                 organization = None
         
+        job_fields = {
+            'user': request.user if request.user.is_authenticated else None,
+            'visibility': visibility if request.user.is_authenticated else 'public',
+            'organization': organization,
+            'auto_sync_requested': auto_sync == 'enabled' and request.user.is_authenticated,
+            'include_globs': request.POST.get('include_globs', '').strip(),
+            'exclude_globs': request.POST.get('exclude_globs', '').strip(),
+        }
+        job = None
+
         if github_url and github_url.startswith(('https://github.com/', 'http://github.com/')):
-            try:
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    parts = github_url.rstrip('/').split('/')
-                    if len(parts) >= 5:
-                        owner = parts[-2]
-                        repo = parts[-1]
-                        
-                        zip_url = f"https://github.com/{owner}/{repo}/archive/refs/heads/main.zip"
-                        
-                        response = requests.get(zip_url, stream=True)
-                        branch = 'main'
-                        if response.status_code == 404:
-                            zip_url = f"https://github.com/{owner}/{repo}/archive/refs/heads/master.zip"
-                            response = requests.get(zip_url, stream=True)
-                            branch = 'master'
-                        
-                        if response.status_code == 404:
-                            zip_url = f"https://api.github.com/repos/{owner}/{repo}/zipball"
-                            response = requests.get(zip_url, stream=True)
-                            branch = 'default'
-                        
-                        if response.status_code == 200:
-                            zip_path = os.path.join(temp_dir, f"{repo}.zip")
-                            with open(zip_path, 'wb') as f:
-                                for chunk in response.iter_content(chunk_size=8192):
-                                    f.write(chunk)
-                                    
-                            return process_zip_file(request, zip_path, visibility, organization, context, 
-                                                  github_info={'url': github_url, 'owner': owner, 'repo': repo, 'branch': branch})
-                        else:
-                            context[API_KEY_NAME.ERROR] = f"Failed to download repository: HTTP {response.status_code}"
-                    else:
-                        context[API_KEY_NAME.ERROR] = "Invalid GitHub repository URL format. Please use format: https://github.com/owner/repo"
-            except Exception as e:
-                context[API_KEY_NAME.ERROR] = f"Error processing GitHub URL: {str(e)}"                
-        
+            if parse_github_url(github_url):
+                job = IngestionJob.objects.create(source_type='github', github_url=github_url, **job_fields)
+            else:
+                context[API_KEY_NAME.ERROR] = "Invalid GitHub repository URL format. Please use format: https://github.com/owner/repo"
+
         elif uploaded_file and zipfile.is_zipfile(uploaded_file):
-            with tempfile.TemporaryDirectory() as temp_zip_dir:
-                zip_path = os.path.join(temp_zip_dir, uploaded_file.name)
-                with open(zip_path, 'wb') as f:
-                    for chunk in uploaded_file.chunks():
-                        f.write(chunk)
-                return process_zip_file(request, zip_path, visibility, organization, context, github_info=None)
+            upload_path = spool_upload(uploaded_file)
+            job = IngestionJob.objects.create(source_type='upload', upload_path=upload_path, **job_fields)
         else:
             context[API_KEY_NAME.ERROR] = ErrorMessages.INVALID_FILE_TYPE
 
+        if job:
+            if request.headers.get('Accept') == 'application/json':
+                return JsonResponse(job_progress_payload(job), status=202)
+
+            context[API_KEY_NAME.MESSAGE] = SuccessMessages.INGESTION_QUEUED
+            context['ingestion_job_id'] = job.id
+        elif request.headers.get('Accept') == 'application/json':
+            return JsonResponse({API_KEY_NAME.ERROR: context[API_KEY_NAME.ERROR]}, status=status.HTTP_400_BAD_REQUEST)
+
     return render(request, 'index.html', context)
 
-def process_zip_file(request, zip_path, visibility, organization, context, github_info=None):
-    with tempfile.TemporaryDirectory() as temp_dir:
-        zip_filename = os.path.basename(zip_path)
-        zip_name = os.path.splitext(zip_filename)[0]
-        
-        extract_dir = os.path.join(temp_dir, 'extracted')
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
-
-        docs_output_root = os.path.join(settings.PUBLIC_DOCS_PATH, zip_name)
-        os.makedirs(docs_output_root, exist_ok=True)
-
-        for root, dirs, files in os.walk(extract_dir):
-            for file in files:
-                if file.startswith('.') or '__MACOSX' in root or file.endswith('.zip'):
-                    continue
-
-                abs_path = os.path.join(root, file)
-                if not os.path.isfile(abs_path):
-                    continue
-
-                try:
-                    with open(abs_path, 'r', encoding='utf-8', errors='ignore') as source_file:
-                        code = source_file.read()
-                except Exception:
-                    continue
-
-                if not code.strip():
-                    continue
-
-                api_url = settings.HOST_URL + "/api/repo2doc/"
-                res = requests.post(api_url, json={API_KEY_NAME.CODE: code})
-
-                if res.status_code == 200:
-                    documentation = res.json().get(API_KEY_NAME.DOCUMENTATION)
-
-                    rel_path = os.path.relpath(abs_path, extract_dir)
-                    md_path = os.path.join(docs_output_root, os.path.splitext(rel_path)[0] + ".md")
-
-                    os.makedirs(os.path.dirname(md_path), exist_ok=True)
-                    with open(md_path, 'w', encoding='utf-8') as doc_file:
-                        doc_file.write(documentation)
-
-        source_type = 'github' if github_info else 'upload'
-
-        if request.user.is_authenticated:
-            doc_folder = GeneratedDocFolder.objects.create(
-                folder_path=docs_output_root, 
-                user=request.user,
-                visibility=visibility,
-                organization=organization,
-                source_type=source_type
-            )
-        else:
-            doc_folder = GeneratedDocFolder.objects.create(
-                folder_path=docs_output_root,
-                visibility='public',
-                source_type=source_type
-            )
-
-        if github_info and request.user.is_authenticated:
-            github_repo = GitHubRepository.objects.create(
-                doc_folder=doc_folder,
-                github_url=github_info['url'],
-                owner=github_info['owner'],
-                repo_name=github_info['repo'],
-                branch=github_info['branch'],
-                auto_sync_enabled=False
-            )
-            
-            auto_sync_requested = request.POST.get('auto_sync', 'disabled') == 'enabled'
-            github_token = request.POST.get('github_token', '').strip()
-            
-            if auto_sync_requested and github_token:
-                try:
-                    from webhook.services import GitHubWebhookService
-                    service = GitHubWebhookService()
-                    success, message = service.setup_webhook(
-                        github_info['url'],
-                        github_token,
-                        doc_folder
-                    )
-                    if success:
-                        context['auto_sync_message'] = 'Auto-sync enabled successfully!'
-                        if request.user.is_authenticated:
-                            try:
-                                profile = request.user.profile
-                                profile.set_github_token(github_token)
-                                profile.save()
-                            except:
-                                pass
-                    else:
-                        context['auto_sync_error'] = f'Auto-sync setup failed: {message}'
-                except Exception as e:
-                    context['auto_sync_error'] = f'Auto-sync setup error: {str(e)}'
-            elif auto_sync_requested and not github_token:
-                context['auto_sync_error'] = 'GitHub token is required to enable auto-sync'
-
-        context[API_KEY_NAME.MESSAGE] = SuccessMessages.DOCUMENTATION_GENERATED
-        
-        if request.user.is_authenticated:
-            my_doc_folders = GeneratedDocFolder.objects.filter(user=request.user).order_by('-uploaded_at')
-            context['my_doc_folders'] = my_doc_folders
-        
-        public_doc_folders = GeneratedDocFolder.objects.filter(visibility='public').order_by('-uploaded_at')
-        context['doc_folders'] = public_doc_folders
-        
-        context['latest_doc_id'] = doc_folder.id
-        
-    return render(request, 'index.html', context)
\ No newline at end of file
+
+def job_progress_payload(job):
+    """
+    Serialize an ingestion job's status, per-file progress counts and token usage.
+
+    Also reports how scheduling treated the job: its fair-share tenant,
+    the seconds it waited to be claimed by a worker, and the total and
+    longest seconds its files waited for a generation worker.
+    """
+    tokens = job.files.aggregate(
+        code_tokens=Sum('code_tokens'),
+        prompt_tokens=Sum('prompt_tokens'),
+        completion_tokens=Sum('completion_tokens'),
+        total_wait=Sum('wait_seconds'),
+        max_wait=Max('wait_seconds')
+    )
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'total_files': job.total_files,
+        'processed_files': job.processed_files,
+        'failed_files': job.failed_files,
+        'failed': job.failed_paths,
+        'doc_id': job.doc_folder_id,
+        'error': job.error_message,
+        'auto_sync_error': job.auto_sync_error,
+        'code_tokens': tokens['code_tokens'] or 0,
+        'prompt_tokens': tokens['prompt_tokens'] or 0,
+        'completion_tokens': tokens['completion_tokens'] or 0,
+        'tenant': job.tenant,
+        'claim_wait_seconds': round((job.started_at - job.created_at).total_seconds(), 1) if job.started_at else None,
+        'generation_wait_seconds': round(tokens['total_wait'] or 0, 1),
+        'max_file_wait_seconds': round(tokens['max_wait'] or 0, 1),
+        'status_url': reverse('ingestion_job_status', args=[job.id]),
+    }
+
+
+def ingestion_job_status(request, job_id):
+    """JSON endpoint reporting the progress of an ingestion job"""
+    try:
+        job = IngestionJob.objects.get(id=job_id)
+    except IngestionJob.DoesNotExist:
+        return JsonResponse({API_KEY_NAME.ERROR: ErrorMessages.JOB_NOT_FOUND}, status=status.HTTP_404_NOT_FOUND)
+
+    if job.user and request.user != job.user:
+        return JsonResponse({API_KEY_NAME.ERROR: 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+
+    return JsonResponse(job_progress_payload(job))
+
+
+def retry_failed_files(request, doc_id):
+    """Requeue the latest import of a doc folder so only its failed files are regenerated"""
+    doc_folder = get_object_or_404(GeneratedDocFolder, id=doc_id)
+
+    if request.method != 'POST':
+        return redirect('view_doc', doc_id=doc_id)
+
+    if not doc_folder.user or request.user != doc_folder.user:
+        return JsonResponse({API_KEY_NAME.ERROR: 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+
+    job = doc_folder.ingestion_jobs.order_by('-created_at').first()
+    if not job or not job.can_retry:
+        return JsonResponse({API_KEY_NAME.ERROR: ErrorMessages.NOTHING_TO_RETRY}, status=status.HTTP_400_BAD_REQUEST)
+
+    requeue_failed_files(job)
+
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse(job_progress_payload(job), status=status.HTTP_202_ACCEPTED)
+    return redirect('view_doc', doc_id=doc_id)
@@ -76,8 +76,16 @@ def view_doc(request, doc_id):
         except Exception:
             pass
     
+    # Owners can retry the files that failed in the folder's latest import
+    retry_job = None
+    if doc_folder.user and request.user == doc_folder.user:
+        latest_job = doc_folder.ingestion_jobs.order_by('-created_at').first()
+        if latest_job and latest_job.can_retry:
+            retry_job = latest_job
+
     context = {
         'doc_folder': doc_folder,
+        'retry_job': retry_job,
         'file_tree_json': json.dumps(file_tree),
         'current_file_content': current_file_content,
         'current_file_name': current_file_name,
@@ -1,9 +1,26 @@
 from django.conf import settings
 
 class AI_PROMPT:
+    # Bump whenever the documentation prompt changes so cached docs are regenerated
+    GENERATE_DOC_PROMPT_VERSION = 3
+
+    # Constant start of every documentation prompt; the inference layer keeps
+    # the model state after it so each file only evaluates its own code
+    GENERATE_DOC_PROMPT_PREFIX = "You are an expert technical writer and software documentation specialist. Your task is to analyze the given code snippet and generate clean, professional, and developer-friendly documentation suitable for inclusion in a technical documentation site, internal wiki, or public API reference. The code can be of any type: utility function, API endpoint, data model, class, script, or module. Your documentation should be clear and concise, but also complete, providing just enough context and structure for a developer to understand, integrate, and use the code effectively without reading its full implementation. Generate clear and helpful documentation for the following code:\n\n"
+
     @staticmethod
     def getPromptForGenerateDoc(code):
-        return f"You are an expert technical writer and software documentation specialist. Your task is to analyze the given code snippet and generate clean, professional, and developer-friendly documentation suitable for inclusion in a technical documentation site, internal wiki, or public API reference. The code can be of any type: utility function, API endpoint, data model, class, script, or module. Your documentation should be clear and concise, but also complete, providing just enough context and structure for a developer to understand, integrate, and use the code effectively without reading its full implementation. Generate clear and helpful documentation for the following code:\n\n{code}"
+        return f"{AI_PROMPT.GENERATE_DOC_PROMPT_PREFIX}{code}"
 
+    @staticmethod
+    def getPromptForGenerateTrimmedDoc(code):
+        return f"You are an expert technical writer and software documentation specialist. Your task is to analyze the given code and generate clean, professional, and developer-friendly documentation suitable for a technical documentation site or API reference. The code below is the beginning of a source file whose last few lines were cut to fit; document what is shown without guessing at the missing part. Generate clear and helpful documentation for the following code:\n\n{code}"
 
+    @staticmethod
+    def getPromptForGenerateChunkDoc(code, part_name, part_number, part_count):
+        return f"You are an expert technical writer and software documentation specialist. The following code is part {part_number} of {part_count} ({part_name}) of a larger source file. Generate clear and concise developer documentation for the classes, functions and logic in this part only:\n\n{code}"
 
+    @staticmethod
+    def getPromptForMergeDocs(part_docs):
+        joined_docs = "\n\n".join(part_docs)
+        return f"You are an expert technical writer and software documentation specialist. The following are documentation notes written separately for consecutive parts of one source file. Merge them into a single, well-structured markdown document for the whole file, removing repetition and keeping every documented class and function:\n\n{joined_docs}"
@@ -9,14 +9,20 @@ class API_KEY_NAME(str, Enum):
     MESSAGE = 'message'
     RAW_CONTENT = 'raw_content'
     PATH = 'path'
+    FILES = 'files'
+    RESULTS = 'results'
 
 
 class ErrorMessages(str, Enum):
     MISSING_CODE = "Missing code in request"
+    INVALID_FILES = "files must be a non-empty list of objects with a code field"
     INVALID_MODEL_CONFIG = "No valid model configuration found"
     INTERNAL_SERVER_ERROR = "Something went wrong"
     INVALID_FILE_TYPE = "Invalid file type. Please upload a zip file."
     FILE_NOT_FOUND = "File not found"
+    JOB_NOT_FOUND = "Ingestion job not found"
+    NOTHING_TO_RETRY = "This import has no failed files that can be retried"
 
 class SuccessMessages(str, Enum):
     DOCUMENTATION_GENERATED = "Documentation generated successfully"
+    INGESTION_QUEUED = "Repository queued for documentation"
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organization', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='daily_token_quota',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
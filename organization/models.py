@@ -8,6 +8,8 @@ class Organization(models.Model):
     description = models.TextField(blank=True, null=True)
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_organizations')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Overrides TOKEN_QUOTA_ORGANIZATION_DAILY when set; 0 means unlimited
+    daily_token_quota = models.BigIntegerField(blank=True, null=True)
     
     def __str__(self):
         return self.name
@@ -2,8 +2,10 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
+from django.conf import settings
 from .models import Organization, OrganizationMember
 from dashboard.models import GeneratedDocFolder
+from ai_model.ledger import usage_report
 import uuid
 
 def organization_list(request):
@@ -111,7 +113,9 @@ def organization_detail(request, org_id):
         'organization': organization,
         'members': members,
         'organization_docs': organization_docs,
-        'is_admin': is_admin
+        'is_admin': is_admin,
+        'token_usage': usage_report(organization=organization),
+        'usage_days': settings.TOKEN_USAGE_DAYS_SHOWN,
     }
     
     return render(request, 'organization/organization_detail.html', context)
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
     'rest_framework',
     'social_django',
     'dashboard',
+    'ai_model',
     'repo2doc_api',
     'doc_view',
     'chat',
@@ -160,6 +161,126 @@ MAX_TOKENS = 50
 
 # Model path
 LLAMA_CPP_PATH = "/home/workspace/llama.cpp/build/models/llama-2-7b.Q4_K_M.gguf"
+LLAMA_N_CTX = 4096
+# Model state after the constant documentation prompt prefix, reused across files and restarts
+LLAMA_PREFIX_STATE_PATH = os.path.join(BASE_DIR, 'media', 'llama_prefix_state')
+
+# Concurrent prompts decoded together as one multi-sequence batch. 1 disables
+# batching; above 1, in-process inference goes through ai_model.batching and
+# needs a KV cache of LLAMA_N_CTX tokens per sequence. Concurrent callers are
+# what fill a batch, so keep it at or below DOC_GENERATION_MAX_WORKERS. See
+# `manage.py benchmark_batching` for the throughput of each size.
+LLAMA_BATCH_SIZE = 1
+LLAMA_BATCH_WAIT_SECONDS = 0.05  # How long an idle engine waits for more prompts to batch
+# Prompt-lookup decoding drafts this many tokens per step from n-grams of the prompt, which docs
+# often quote verbatim; 0 disables. Applies when LLAMA_BATCH_SIZE is 1. Measure the gain with
+# `manage.py benchmark_prompt_lookup` and turn it off for a backend with {'prompt_lookup': False}
+# in INFERENCE_BACKEND_CONFIG, e.g. a 'llama_chat' backend with driver 'llama_cpp' routed to chat.
+LLAMA_PROMPT_LOOKUP_TOKENS = int(os.getenv('LLAMA_PROMPT_LOOKUP_TOKENS', '0'))
+LLAMA_PROMPT_LOOKUP_MAX_NGRAM = 2  # Longest n-gram matched against the prompt
+
+# Dedicated inference server (see `manage.py run_inference_server`). When
+# INFERENCE_SERVER_URL is set, web and ingestion workers send prompts there
+# instead of loading the model themselves. Either http://host:port or
+# unix:///path/to/socket.
+INFERENCE_SERVER_URL = os.getenv('INFERENCE_SERVER_URL', '')
+INFERENCE_SERVER_BIND = os.getenv('INFERENCE_SERVER_BIND', 'unix://' + os.path.join(BASE_DIR, 'inference.sock'))
+INFERENCE_INSTANCES = 1  # Model instances, each serving one request at a time
+INFERENCE_THREADS_PER_INSTANCE = max(1, (os.cpu_count() or 1) // INFERENCE_INSTANCES)
+INFERENCE_QUEUE_SIZE = 256  # Queued requests beyond this are rejected with 503
+INFERENCE_CONNECT_TIMEOUT = 5
+INFERENCE_READ_TIMEOUT = 600  # Longest wait for the next token, including time spent queued
+
+# Inference backends (see ai_model/backends), tried in order with failover:
+# llama_cpp (in process), inference_server, ollama (OLLAMA_URL, AI_MODEL),
+# completion_server (AI_MODEL_API_ENDPOINT) and fake (deterministic output).
+INFERENCE_BACKENDS = os.getenv('INFERENCE_BACKENDS', 'inference_server' if INFERENCE_SERVER_URL else 'llama_cpp').split(',')
+# Per-purpose overrides of INFERENCE_BACKENDS ('default', 'chat', 'docs'), e.g. {'chat': ['ollama', 'llama_cpp']}
+INFERENCE_ROUTES = {}
+# Extra named backends, e.g. {'gpu-box': {'driver': 'ollama', 'url': 'http://gpu-box:11434'}}
+INFERENCE_BACKEND_CONFIG = {}
+# Seconds a failed backend is skipped before its health check is retried
+INFERENCE_HEALTH_CHECK_INTERVAL = 30
+# Identical concurrent requests share one generation instead of each running inference
+INFERENCE_SINGLE_FLIGHT = True
+# Inference counters shared by the processes of this host (see `manage.py inference_stats`)
+INFERENCE_METRICS_DIR = os.path.join(BASE_DIR, 'media', 'inference_metrics')
+# Admission control for inference endpoints (see ai_model.admission). Limits apply to each web
+# process separately: with N gunicorn workers up to N * INFERENCE_ADMISSION_SLOTS requests run at
+# once, so set the slots to the inference capacity divided by the number of workers.
+INFERENCE_ADMISSION_SLOTS = int(os.getenv('INFERENCE_ADMISSION_SLOTS', '2'))  # Requests running inference at once
+INFERENCE_ADMISSION_QUEUE_SIZE = int(os.getenv('INFERENCE_ADMISSION_QUEUE_SIZE', '16'))  # Waiting beyond this get 429
+INFERENCE_ADMISSION_MAX_WAIT = 30  # Seconds a request may wait for a slot before getting 503
+# Lower runs first: interactive chat ahead of bulk documentation
+INFERENCE_ADMISSION_PRIORITIES = {'chat': 0, 'default': 1, 'docs': 2}
+
+# Daily token quotas (prompt + completion), overridable per profile and organization; 0 disables
+TOKEN_QUOTA_USER_DAILY = int(os.getenv('TOKEN_QUOTA_USER_DAILY', '1000000'))
+TOKEN_QUOTA_ORGANIZATION_DAILY = int(os.getenv('TOKEN_QUOTA_ORGANIZATION_DAILY', '5000000'))
+TOKEN_QUOTA_CHECK_SECONDS = 10  # Imports and webhook syncs re-read usage at most this often
+# The token ledger writes buffered usage after this many calls or seconds, whichever comes first
+TOKEN_LEDGER_BATCH_SIZE = 100
+TOKEN_LEDGER_FLUSH_SECONDS = 5
+TOKEN_USAGE_DAYS_SHOWN = 14  # Days of history on the profile and organization pages
+TOKEN_USAGE_RETENTION_DAYS = 90  # Per-call rows older than this are pruned; daily rollups are kept
+# Simulated latency of the fake backend (see `manage.py benchmark_ingestion`)
+FAKE_LLM_LATENCY_SECONDS = 0.0  # Before the first token, i.e. prompt evaluation
+FAKE_LLM_TOKENS_PER_SECOND = 0  # 0 generates instantly
+
+# Prompts are sized with the model's tokenizer; counts are cached per content hash
+PROMPT_TOKEN_CACHE_SIZE = 100000
+# Files overflowing the prompt budget by at most this fraction are trimmed instead of chunked
+DOC_PROMPT_TRIM_TOLERANCE = 0.1
+
+# Files larger than one prompt are documented in chunks and the chunk docs merged
+DOC_CHUNK_CHARS_PER_TOKEN = 3  # Estimate used when no tokenizer is loaded
+
+# Ingestion worker pool ('thread' or 'process')
+DOC_GENERATION_POOL = 'thread'
+DOC_GENERATION_MAX_WORKERS = 4
+# The thread pool is shared by every batch in a process and fair-shared by deficit round robin
+# across (job class, tenant) flows; see repo2doc_api.scheduler. Tenants are 'org:<id>' or 'user:<id>'.
+GENERATION_QUANTUM_TOKENS = 1024  # Estimated tokens a weight-1 flow may send per round
+GENERATION_CLASS_WEIGHTS = {'webhook': 8, 'api': 4, 'import': 1}
+GENERATION_TENANT_WEIGHTS = {}  # e.g. {'org:3': 2} to give an organization twice the share
+
+# Background ingestion jobs (see `manage.py run_ingestion_worker`)
+INGESTION_UPLOAD_DIR = os.path.join(BASE_DIR, 'media', 'ingestion_uploads')
+INGESTION_WORKER_POLL_INTERVAL = 2
+INGESTION_WORKER_CONCURRENCY = 2  # Jobs one worker runs at once, sharing its generation pool
+# Running jobs without a heartbeat for this long are resumed by another worker
+INGESTION_JOB_STALE_SECONDS = 1800
+INGESTION_HEARTBEAT_SECONDS = 60  # How often a worker refreshes its running jobs' heartbeat
+INGESTION_MAX_ATTEMPTS = 3
+
+# Archive caps, checked against the ZIP central directory before decompressing
+INGESTION_MAX_ENTRIES = 50000
+INGESTION_MAX_FILE_BYTES = 1024 * 1024
+INGESTION_MAX_TOTAL_BYTES = 512 * 1024 * 1024
+
+# GitHub archives, cached by commit (see dashboard/github_archive.py)
+GITHUB_ARCHIVE_CACHE_DIR = os.path.join(BASE_DIR, 'media', 'github_archives')
+GITHUB_ARCHIVE_CACHE_KEEP = 2  # Archives kept per repository
+GITHUB_ARCHIVE_MAX_BYTES = 512 * 1024 * 1024
+GITHUB_HTTP_TIMEOUT = (5, 60)  # Connect and read timeouts in seconds
+GITHUB_HTTP_RETRIES = 3
+GITHUB_HTTP_POOL_SIZE = 10
+# Repositories whose tree is larger than this fetch only their selected files
+GITHUB_SPARSE_FETCH_THRESHOLD = 200 * 1024 * 1024
+GITHUB_BLOB_FETCH_WORKERS = 8
+GITHUB_BLOB_CACHE_DIR = os.path.join(BASE_DIR, 'media', 'github_blobs')
+GITHUB_BLOB_CACHE_SIZE_LIMIT = 2 * 1024 * 1024 * 1024  # bytes, least recently used blobs are evicted
+
+# Source file selection (repo2doc_api.file_selection)
+FILE_SELECTION_MAX_FILE_BYTES = 256 * 1024
+FILE_SELECTION_MAX_AVERAGE_LINE_LENGTH = 200
+FILE_SELECTION_MAX_LINE_LENGTH = 1000
+FILE_SELECTION_MINIFIED_ENTROPY = 5.0  # bits per byte, checked when a line exceeds the limit above
+
+# Content-addressed documentation cache (see `manage.py doc_cache`)
+DOC_CACHE_ENABLED = True
+DOC_CACHE_DIR = os.path.join(BASE_DIR, 'media', 'doc_cache')
+DOC_CACHE_SIZE_LIMIT = 1024 * 1024 * 1024  # bytes, least recently used entries are evicted
 
 
 
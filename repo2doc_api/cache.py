@@ -0,0 +1,80 @@
+import hashlib
+import json
+import threading
+from diskcache import Cache
+from django.conf import settings
+from message_resource.ai_model_config import AI_PROMPT
+from ai_model.backends import get_router
+
+_doc_cache = None
+_doc_cache_lock = threading.Lock()
+
+
+def get_doc_cache():
+    """
+    Return the process-wide documentation cache.
+
+    A size-bounded diskcache store with LRU eviction shared by every process
+    pointing at DOC_CACHE_DIR. Hit/miss statistics are kept by diskcache.
+    """
+    global _doc_cache
+    if _doc_cache is None:
+        with _doc_cache_lock:
+            if _doc_cache is None:
+                _doc_cache = Cache(
+                    settings.DOC_CACHE_DIR,
+                    size_limit=settings.DOC_CACHE_SIZE_LIMIT,
+                    eviction_policy='least-recently-used',
+                    statistics=1,
+                )
+    return _doc_cache
+
+
+def doc_cache_key(code, max_tokens):
+    """
+    Content-addressed key for the documentation of a piece of code.
+
+    Covers everything that changes the generated markdown: the code itself,
+    the documentation prompt template version, the backends and models the
+    'docs' route sends it to, the context size (which decides how a file is
+    trimmed or chunked) and the sampling parameters.
+    """
+    router = get_router('docs')
+    params = json.dumps([
+        AI_PROMPT.GENERATE_DOC_PROMPT_VERSION,
+        router.name,
+        router.model_id(),
+        settings.LLAMA_N_CTX,
+        max_tokens,
+        settings.TEMPERATURE,
+    ])
+    digest = hashlib.sha256(params.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(code.encode('utf-8', errors='surrogatepass'))
+    return f"doc:{digest.hexdigest()}"
+
+
+def get_cached_doc(code, max_tokens):
+    """Return cached documentation for code, or None on a miss"""
+    if not settings.DOC_CACHE_ENABLED:
+        return None
+    return get_doc_cache().get(doc_cache_key(code, max_tokens))
+
+
+def set_cached_doc(code, max_tokens, documentation):
+    """Store generated documentation for code"""
+    if settings.DOC_CACHE_ENABLED:
+        get_doc_cache().set(doc_cache_key(code, max_tokens), documentation)
+
+
+def doc_cache_stats():
+    """Return hit/miss counters and the current size of the documentation cache"""
+    cache = get_doc_cache()
+    hits, misses = cache.stats()
+    return {
+        'hits': hits,
+        'misses': misses,
+        'entries': len(cache),
+        'volume_bytes': cache.volume(),
+        'size_limit_bytes': cache.size_limit,
+    }
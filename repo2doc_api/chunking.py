@@ -0,0 +1,149 @@
+import ast
+import re
+from django.conf import settings
+
+PYTHON_EXTENSIONS = ('.py', '.pyi')
+
+# Chunks with more definitions than this are named by their first and last
+MAX_CHUNK_NAMES = 5
+
+# Lines that start a new top-level declaration in brace-based languages
+DECLARATION_PATTERN = re.compile(
+    r'^(export\s+|public\s+|private\s+|protected\s+|static\s+|async\s+|abstract\s+|final\s+)*'
+    r'(function|class|interface|struct|enum|impl|fn|func|def|module|namespace|type|trait|object)\b'
+)
+
+
+def estimate_tokens(text):
+    """Rough token count used to size chunks, from DOC_CHUNK_CHARS_PER_TOKEN"""
+    return len(text) // settings.DOC_CHUNK_CHARS_PER_TOKEN + 1
+
+
+def chunk_source(code, max_tokens, path=None, count_tokens=estimate_tokens):
+    """
+    Split source code into chunks that each fit within max_tokens.
+
+    Python is split at top-level function and class boundaries using ast, with
+    the module header (imports, constants, docstring) kept with the first
+    definition. Other languages, and Python that does not parse, fall back to
+    splitting at lines where braces balance or a new declaration starts.
+
+    Returns:
+        list: dicts with 'name' (e.g. "class Foo" or "lines 10-80") and 'code'
+    """
+    if count_tokens(code) <= max_tokens:
+        return [{'name': 'whole file', 'code': code}]
+
+    if path is None or path.lower().endswith(PYTHON_EXTENSIONS):
+        try:
+            return chunk_python(code, max_tokens, count_tokens)
+        except SyntaxError:
+            pass
+
+    return chunk_lines(code.splitlines(keepends=True), max_tokens, count_tokens)
+
+
+def chunk_python(code, max_tokens, count_tokens=estimate_tokens):
+    """Split Python source at top-level def/class boundaries"""
+    tree = ast.parse(code)
+    lines = code.splitlines(keepends=True)
+
+    # Each top-level node becomes a segment spanning its decorators through its last line
+    segments = []
+    previous_end = 0
+    for node in tree.body:
+        start = min([node.lineno] + [decorator.lineno for decorator in getattr(node, 'decorator_list', [])]) - 1
+        start = max(start, previous_end)
+        end = node.end_lineno
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            name = f"def {node.name}"
+        elif isinstance(node, ast.ClassDef):
+            name = f"class {node.name}"
+        else:
+            name = None
+        segments.append((name, previous_end, end))
+        previous_end = end
+    if previous_end < len(lines):
+        segments.append((None, previous_end, len(lines)))
+
+    chunks = []
+    names, start, end = [], None, None
+
+    def flush():
+        if start is not None:
+            if len(names) > MAX_CHUNK_NAMES:
+                name = f"{names[0]} to {names[-1]}"
+            else:
+                name = ', '.join(names) or f"lines {start + 1}-{end}"
+            chunks.append({
+                'name': name,
+                'code': ''.join(lines[start:end]),
+            })
+
+    for name, segment_start, segment_end in segments:
+        segment_code = ''.join(lines[segment_start:segment_end])
+
+        if count_tokens(segment_code) > max_tokens:
+            # A single definition larger than the budget is split by lines
+            flush()
+            names, start, end = [], None, None
+            for chunk in chunk_lines(lines[segment_start:segment_end], max_tokens, count_tokens, offset=segment_start):
+                if name:
+                    chunk['name'] = f"{name} ({chunk['name']})"
+                chunks.append(chunk)
+            continue
+
+        if start is not None and count_tokens(''.join(lines[start:segment_end])) > max_tokens:
+            flush()
+            names, start = [], None
+
+        if start is None:
+            start = segment_start
+        if name:
+            names.append(name)
+        end = segment_end
+
+    flush()
+    return chunks
+
+
+def chunk_lines(lines, max_tokens, count_tokens=estimate_tokens, offset=0):
+    """
+    Split lines into chunks, preferring to cut where braces balance or a new
+    top-level declaration begins.
+    """
+    chunks = []
+    start = 0
+    last_boundary = None
+    depth = 0
+    tokens = 0
+
+    for index, line in enumerate(lines):
+        stripped = line.lstrip()
+        if depth == 0 and index > start and (not line[:1].isspace() and DECLARATION_PATTERN.match(stripped)):
+            last_boundary = index
+
+        line_tokens = count_tokens(line)
+        if tokens + line_tokens > max_tokens and index > start:
+            # A boundary with only blank lines before it would make an empty chunk
+            at_boundary = last_boundary and last_boundary > start and ''.join(lines[start:last_boundary]).strip()
+            cut = last_boundary if at_boundary else index
+            chunks.append({
+                'name': f"lines {offset + start + 1}-{offset + cut}",
+                'code': ''.join(lines[start:cut]),
+            })
+            start = cut
+            last_boundary = None
+            tokens = count_tokens(''.join(lines[start:index]))
+
+        tokens += line_tokens
+        depth = max(depth + line.count('{') - line.count('}'), 0)
+        if depth == 0 and stripped.startswith('}'):
+            last_boundary = index + 1
+
+    if start < len(lines):
+        chunks.append({
+            'name': f"lines {offset + start + 1}-{offset + len(lines)}",
+            'code': ''.join(lines[start:]),
+        })
+    return chunks
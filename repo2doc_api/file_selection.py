@@ -0,0 +1,264 @@
+import math
+import posixpath
+import re
+from collections import Counter
+from django.conf import settings
+
+DOCUMENTABLE_EXTENSIONS = {
+    '.py', '.pyi', '.js', '.jsx', '.mjs', '.cjs', '.ts', '.tsx', '.vue', '.svelte',
+    '.java', '.kt', '.kts', '.scala', '.groovy', '.c', '.h', '.cc', '.cpp', '.cxx',
+    '.hpp', '.hh', '.cs', '.go', '.rs', '.swift', '.m', '.mm', '.php', '.rb', '.pl',
+    '.pm', '.lua', '.r', '.dart', '.ex', '.exs', '.erl', '.hs', '.clj', '.fs', '.jl',
+    '.sh', '.bash', '.zsh', '.ps1', '.sql', '.html', '.css', '.scss', '.sass',
+    '.less', '.proto', '.graphql', '.tf',
+}
+
+DOCUMENTABLE_FILENAMES = {'Dockerfile', 'Makefile', 'Rakefile', 'Gemfile', 'Jenkinsfile'}
+
+EXCLUDED_DIRECTORIES = {
+    '.git', '.hg', '.svn', '__MACOSX', '__pycache__', 'node_modules', 'bower_components',
+    '.venv', 'venv', '.tox', '.mypy_cache', '.pytest_cache', '.idea', '.vscode',
+    'dist', 'build', 'target', '.next', '.nuxt', 'coverage', 'site-packages',
+}
+
+EXCLUDED_FILENAMES = {
+    'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock', 'Pipfile.lock',
+    'Cargo.lock', 'composer.lock', 'Gemfile.lock', 'go.sum', '.DS_Store',
+}
+
+GENERATED_NAME_PATTERNS = ['*.min.js', '*.min.css', '*.map', '*_pb2.py', '*_pb2_grpc.py', '*.pb.go', '*.generated.*']
+
+GENERATED_MARKERS = (b'@generated', b'DO NOT EDIT', b'Code generated by', b'autogenerated', b'auto-generated')
+
+# Skip reasons
+SKIP_HIDDEN = 'hidden file'
+SKIP_EXCLUDED_DIRECTORY = 'excluded directory'
+SKIP_EXCLUDED_FILE = 'excluded file'
+SKIP_GITIGNORED = 'ignored by .gitignore'
+SKIP_EXCLUDE_GLOB = 'matches an exclude glob'
+SKIP_NOT_SOURCE = 'not a source file'
+SKIP_TOO_LARGE = 'file too large'
+SKIP_EMPTY = 'empty file'
+SKIP_BINARY = 'binary file'
+SKIP_MINIFIED = 'minified code'
+SKIP_GENERATED = 'generated code'
+
+
+def compile_pattern(pattern, base_dir=''):
+    """
+    Translate a gitignore-style glob into a regular expression.
+
+    Patterns containing a slash are anchored to base_dir; others match at any
+    depth. `**` spans directories while `*` and `?` stay within one path segment.
+    """
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == len(pattern):
+            regex += '/.*'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 1:]:
+            end = pattern.index(']', i + 1)
+            regex += '[' + pattern[i + 1:end].replace('!', '^', 1) + ']'
+            i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+
+    prefix = re.escape(base_dir + '/') if base_dir else ''
+    if not anchored:
+        prefix += '(?:.*/)?'
+    return re.compile(f'^{prefix}{regex}$')
+
+
+def parse_globs(text):
+    """Split a comma or newline separated list of globs from a form field or model"""
+    if not text:
+        return []
+    return [glob.strip() for glob in re.split(r'[,\n]', text) if glob.strip()]
+
+
+class GitIgnore:
+    """Matcher for the .gitignore files of a repository, including nested ones"""
+
+    def __init__(self):
+        self.rules = []
+
+    def add(self, base_dir, text):
+        """Add the patterns of the .gitignore found in base_dir ('' for the repository root)"""
+        for line in text.splitlines():
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+
+            self.rules.append((base_dir, compile_pattern(line, base_dir), negate, dir_only))
+
+        # Rules from shallower .gitignore files apply first so deeper ones can override them
+        self.rules.sort(key=lambda rule: rule[0].count('/') + bool(rule[0]))
+
+    def _matches(self, path, is_dir):
+        ignored = False
+        for base_dir, regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base_dir and not path.startswith(base_dir + '/'):
+                continue
+            if regex.match(path):
+                ignored = not negate
+        return ignored
+
+    def is_ignored(self, path):
+        """True if path, or any directory containing it, is ignored"""
+        if not self.rules:
+            return False
+
+        parts = path.split('/')
+        for depth in range(1, len(parts)):
+            if self._matches('/'.join(parts[:depth]), is_dir=True):
+                return True
+        return self._matches(path, is_dir=False)
+
+
+def shannon_entropy(data):
+    """Bits of entropy per byte of data"""
+    if not data:
+        return 0.0
+    total = len(data)
+    return -sum((count / total) * math.log2(count / total) for count in Counter(data).values())
+
+
+class FileSelector:
+    """
+    Decide which files of a repository should be documented.
+
+    Shared by ZIP/GitHub ingestion and both webhook sync paths. Selection
+    runs in two phases: skip_reason_for_path needs only a path and size, so
+    files can be dropped before they are downloaded or decompressed, and
+    skip_reason_for_content inspects the bytes for binaries and minified or
+    generated code.
+
+    Args:
+        gitignore: Optional GitIgnore for the repository
+        include_globs: Globs that select files even when their extension is
+            not a known source extension
+        exclude_globs: Globs that always reject files
+        max_file_bytes: Size cap, defaults to FILE_SELECTION_MAX_FILE_BYTES
+        root: Directory wrapping the repository inside an archive; include and
+            exclude globs are matched relative to it
+    """
+
+    def __init__(self, gitignore=None, include_globs=(), exclude_globs=(), max_file_bytes=None, root=''):
+        self.gitignore = gitignore
+        self.root = root
+        self.include_patterns = [compile_pattern(glob) for glob in include_globs]
+        self.exclude_patterns = [compile_pattern(glob) for glob in exclude_globs]
+        self.generated_patterns = [compile_pattern(glob) for glob in GENERATED_NAME_PATTERNS]
+        self.max_file_bytes = max_file_bytes or settings.FILE_SELECTION_MAX_FILE_BYTES
+
+    @classmethod
+    def for_repository(cls, repository, gitignore=None, root=''):
+        """Build a selector from the include/exclude globs of a GeneratedDocFolder or IngestionJob"""
+        return cls(
+            gitignore=gitignore,
+            root=root,
+            include_globs=parse_globs(repository.include_globs),
+            exclude_globs=parse_globs(repository.exclude_globs),
+        )
+
+    def skip_reason_for_path(self, path, size=None):
+        """
+        Check a file using only its path and (optionally) size.
+
+        Returns:
+            str or None: why the file is skipped, or None if it is selected
+        """
+        path = posixpath.normpath(path).lstrip('/')
+        file_name = posixpath.basename(path)
+        repo_path = path[len(self.root) + 1:] if self.root and path.startswith(self.root + '/') else path
+        # An archive root named like build/ or dist/ is not a directory of the repository
+        directories = repo_path.split('/')[:-1]
+
+        if any(pattern.match(repo_path) for pattern in self.exclude_patterns):
+            return SKIP_EXCLUDE_GLOB
+        if any(directory in EXCLUDED_DIRECTORIES for directory in directories):
+            return SKIP_EXCLUDED_DIRECTORY
+        if file_name in EXCLUDED_FILENAMES:
+            return SKIP_EXCLUDED_FILE
+        if self.gitignore and self.gitignore.is_ignored(path):
+            return SKIP_GITIGNORED
+        if size is not None and size > self.max_file_bytes:
+            return SKIP_TOO_LARGE
+
+        if any(pattern.match(repo_path) for pattern in self.include_patterns):
+            return None
+
+        if file_name.startswith('.'):
+            return SKIP_HIDDEN
+        if any(pattern.match(path) for pattern in self.generated_patterns):
+            return SKIP_GENERATED
+
+        extension = posixpath.splitext(file_name)[1].lower()
+        if extension not in DOCUMENTABLE_EXTENSIONS and file_name not in DOCUMENTABLE_FILENAMES:
+            return SKIP_NOT_SOURCE
+        return None
+
+    def skip_reason_for_content(self, path, data):
+        """
+        Check a file's bytes for binaries and minified or generated code.
+
+        Returns:
+            str or None: why the file is skipped, or None if it is selected
+        """
+        if len(data) > self.max_file_bytes:
+            return SKIP_TOO_LARGE
+        if not data.strip():
+            return SKIP_EMPTY
+
+        sample = data[:8192]
+        if b'\0' in sample:
+            return SKIP_BINARY
+        text_bytes = sum(1 for byte in sample if byte >= 32 or byte in (9, 10, 13))
+        if text_bytes / len(sample) < 0.7:
+            return SKIP_BINARY
+
+        head = data[:1024]
+        if any(marker in head for marker in GENERATED_MARKERS):
+            return SKIP_GENERATED
+
+        lines = data.splitlines() or [data]
+        average_line_length = len(data) / len(lines)
+        longest_line = max(len(line) for line in lines)
+        if average_line_length > settings.FILE_SELECTION_MAX_AVERAGE_LINE_LENGTH:
+            return SKIP_MINIFIED
+        if (longest_line > settings.FILE_SELECTION_MAX_LINE_LENGTH
+                and shannon_entropy(data[:65536]) > settings.FILE_SELECTION_MINIFIED_ENTROPY):
+            return SKIP_MINIFIED
+        return None
+
+    def is_selected(self, path, data):
+        """Full path and content check for a file that is already in memory"""
+        return (self.skip_reason_for_path(path, len(data)) is None
+                and self.skip_reason_for_content(path, data) is None)
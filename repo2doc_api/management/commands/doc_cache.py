@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from repo2doc_api.cache import get_doc_cache, doc_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show statistics for, purge or cap the documentation cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--purge', action='store_true', help='Remove every cached documentation entry')
+        parser.add_argument('--cap', type=int, metavar='MB',
+                            help='Evict least recently used entries until the cache is under MB megabytes')
+        parser.add_argument('--reset-stats', action='store_true', help='Reset the hit/miss counters')
+
+    def handle(self, *args, **options):
+        cache = get_doc_cache()
+
+        if options['purge']:
+            removed = cache.clear()
+            self.stdout.write(self.style.SUCCESS(f"Purged {removed} cached entries"))
+
+        if options['cap'] is not None:
+            # Cull to the requested size, then restore the configured limit
+            cache.reset('size_limit', options['cap'] * 1024 * 1024)
+            removed = cache.cull()
+            cache.reset('size_limit', settings.DOC_CACHE_SIZE_LIMIT)
+            self.stdout.write(self.style.SUCCESS(f"Evicted {removed} entries to cap the cache at {options['cap']} MB"))
+
+        if options['reset_stats']:
+            cache.stats(reset=True)
+            self.stdout.write(self.style.SUCCESS("Reset cache statistics"))
+
+        stats = doc_cache_stats()
+        lookups = stats['hits'] + stats['misses']
+        hit_rate = (stats['hits'] / lookups * 100) if lookups else 0
+
+        self.stdout.write(f"Entries:    {stats['entries']}")
+        self.stdout.write(f"Volume:     {stats['volume_bytes'] / (1024 * 1024):.1f} MB of {stats['size_limit_bytes'] / (1024 * 1024):.0f} MB")
+        self.stdout.write(f"Hits:       {stats['hits']}")
+        self.stdout.write(f"Misses:     {stats['misses']}")
+        self.stdout.write(f"Hit rate:   {hit_rate:.1f}%")
@@ -0,0 +1,111 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from message_resource.ai_model_config import AI_PROMPT
+from ai_model.backends import get_router
+from .chunking import chunk_source, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Token counts keyed by content hash, shared by every thread of the process
+_token_counts = OrderedDict()
+_token_counts_lock = threading.Lock()
+
+# Room left in chunk prompts for the part name and numbering
+CHUNK_NAME_TOKENS = 32
+
+
+def get_tokenizer():
+    """Tokenizer of the documentation backend's model, or None when prompts are sized by estimate"""
+    return get_router('docs').tokenizer()
+
+
+def count_tokens(text):
+    """
+    Count the tokens of text with the model's own tokenizer.
+
+    Counts are cached per content hash so re-counting the same file or
+    prompt is free. Falls back to the character estimate when no model
+    is loaded.
+    """
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return estimate_tokens(text)
+
+    key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    with _token_counts_lock:
+        count = _token_counts.get(key)
+        if count is not None:
+            _token_counts.move_to_end(key)
+            return count
+
+    count = len(tokenizer.tokenize(text.encode('utf-8'), add_bos=False))
+
+    with _token_counts_lock:
+        _token_counts[key] = count
+        if len(_token_counts) > settings.PROMPT_TOKEN_CACHE_SIZE:
+            _token_counts.popitem(last=False)
+    return count
+
+
+def prompt_token_budget(max_tokens):
+    """Tokens a prompt may use while leaving room in the context window for the completion"""
+    # One token is reserved for the BOS token llama prepends
+    return settings.LLAMA_N_CTX - max_tokens - 1
+
+
+def trim_to_tokens(text, max_tokens):
+    """Cut text at the last full line that fits within max_tokens"""
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        trimmed = text[:max_tokens * settings.DOC_CHUNK_CHARS_PER_TOKEN]
+    else:
+        tokens = tokenizer.tokenize(text.encode('utf-8'), add_bos=False)
+        if len(tokens) <= max_tokens:
+            return text
+        trimmed = tokenizer.detokenize(tokens[:max_tokens]).decode('utf-8', errors='ignore')
+
+    if '\n' in trimmed:
+        trimmed = trimmed[:trimmed.rindex('\n') + 1]
+    return trimmed
+
+
+def build_doc_prompt(code, max_tokens, path=None):
+    """
+    Assemble the documentation prompt(s) for one file within the context window.
+
+    A file whose prompt fits is sent whole. One that overflows by no more
+    than DOC_PROMPT_TRIM_TOLERANCE is trimmed to fit, which costs a single
+    model call. Anything larger is chunked for map-reduce summarisation.
+
+    Returns:
+        dict: 'strategy' ('whole', 'trim' or 'chunk'), 'code_tokens', and
+        either 'prompt' or 'chunks' (list of {'name', 'code'} dicts)
+    """
+    budget = prompt_token_budget(max_tokens)
+    code_tokens = count_tokens(code)
+    instruction_tokens = count_tokens(AI_PROMPT.getPromptForGenerateDoc(''))
+
+    if instruction_tokens + code_tokens <= budget:
+        return {
+            'strategy': 'whole',
+            'code_tokens': code_tokens,
+            'prompt': AI_PROMPT.getPromptForGenerateDoc(code),
+        }
+
+    code_budget = budget - count_tokens(AI_PROMPT.getPromptForGenerateTrimmedDoc(''))
+    if code_tokens <= code_budget * (1 + settings.DOC_PROMPT_TRIM_TOLERANCE):
+        return {
+            'strategy': 'trim',
+            'code_tokens': code_tokens,
+            'prompt': AI_PROMPT.getPromptForGenerateTrimmedDoc(trim_to_tokens(code, code_budget)),
+        }
+
+    chunk_budget = budget - count_tokens(AI_PROMPT.getPromptForGenerateChunkDoc('', '', 0, 0)) - CHUNK_NAME_TOKENS
+    return {
+        'strategy': 'chunk',
+        'code_tokens': code_tokens,
+        'chunks': chunk_source(code, chunk_budget, path=path, count_tokens=count_tokens),
+    }
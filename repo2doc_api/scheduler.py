@@ -0,0 +1,213 @@
+"""
+Fair-share scheduling of documentation work across tenants and job types.
+
+Every DocGenerationService batch in a process submits its files to one
+shared pool of DOC_GENERATION_MAX_WORKERS threads. Files wait in per-flow
+queues, where a flow is a (job class, tenant) pair, and are dispatched by
+deficit round robin. Each turn adds the flow's quantum to its deficit:
+GENERATION_QUANTUM_TOKENS times its class and tenant weights. The flow
+then sends files while their estimated tokens fit in the deficit. A
+5,000-file import therefore shares the workers with a small one instead
+of running ahead of it. Webhook syncs, weighted higher in
+GENERATION_CLASS_WEIGHTS, overtake cold imports without starving them.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from django.conf import settings
+from ai_model.metrics import incr_metric
+
+logger = logging.getLogger(__name__)
+
+
+def tenant_key(user_id=None, organization_id=None):
+    """Tenant that work is fair-shared by: the organization if there is one, else the user"""
+    if organization_id:
+        return f'org:{organization_id}'
+    if user_id:
+        return f'user:{user_id}'
+    return 'anonymous'
+
+
+def request_tenant(request):
+    """tenant_key of a signed-in API caller, or 'anonymous'"""
+    return tenant_key(request.user.pk if request.user.is_authenticated else None)
+
+
+class Task:
+    def __init__(self, flow, cost, label, func, args, kwargs):
+        self.flow = flow
+        self.cost = max(1, cost)
+        self.label = label
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        # Seconds the task waited in its flow's queue, set when a worker starts it
+        self.future.wait_seconds = 0.0
+        self.enqueued_at = time.monotonic()
+
+
+class Flow:
+    def __init__(self, key):
+        self.key = key
+        job_class, tenant = key
+        self.quantum = (
+            settings.GENERATION_QUANTUM_TOKENS
+            * settings.GENERATION_CLASS_WEIGHTS.get(job_class, 1)
+            * settings.GENERATION_TENANT_WEIGHTS.get(tenant, 1)
+        )
+        self.deficit = 0
+        self.in_turn = False
+        self.tasks = deque()
+
+
+class FairShareScheduler:
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._flows = OrderedDict()  # Flows with queued tasks, in round order
+        self._condition = threading.Condition()
+        self._threads = []
+        # Per-flow totals and the latest dispatch decisions, for snapshot()
+        self._stats = {}
+        self._decisions = deque(maxlen=50)
+
+    def submit(self, flow, cost, label, func, *args, **kwargs):
+        """
+        Queue func(*args, **kwargs) on flow, a (job class, tenant) pair.
+
+        Returns:
+            Future: resolves to func's result; its wait_seconds attribute holds
+            the time spent queued once a worker picks it up
+        """
+        task = Task(flow, cost, label, func, args, kwargs)
+        with self._condition:
+            if flow not in self._flows:
+                self._flows[flow] = Flow(flow)
+            self._flows[flow].tasks.append(task)
+            self._start_workers()
+            self._condition.notify()
+        return task.future
+
+    def session(self, flow):
+        return FlowSession(self, flow)
+
+    def _start_workers(self):
+        while len(self._threads) < self.max_workers:
+            thread = threading.Thread(target=self._work, name=f'docgen-{len(self._threads)}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _next_task(self):
+        """Deficit round robin over the queued flows; called with the condition held"""
+        while True:
+            flow = next(iter(self._flows.values()))
+            if not flow.in_turn:
+                flow.deficit += flow.quantum
+                flow.in_turn = True
+
+            task = flow.tasks[0]
+            if task.cost > flow.deficit:
+                # Turn used up: the flow keeps its deficit and goes to the back of the round
+                flow.in_turn = False
+                self._flows.move_to_end(flow.key)
+                continue
+
+            flow.tasks.popleft()
+            flow.deficit -= task.cost
+            if not flow.tasks:
+                # An idle flow does not bank credit
+                del self._flows[flow.key]
+            return task, flow.deficit
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._flows:
+                    self._condition.wait()
+                task, deficit = self._next_task()
+
+            if not task.future.set_running_or_notify_cancel():
+                continue
+
+            wait = time.monotonic() - task.enqueued_at
+            task.future.wait_seconds = wait
+            self._record_dispatch(task, wait, deficit)
+            try:
+                result = task.func(*task.args, **task.kwargs)
+            except BaseException as e:
+                task.future.set_exception(e)
+            else:
+                task.future.set_result(result)
+
+    def _record_dispatch(self, task, wait, deficit):
+        job_class, tenant = task.flow
+        logger.debug(f"Dispatched {task.label} for {job_class}/{tenant} after {wait:.2f}s (deficit left {deficit})")
+        with self._condition:
+            stats = self._stats.setdefault(task.flow, {'dispatched': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0})
+            stats['dispatched'] += 1
+            stats['wait_seconds'] += wait
+            stats['max_wait_seconds'] = max(stats['max_wait_seconds'], wait)
+            self._decisions.append({
+                'class': job_class, 'tenant': tenant, 'task': task.label,
+                'cost': task.cost, 'wait_seconds': round(wait, 3),
+            })
+        incr_metric(f'scheduler.{job_class}.dispatched')
+        incr_metric(f'scheduler.{job_class}.wait_ms', int(wait * 1000))
+
+    def snapshot(self):
+        """Queued tasks and deficit per flow, dispatch totals and the latest decisions"""
+        with self._condition:
+            return {
+                'workers': self.max_workers,
+                'queued': [
+                    {'class': flow.key[0], 'tenant': flow.key[1], 'queued': len(flow.tasks), 'deficit': flow.deficit}
+                    for flow in self._flows.values()
+                ],
+                'flows': [
+                    {'class': key[0], 'tenant': key[1], **stats} for key, stats in self._stats.items()
+                ],
+                'recent': list(self._decisions),
+            }
+
+
+class FlowSession:
+    """
+    Executor-like handle on one flow, used by a batch for the work it submits.
+
+    Leaving the with block cancels the batch's tasks that have not started,
+    e.g. when a streaming client goes away mid-batch.
+    """
+
+    def __init__(self, scheduler, flow):
+        self.scheduler = scheduler
+        self.flow = flow
+        self.futures = set()
+
+    def submit(self, func, *args, cost=1, label='task', **kwargs):
+        future = self.scheduler.submit(self.flow, cost, label, func, *args, **kwargs)
+        self.futures.add(future)
+        future.add_done_callback(self.futures.discard)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for future in list(self.futures):
+            future.cancel()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = FairShareScheduler(settings.DOC_GENERATION_MAX_WORKERS)
+    return _scheduler
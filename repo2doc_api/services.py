@@ -0,0 +1,273 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from django.conf import settings
+from message_resource.ai_model_config import AI_PROMPT
+from ai_model.views import generate_ai_response, stream_ai_response
+from .cache import get_cached_doc, set_cached_doc
+from .prompt_builder import build_doc_prompt, count_tokens, prompt_token_budget
+from .chunking import estimate_tokens
+from .scheduler import get_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+def generate_documentation(code, max_tokens, check_cache=True, path=None):
+    """
+    Generate documentation markdown for a single piece of source code.
+
+    Raises:
+        Exception: if inference fails or produces no documentation
+    """
+    return document_code(code, max_tokens, check_cache=check_cache, path=path)['documentation']
+
+
+def document_code(code, max_tokens, check_cache=True, path=None):
+    """
+    Generate documentation for a file and report the tokens it cost.
+
+    Identical code is served from the documentation cache without calling
+    the model. Otherwise the prompt builder decides whether the file is sent
+    whole, trimmed, or documented chunk by chunk and the chunk docs merged.
+    Kept at module level so it can be pickled by a process pool.
+
+    Returns:
+        dict: 'documentation', 'strategy' ('cached', 'whole', 'trim' or
+        'chunk'), 'code_tokens', 'prompt_tokens' and 'completion_tokens'
+
+    Raises:
+        Exception: if inference fails or produces no documentation
+    """
+    if check_cache:
+        documentation = get_cached_doc(code, max_tokens)
+        if documentation is not None:
+            return cached_result(documentation)
+
+    usage = {'prompt_tokens': 0, 'completion_tokens': 0}
+
+    def complete(prompt):
+        text = generate_ai_response(prompt, max_tokens=max_tokens, raise_errors=True, route='docs')
+        usage['prompt_tokens'] += count_tokens(prompt)
+        usage['completion_tokens'] += count_tokens(text)
+        return text
+
+    plan = build_doc_prompt(code, max_tokens, path=path)
+    if plan['strategy'] == 'chunk':
+        documentation = map_reduce_documentation(plan['chunks'], max_tokens, complete)
+        logger.info(f"Documented {path or 'file'} in {len(plan['chunks'])} chunks")
+    else:
+        documentation = complete(plan['prompt'])
+
+    if not documentation or not documentation.strip():
+        raise ValueError("No documentation generated")
+
+    set_cached_doc(code, max_tokens, documentation)
+    return {
+        'documentation': documentation,
+        'strategy': plan['strategy'],
+        'code_tokens': plan['code_tokens'],
+        **usage,
+    }
+
+
+def stream_documentation(code, max_tokens, path=None):
+    """
+    Generate documentation like document_code, yielding it as it is produced.
+
+    Whole and trimmed files stream token by token. Cache hits and chunked
+    files (documented by map-reduce as usual) arrive as a single piece.
+    Closing the generator stops generation.
+
+    Yields:
+        tuple: ('token', text) for each piece, then ('done', result) with
+        the same result dict as document_code
+
+    Raises:
+        Exception: if inference fails or produces no documentation
+    """
+    documentation = get_cached_doc(code, max_tokens)
+    if documentation is not None:
+        yield 'token', documentation
+        yield 'done', cached_result(documentation)
+        return
+
+    plan = build_doc_prompt(code, max_tokens, path=path)
+    if plan['strategy'] == 'chunk':
+        result = document_code(code, max_tokens, check_cache=False, path=path)
+        yield 'token', result['documentation']
+        yield 'done', result
+        return
+
+    pieces = []
+    for piece in stream_ai_response(plan['prompt'], max_tokens, route='docs'):
+        pieces.append(piece)
+        yield 'token', piece
+
+    documentation = ''.join(pieces)
+    if not documentation.strip():
+        raise ValueError("No documentation generated")
+
+    set_cached_doc(code, max_tokens, documentation)
+    yield 'done', {
+        'documentation': documentation,
+        'strategy': plan['strategy'],
+        'code_tokens': plan['code_tokens'],
+        'prompt_tokens': count_tokens(plan['prompt']),
+        'completion_tokens': count_tokens(documentation),
+    }
+
+
+def cached_result(documentation):
+    """document_code result for a cache hit, which costs no tokens"""
+    return {
+        'documentation': documentation,
+        'strategy': 'cached',
+        'code_tokens': 0,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+    }
+
+
+def map_reduce_documentation(chunks, max_tokens, complete):
+    """
+    Document a file larger than the context window.
+
+    Each chunk is documented (map) and the chunk docs are then merged into
+    one file-level document (reduce). Chunks run one after another in the
+    caller's worker slot, so a large file takes one share of the fair-share
+    scheduler like any other file instead of starting threads of its own.
+    """
+    part_docs = [
+        complete(AI_PROMPT.getPromptForGenerateChunkDoc(chunk['code'], chunk['name'], number, len(chunks)))
+        for number, chunk in enumerate(chunks, 1)
+    ]
+    return reduce_documentation(part_docs, max_tokens, complete)
+
+
+def reduce_documentation(part_docs, max_tokens, complete):
+    """Merge chunk docs in groups that fit the prompt budget until one document remains"""
+    if len(part_docs) == 1:
+        return part_docs[0]
+
+    budget = prompt_token_budget(max_tokens)
+    groups = [[]]
+    for doc in part_docs:
+        if groups[-1] and count_tokens(AI_PROMPT.getPromptForMergeDocs(groups[-1] + [doc])) > budget:
+            groups.append([])
+        groups[-1].append(doc)
+
+    if len(groups) == len(part_docs):
+        # No two docs fit one merge prompt; keep them as consecutive sections
+        return "\n\n".join(part_docs)
+
+    merged = [complete(AI_PROMPT.getPromptForMergeDocs(group)) if len(group) > 1 else group[0] for group in groups]
+    return reduce_documentation(merged, max_tokens, complete)
+
+
+class ProcessPool(ProcessPoolExecutor):
+    """Per-batch process pool; takes the scheduler's cost and label arguments but does not fair-share"""
+
+    def submit(self, fn, *args, cost=1, label='task', **kwargs):
+        return super().submit(fn, *args, **kwargs)
+
+
+def create_executor(max_workers, flow):
+    """
+    Worker pool configured by DOC_GENERATION_POOL.
+
+    'thread' submits to the process-wide fair-share scheduler under flow, a
+    (job class, tenant) pair; 'process' starts a pool for the batch.
+    """
+    if settings.DOC_GENERATION_POOL == 'process':
+        return ProcessPool(max_workers=max_workers)
+    return get_scheduler().session(flow)
+
+
+class DocGenerationService:
+    """
+    In-process documentation generator used by ingestion, webhook syncs and the REST API.
+
+    Calls the language model directly instead of looping back through
+    /api/repo2doc/ over HTTP. Batches are scheduled under flow, a
+    (job class, tenant) pair such as ('webhook', 'org:3'); see
+    repo2doc_api.scheduler.
+    """
+
+    def __init__(self, max_tokens=None, max_workers=None, flow=None):
+        self.max_tokens = max_tokens or settings.MAX_TOKENS
+        self.max_workers = max_workers or settings.DOC_GENERATION_MAX_WORKERS
+        self.flow = flow or ('api', 'anonymous')
+
+    def generate(self, code, path=None):
+        """Generate documentation for one file's code, raising on failure"""
+        return generate_documentation(code, self.max_tokens, path=path)
+
+    def document(self, code, path=None):
+        """Generate documentation for one file's code with its token usage; see document_code"""
+        return document_code(code, self.max_tokens, path=path)
+
+    def stream(self, code, path=None):
+        """Stream documentation for one file's code; see stream_documentation"""
+        return stream_documentation(code, self.max_tokens, path=path)
+
+    def generate_batch(self, items, paths=None):
+        """
+        Generate documentation for a batch of (key, code) items.
+
+        The key is the file's path unless paths maps it to one; an item
+        whose key is missing from paths is documented without a path.
+        Items are consumed lazily and at most two per worker are in flight,
+        so large batches never hold every file's code in memory at once.
+        Cache hits are answered straight away without occupying a worker.
+
+        Yields:
+            dict: {'path' (the item's key), 'documentation', 'error', 'wait_seconds'} plus
+            the token usage fields of document_code for each item as it
+            finishes; exactly one of documentation or error is set, and
+            wait_seconds is the time the item was queued for a worker
+        """
+        items = iter(items)
+        max_in_flight = self.max_workers * 2
+
+        with create_executor(self.max_workers, self.flow) as executor:
+            pending = {}
+            ready = []
+
+            def fill():
+                while len(pending) < max_in_flight:
+                    item = next(items, None)
+                    if item is None:
+                        return
+                    key, code = item
+
+                    documentation = get_cached_doc(code, self.max_tokens)
+                    if documentation is not None:
+                        ready.append({'path': key, 'error': None, 'wait_seconds': 0.0, **cached_result(documentation)})
+                        if len(ready) >= max_in_flight:
+                            return
+                        continue
+
+                    path = key if paths is None else paths.get(key)
+                    future = executor.submit(
+                        document_code, code, self.max_tokens, check_cache=False, path=path,
+                        cost=estimate_tokens(code), label=str(path or key)
+                    )
+                    pending[future] = key
+
+            fill()
+            while pending or ready:
+                while ready:
+                    yield ready.pop(0)
+
+                if pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        path = pending.pop(future)
+                        wait_seconds = getattr(future, 'wait_seconds', 0.0)
+                        try:
+                            result = {'path': path, 'error': None, 'wait_seconds': wait_seconds, **future.result()}
+                        except Exception as e:
+                            logger.warning(f"Documentation failed for {path}: {str(e)}")
+                            result = {'path': path, 'documentation': None, 'error': str(e), 'wait_seconds': wait_seconds}
+                        yield result
+
+                fill()
@@ -1,3 +1,359 @@
-from django.test import TestCase
+import threading
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from ai_model.ledger import ledger
+from ai_model.testing import isolate_metrics
+from .cache import doc_cache_key
+from .chunking import chunk_lines, chunk_python, chunk_source
+from .file_selection import (
+    FileSelector, GitIgnore, SKIP_EXCLUDE_GLOB, SKIP_EXCLUDED_DIRECTORY, SKIP_GITIGNORED, SKIP_NOT_SOURCE,
+)
+from .prompt_builder import build_doc_prompt, count_tokens, prompt_token_budget
+from .scheduler import FairShareScheduler
+from .views import GenerateDocView, SchedulerStatusView
+
+
+def python_module(functions):
+    return '"""Helpers."""\nimport os\n\n' + ''.join(
+        f'\n\ndef helper_{number}(value):\n    return value + {number}\n' for number in range(functions)
+    )
+
+
+def javascript_module(functions):
+    return ''.join(f'function helper{number}(value) {{\n  return value + {number};\n}}\n' for number in range(functions))
+
+
+class GitIgnoreTests(SimpleTestCase):
+    def test_negation_reincludes_a_file(self):
+        gitignore = GitIgnore()
+        gitignore.add('', "*.log\n!keep.log\n")
+
+        self.assertTrue(gitignore.is_ignored('debug.log'))
+        self.assertTrue(gitignore.is_ignored('logs/debug.log'))
+        self.assertFalse(gitignore.is_ignored('keep.log'))
+        self.assertFalse(gitignore.is_ignored('logs/keep.log'))
+
+    def test_negation_cannot_reinclude_inside_an_ignored_directory(self):
+        gitignore = GitIgnore()
+        gitignore.add('', "vendor/\n!vendor/keep.py\n")
+
+        self.assertTrue(gitignore.is_ignored('vendor/keep.py'))
+
+    def test_dir_only_rule_ignores_directories_not_files(self):
+        gitignore = GitIgnore()
+        gitignore.add('', "cache/\n")
+
+        self.assertTrue(gitignore.is_ignored('cache/data.py'))
+        self.assertTrue(gitignore.is_ignored('src/cache/data.py'))
+        self.assertFalse(gitignore.is_ignored('cache'))
+        self.assertFalse(gitignore.is_ignored('src/cache'))
+
+    def test_anchored_and_unanchored_patterns(self):
+        gitignore = GitIgnore()
+        gitignore.add('', "/settings_local.py\nsecrets.py\nsrc/generated.py\n")
+
+        self.assertTrue(gitignore.is_ignored('settings_local.py'))
+        self.assertFalse(gitignore.is_ignored('app/settings_local.py'))
+        self.assertTrue(gitignore.is_ignored('secrets.py'))
+        self.assertTrue(gitignore.is_ignored('app/secrets.py'))
+        self.assertTrue(gitignore.is_ignored('src/generated.py'))
+        self.assertFalse(gitignore.is_ignored('lib/src/generated.py'))
+
+    def test_nested_gitignore_applies_below_its_directory_and_overrides_parent(self):
+        gitignore = GitIgnore()
+        # Added deepest first: rules must still apply shallow to deep
+        gitignore.add('docs', "!keep.txt\n")
+        gitignore.add('', "*.txt\n")
+        gitignore.add('app', "local.py\n")
+
+        self.assertTrue(gitignore.is_ignored('notes.txt'))
+        self.assertTrue(gitignore.is_ignored('other/keep.txt'))
+        self.assertFalse(gitignore.is_ignored('docs/keep.txt'))
+        self.assertTrue(gitignore.is_ignored('docs/other.txt'))
+        self.assertTrue(gitignore.is_ignored('app/local.py'))
+        self.assertTrue(gitignore.is_ignored('app/sub/local.py'))
+        self.assertFalse(gitignore.is_ignored('local.py'))
+
+    def test_comments_and_blank_lines_are_ignored(self):
+        gitignore = GitIgnore()
+        gitignore.add('', "# build output\n\n*.o\n")
+
+        self.assertEqual(len(gitignore.rules), 1)
+        self.assertTrue(gitignore.is_ignored('main.o'))
+
+
+class FileSelectorTests(SimpleTestCase):
+    def test_globs_are_relative_to_the_archive_root(self):
+        selector = FileSelector(include_globs=['docs/*.txt'], exclude_globs=['tests/**'], root='proj-main')
+
+        self.assertIsNone(selector.skip_reason_for_path('proj-main/src/app.py'))
+        self.assertIsNone(selector.skip_reason_for_path('proj-main/docs/guide.txt'))
+        self.assertEqual(selector.skip_reason_for_path('proj-main/notes/guide.txt'), SKIP_NOT_SOURCE)
+        self.assertEqual(selector.skip_reason_for_path('proj-main/tests/test_app.py'), SKIP_EXCLUDE_GLOB)
+        self.assertIsNone(selector.skip_reason_for_path('proj-main/src/tests/test_app.py'))
+
+    def test_archive_root_is_not_an_excluded_directory(self):
+        selector = FileSelector(root='build')
+
+        self.assertIsNone(selector.skip_reason_for_path('build/src/app.py'))
+        self.assertEqual(selector.skip_reason_for_path('build/node_modules/lib/index.js'), SKIP_EXCLUDED_DIRECTORY)
+        self.assertEqual(FileSelector().skip_reason_for_path('build/src/app.py'), SKIP_EXCLUDED_DIRECTORY)
+
+    def test_exclude_glob_wins_over_include_glob(self):
+        selector = FileSelector(include_globs=['**/*.txt'], exclude_globs=['private/**'])
+
+        self.assertIsNone(selector.skip_reason_for_path('notes/todo.txt'))
+        self.assertEqual(selector.skip_reason_for_path('private/todo.txt'), SKIP_EXCLUDE_GLOB)
+
+    def test_gitignore_in_archive_coordinates(self):
+        gitignore = GitIgnore()
+        gitignore.add('proj-main', "/local.py\n")
+        selector = FileSelector(gitignore=gitignore, root='proj-main')
+
+        self.assertEqual(selector.skip_reason_for_path('proj-main/local.py'), SKIP_GITIGNORED)
+        self.assertIsNone(selector.skip_reason_for_path('proj-main/app/local.py'))
+
+    def test_content_checks(self):
+        selector = FileSelector()
+
+        self.assertTrue(selector.is_selected('app.py', b"def main():\n    return 1\n"))
+        self.assertFalse(selector.is_selected('app.py', b"\0\1\2binary"))
+        self.assertFalse(selector.is_selected('app.py', b"# Code generated by protoc. DO NOT EDIT.\nx = 1\n"))
+        self.assertFalse(selector.is_selected('app.py', b"   \n"))
+
+
+@override_settings(
+    GENERATION_QUANTUM_TOKENS=1024,
+    GENERATION_CLASS_WEIGHTS={'webhook': 8, 'import': 1},
+    GENERATION_TENANT_WEIGHTS={},
+)
+class FairShareSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        isolate_metrics(self)
+
+        # One worker, held busy while the flows queue up, makes the dispatch order deterministic
+        self.scheduler = FairShareScheduler(max_workers=1)
+        self.gate = threading.Event()
+        self.addCleanup(self.gate.set)
+        self.scheduler.submit(('import', 'gate'), 1, 'gate', self.gate.wait, 5)
+        self.order = []
+
+    def submit(self, flow, label, cost):
+        return self.scheduler.submit(flow, cost, label, self.order.append, label)
+
+    def run_queued(self, futures):
+        self.gate.set()
+        for future in futures:
+            future.result(timeout=5)
+        return self.order
+
+    def test_flows_with_unequal_backlogs_alternate_by_cost(self):
+        # A big import sends half-quantum files, a small one whole-quantum files
+        futures = [self.submit(('import', 'user:1'), f'big{number}', 512) for number in range(6)]
+        futures += [self.submit(('import', 'user:2'), f'small{number}', 1024) for number in range(2)]
+
+        self.assertEqual(
+            self.run_queued(futures),
+            ['big0', 'big1', 'small0', 'big2', 'big3', 'small1', 'big4', 'big5']
+        )
+
+    def test_class_weight_scales_the_share(self):
+        futures = [self.submit(('import', 'user:1'), f'import{number}', 1024) for number in range(3)]
+        futures += [self.submit(('webhook', 'user:1'), f'hook{number}', 4096) for number in range(3)]
+
+        self.assertEqual(
+            self.run_queued(futures),
+            ['import0', 'hook0', 'hook1', 'import1', 'hook2', 'import2']
+        )
+
+    def test_wait_seconds_is_reported(self):
+        future = self.submit(('import', 'user:1'), 'file', 100)
+        threading.Timer(0.1, self.gate.set).start()
+        future.result(timeout=5)
+
+        self.assertGreaterEqual(future.wait_seconds, 0.1)
+        flows = {(flow['class'], flow['tenant']): flow for flow in self.scheduler.snapshot()['flows']}
+        self.assertEqual(flows[('import', 'user:1')]['dispatched'], 1)
+        self.assertGreaterEqual(flows[('import', 'user:1')]['max_wait_seconds'], 0.1)
+        self.assertEqual(self.scheduler.snapshot()['recent'][-1]['task'], 'file')
+
+    def test_leaving_a_session_cancels_its_queued_tasks(self):
+        with self.scheduler.session(('import', 'user:1')) as session:
+            futures = [session.submit(self.order.append, number, cost=10, label=str(number)) for number in range(3)]
+        later = self.submit(('import', 'user:2'), 'later', 10)
+
+        self.assertEqual(self.run_queued([later]), ['later'])
+        self.assertTrue(all(future.cancelled() for future in futures))
+
+
+class ChunkingTests(SimpleTestCase):
+    """Sized in characters (count_tokens=len) so chunk boundaries are easy to predict"""
+
+    def test_file_within_budget_is_one_chunk(self):
+        code = python_module(2)
+
+        self.assertEqual(chunk_source(code, len(code), path='app.py', count_tokens=len), [
+            {'name': 'whole file', 'code': code},
+        ])
+
+    def test_python_splits_at_definitions_and_keeps_the_header_with_the_first(self):
+        code = (
+            '"""Module."""\nimport os\n\n\ndef a():\n    return 1\n\n\n'
+            '@cached\ndef b():\n    return 2\n\n\nclass C:\n    def m(self):\n        return 3\n'
+        )
+
+        chunks = chunk_source(code, 60, path='app.py', count_tokens=len)
+
+        self.assertEqual([chunk['name'] for chunk in chunks], ['def a', 'def b', 'class C'])
+        self.assertTrue(chunks[0]['code'].startswith('"""Module."""\nimport os\n'))
+        self.assertIn('@cached\ndef b():', chunks[1]['code'])
+        self.assertEqual(''.join(chunk['code'] for chunk in chunks), code)
+
+    def test_small_definitions_share_a_chunk(self):
+        code = python_module(6)
+
+        chunks = chunk_python(code, 150, count_tokens=len)
+
+        self.assertLess(len(chunks), 6)
+        self.assertEqual(''.join(chunk['code'] for chunk in chunks), code)
+        self.assertTrue(all(len(chunk['code']) <= 150 for chunk in chunks))
+
+    def test_definition_larger_than_the_budget_is_split_by_lines(self):
+        code = 'import os\n\ndef big():\n' + ''.join(f'    x{number} = {number}\n' for number in range(10))
+
+        chunks = chunk_python(code, 60, count_tokens=len)
+
+        self.assertEqual(chunks[0], {'name': 'lines 1-1', 'code': 'import os\n'})
+        self.assertTrue(all(chunk['name'].startswith('def big (lines ') for chunk in chunks[1:]))
+        self.assertTrue(all(chunk['code'].strip() for chunk in chunks))
+        self.assertEqual(''.join(chunk['code'] for chunk in chunks), code)
+
+    def test_other_languages_split_where_braces_balance(self):
+        code = javascript_module(3)
+
+        chunks = chunk_source(code, 60, path='src/app.JS', count_tokens=len)
+
+        self.assertEqual([chunk['name'] for chunk in chunks], ['lines 1-3', 'lines 4-6', 'lines 7-9'])
+        self.assertTrue(all(chunk['code'].startswith('function ') for chunk in chunks))
+
+    def test_python_that_does_not_parse_falls_back_to_lines(self):
+        code = 'def broken(:\n    pass\n' * 4
+
+        chunks = chunk_source(code, 30, count_tokens=len)
+
+        self.assertEqual([chunk['name'] for chunk in chunks], ['lines 1-2', 'lines 3-4', 'lines 5-6', 'lines 7-8'])
+
+    def test_chunk_lines_numbers_lines_from_offset(self):
+        lines = ['a = 1\n', 'b = 2\n', 'c = 3\n']
+
+        chunks = chunk_lines(lines, 12, count_tokens=len, offset=10)
+
+        self.assertEqual(chunks, [
+            {'name': 'lines 11-12', 'code': 'a = 1\nb = 2\n'},
+            {'name': 'lines 13-13', 'code': 'c = 3\n'},
+        ])
+
+
+# No tokenizer is loaded for the fake backend, so prompts are sized by DOC_CHUNK_CHARS_PER_TOKEN
+@override_settings(INFERENCE_BACKENDS=['fake'], INFERENCE_ROUTES={}, LLAMA_N_CTX=600, DOC_CHUNK_CHARS_PER_TOKEN=3)
+class BuildDocPromptTests(SimpleTestCase):
+    def test_file_that_fits_is_sent_whole(self):
+        code = python_module(2)
+
+        plan = build_doc_prompt(code, 50, path='app.py')
+
+        self.assertEqual(plan['strategy'], 'whole')
+        self.assertTrue(plan['prompt'].endswith(code))
+
+    def test_file_slightly_over_budget_is_trimmed_at_a_line(self):
+        code = python_module(26)
+
+        plan = build_doc_prompt(code, 50, path='app.py')
+
+        self.assertEqual(plan['strategy'], 'trim')
+        self.assertLessEqual(count_tokens(plan['prompt']), prompt_token_budget(50))
+        self.assertTrue(plan['prompt'].endswith('\n'))
+
+    def test_large_file_is_chunked_within_the_budget(self):
+        code = python_module(60)
+
+        plan = build_doc_prompt(code, 50, path='app.py')
+
+        self.assertEqual(plan['strategy'], 'chunk')
+        self.assertGreater(len(plan['chunks']), 1)
+        self.assertTrue(all(chunk['name'].startswith('def helper_') for chunk in plan['chunks']))
+        self.assertEqual(''.join(chunk['code'] for chunk in plan['chunks']), code)
+
+
+class DocCacheKeyTests(SimpleTestCase):
+    @override_settings(INFERENCE_BACKENDS=['llama_cpp'], INFERENCE_ROUTES={})
+    def key(self, **overrides):
+        with override_settings(**overrides):
+            return doc_cache_key('def main():\n    return 1\n', 50)
+
+    def test_key_changes_with_the_docs_backend_and_model(self):
+        keys = {
+            self.key(),
+            self.key(INFERENCE_ROUTES={'docs': ['fake']}),
+            self.key(INFERENCE_ROUTES={'docs': ['ollama']}),
+            self.key(INFERENCE_ROUTES={'docs': ['completion_server']}),
+            self.key(LLAMA_CPP_PATH='/models/other.gguf'),
+            self.key(LLAMA_N_CTX=8192),
+        }
+
+        self.assertEqual(len(keys), 6)
+
+    def test_key_ignores_other_routes(self):
+        self.assertEqual(self.key(), self.key(INFERENCE_ROUTES={'chat': ['fake']}))
+
+
+@override_settings(
+    INFERENCE_BACKENDS=['fake'], INFERENCE_ROUTES={}, LLAMA_N_CTX=600, DOC_CHUNK_CHARS_PER_TOKEN=3,
+    FAKE_LLM_LATENCY_SECONDS=0, FAKE_LLM_TOKENS_PER_SECOND=0, DOC_CACHE_ENABLED=False, MAX_TOKENS=50,
+)
+class BatchEndpointTests(TestCase):
+    def setUp(self):
+        isolate_metrics(self)
+        # Write the usage ledger inside the test transaction rather than after the test database is gone
+        self.addCleanup(ledger.flush)
+
+    def post(self, data):
+        request = APIRequestFactory().post('/api/repo2doc/', data, format='json')
+        return GenerateDocView.as_view()(request)
+
+    def test_over_budget_files_are_chunked_with_and_without_a_path(self):
+        response = self.post({'files': [
+            {'path': 'src/helpers.py', 'code': python_module(60)},
+            {'code': javascript_module(80)},
+            {'path': 'small.py', 'code': python_module(1)},
+        ]})
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([result['path'] for result in results], ['src/helpers.py', '1', 'small.py'])
+        self.assertEqual([result['error'] for result in results], [None, None, None])
+        self.assertTrue(all(result['documentation'] for result in results))
+
+    def test_non_string_path_is_rejected(self):
+        response = self.post({'files': [{'path': 3, 'code': python_module(1)}]})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class SchedulerStatusViewTests(TestCase):
+    def get(self, user=None):
+        request = APIRequestFactory().get('/api/repo2doc/scheduler/')
+        if user is not None:
+            force_authenticate(request, user=user)
+        return SchedulerStatusView.as_view()(request)
+
+    def test_only_staff_see_the_scheduler(self):
+        self.assertIn(self.get().status_code, (401, 403))
+        self.assertEqual(self.get(User.objects.create(username='user')).status_code, 403)
+
+        response = self.get(User.objects.create(username='admin', is_staff=True))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('flows', response.data)
@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import GenerateDocView
+from .views import GenerateDocView, SchedulerStatusView
 
 urlpatterns = [
     path('', GenerateDocView.as_view(), name='generate_doc'),
+    path('scheduler/', SchedulerStatusView.as_view(), name='scheduler_status'),
 ]
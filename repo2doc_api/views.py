@@ -1,28 +1,46 @@
+from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.permissions import IsAdminUser
 import traceback
-from django.conf import settings
-from message_resource.ai_model_config import AI_PROMPT
 from message_resource.api_message_resource import *
-from ai_model.views import generate_ai_response
+from ai_model.streaming import wants_stream, sse_response, sse_event
+from ai_model.admission import get_admission_controller, AdmissionRejected, AdmittedStream, rejected_response
+from ai_model.ledger import check_quota, record_completion, record_usage
+from message_resource.ai_model_config import AI_PROMPT
+from .services import DocGenerationService
+from .scheduler import get_scheduler, request_tenant
 
 class GenerateDocView(APIView):
     def post(self, request):
+        files = request.data.get(API_KEY_NAME.FILES)
+        if files is not None:
+            return self.post_batch(request, files)
+
         code = request.data.get(API_KEY_NAME.CODE)
         if not code:
             return Response({API_KEY_NAME.ERROR: ErrorMessages.MISSING_CODE}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Build the prompt with the code
-        prompt = AI_PROMPT.getPromptForGenerateDoc(code)
+        # Documentation queues behind interactive chat; at capacity or over quota this is 429 or 503 with Retry-After
+        try:
+            check_quota(request.user)
+            ticket = get_admission_controller().acquire('docs')
+        except AdmissionRejected as e:
+            return rejected_response(e)
+
+        if wants_stream(request):
+            return sse_response(AdmittedStream(self.stream_events(code, request.user), ticket))
 
         try:
             # Generate AI response using the language model
-            result = generate_ai_response(prompt, max_tokens=settings.MAX_TOKENS)
+            with ticket:
+                result = DocGenerationService().document(code)
+            record_usage(request.user, None, 'docs_api', result['prompt_tokens'], result['completion_tokens'])
             
             return Response({
                 API_KEY_NAME.MESSAGE: SuccessMessages.DOCUMENTATION_GENERATED,
-                API_KEY_NAME.DOCUMENTATION: result
+                API_KEY_NAME.DOCUMENTATION: result['documentation']
             }, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -31,3 +49,98 @@ class GenerateDocView(APIView):
             return Response({
                 API_KEY_NAME.ERROR: str(e) or ErrorMessages.INTERNAL_SERVER_ERROR
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def stream_events(self, code, user):
+        """
+        Server-sent events for one file: a 'token' event per token, then 'done' or 'error'.
+
+        A stream cut short by an error or a disconnect is billed for the
+        text generated so far, counted against the whole-file prompt.
+        """
+        events = DocGenerationService().stream(code)
+        pieces = []
+        finished = False
+        try:
+            for kind, value in events:
+                if kind == 'token':
+                    pieces.append(value)
+                    yield sse_event('token', {'text': value})
+                else:
+                    finished = True
+                    record_usage(user, None, 'docs_api', value['prompt_tokens'], value['completion_tokens'])
+                    yield sse_event('done', {
+                        API_KEY_NAME.MESSAGE: SuccessMessages.DOCUMENTATION_GENERATED,
+                        API_KEY_NAME.DOCUMENTATION: value['documentation'],
+                        'strategy': value['strategy'],
+                        'prompt_tokens': value['prompt_tokens'],
+                        'completion_tokens': value['completion_tokens'],
+                    })
+        except Exception as e:
+            traceback.print_exc()
+            yield sse_event('error', {API_KEY_NAME.ERROR: str(e) or ErrorMessages.INTERNAL_SERVER_ERROR})
+        finally:
+            events.close()
+            if not finished and pieces:
+                record_completion(user, None, 'docs_api', AI_PROMPT.getPromptForGenerateDoc(code), ''.join(pieces))
+
+    def post_batch(self, request, files):
+        """Document a list of {"path": ..., "code": ...} items in one request"""
+        if not isinstance(files, list) or not files:
+            return Response({API_KEY_NAME.ERROR: ErrorMessages.INVALID_FILES}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Items are keyed by request index; the client's path, when given, guides chunking
+        paths = {}
+        items = []
+        for index, item in enumerate(files):
+            if not isinstance(item, dict) or not item.get(API_KEY_NAME.CODE):
+                return Response({API_KEY_NAME.ERROR: ErrorMessages.INVALID_FILES}, status=status.HTTP_400_BAD_REQUEST)
+            path = item.get(API_KEY_NAME.PATH)
+            if path is not None and not isinstance(path, str):
+                return Response({API_KEY_NAME.ERROR: ErrorMessages.INVALID_FILES}, status=status.HTTP_400_BAD_REQUEST)
+            if path:
+                paths[index] = path
+            items.append((index, item[API_KEY_NAME.CODE]))
+
+        # The batch runs up to DOC_GENERATION_MAX_WORKERS inferences at once and holds a slot for each
+        try:
+            check_quota(request.user)
+            ticket = get_admission_controller().acquire(
+                'docs', weight=min(len(items), settings.DOC_GENERATION_MAX_WORKERS)
+            )
+        except AdmissionRejected as e:
+            return rejected_response(e)
+
+        # Results arrive in completion order
+        results = {}
+        with ticket:
+            for result in DocGenerationService(flow=('api', request_tenant(request))).generate_batch(items, paths=paths):
+                results[result['path']] = result
+        record_usage(
+            request.user, None, 'docs_api',
+            sum(result.get('prompt_tokens', 0) for result in results.values()),
+            sum(result.get('completion_tokens', 0) for result in results.values()),
+        )
+
+        return Response({
+            API_KEY_NAME.MESSAGE: SuccessMessages.DOCUMENTATION_GENERATED,
+            API_KEY_NAME.RESULTS: [
+                {
+                    API_KEY_NAME.PATH: paths.get(index, str(index)),
+                    API_KEY_NAME.DOCUMENTATION: results[index]['documentation'],
+                    API_KEY_NAME.ERROR: results[index]['error'],
+                }
+                for index in range(len(items))
+            ]
+        }, status=status.HTTP_200_OK)
+
+
+class SchedulerStatusView(APIView):
+    """
+    Fair-share scheduler state of this process: queued work per flow, dispatch totals and recent decisions.
+
+    Staff only, as flows and recent tasks name every tenant and the file paths they are documenting.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_scheduler().snapshot())
@@ -10,6 +10,8 @@ class Profile(models.Model):
     github_username = models.CharField(max_length=100, blank=True, null=True)
     avatar_url = models.URLField(max_length=500, blank=True, null=True)
     encrypted_github_token = models.TextField(blank=True, null=True)
+    # Overrides TOKEN_QUOTA_USER_DAILY when set; 0 means unlimited
+    daily_token_quota = models.BigIntegerField(blank=True, null=True)
     
     def set_github_token(self, token):
         """Encrypt and store GitHub token"""
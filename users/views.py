@@ -7,6 +7,8 @@ from django.urls import reverse
 from django.contrib import messages
 from .models import Profile
 from dashboard.models import GeneratedDocFolder
+from django.conf import settings
+from ai_model.ledger import usage_report
 import logging
 
 logger = logging.getLogger(__name__)
@@ -66,6 +68,8 @@ def profile(request, username=None):
     context = {
         'profile_user': user,
         'profile': profile,
+        'token_usage': usage_report(user=user),
+        'usage_days': settings.TOKEN_USAGE_DAYS_SHOWN,
     }
     
     return render(request, 'users/profile.html', context)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook', '0006_alter_githubrepository_webhook_secret'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookevent',
+            name='wait_seconds',
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -86,6 +86,7 @@ class WebhookEvent(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     error_message = models.TextField(null=True, blank=True)
     files_processed = models.IntegerField(default=0)
+    wait_seconds = models.FloatField(default=0)  # Summed time files queued in the fair-share scheduler
     
     # Raw payload for debugging
     payload = models.JSONField(null=True, blank=True)
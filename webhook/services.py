@@ -6,6 +6,7 @@ import os
 from django.conf import settings
 from django.urls import reverse
 from .models import GitHubRepository, WebhookEvent
+from repo2doc_api.file_selection import FileSelector
 
 class GitHubWebhookService:
     """Service for managing GitHub webhooks"""
@@ -265,12 +266,10 @@ class GitHubWebhookService:
                 removed_files.extend(commit.get('removed', []))
             
             # Filter for code files only
+            selector = FileSelector.for_repository(github_repo.doc_folder)
+            
             def is_code_file(filename):
-                code_extensions = [
-                    '.py', '.js', '.ts', '.html', '.css', '.java', '.rb', '.go',
-                    '.c', '.cpp', '.cs', '.php', '.swift', '.kt', '.rs', '.sh'
-                ]
-                return any(filename.endswith(ext) for ext in code_extensions)
+                return selector.skip_reason_for_path(filename) is None
             
             added_code_files = list(filter(is_code_file, added_files))
             modified_code_files = list(filter(is_code_file, modified_files))
@@ -1,3 +1,4 @@
+import base64
 import json
 import hashlib
 import hmac
@@ -18,7 +19,11 @@ from rest_framework import status
 
 from .models import GitHubRepository, WebhookEvent, FileSync
 from dashboard.models import GeneratedDocFolder
-from message_resource.api_message_resource import API_KEY_NAME
+from dashboard.ingestion import write_doc_file, invalidate_generations, update_source_manifest
+from repo2doc_api.services import DocGenerationService
+from ai_model.ledger import batch_quota, record_usage, TokenQuotaExceeded
+from repo2doc_api.scheduler import tenant_key
+from repo2doc_api.file_selection import FileSelector
 
 
 class GitHubWebhookService:
@@ -206,18 +211,27 @@ class GitHubWebhookView(View):
             # Process files
             files_processed = 0
             
+            # The folder stops matching any registered commit once it is synced in place
+            invalidate_generations(github_repo.doc_folder)
+            
             # Handle removed files
+            removed_paths = []
             for file_path in removed_files:
-                self.handle_file_removal(webhook_event, file_path)
+                if self.handle_file_removal(webhook_event, file_path):
+                    removed_paths.append(file_path)
                 files_processed += 1
             
             # Handle added and modified files
-            all_changed_files = list(set(added_files + modified_files))
-            for file_path in all_changed_files:
-                if self.should_process_file(file_path):
-                    success = self.process_file_update(webhook_event, file_path, commit_sha)
-                    if success:
-                        files_processed += 1
+            selector = FileSelector.for_repository(github_repo.doc_folder)
+            all_changed_files = [
+                file_path for file_path in set(added_files + modified_files)
+                if self.should_process_file(file_path, selector)
+            ]
+            updated, synced = self.process_file_updates(webhook_event, all_changed_files, commit_sha, selector)
+            files_processed += updated
+            
+            # The next re-import compares against the manifest, so it must describe the docs now on disk
+            update_source_manifest(github_repo.doc_folder, synced, removed_paths)
             
             # Update webhook event
             webhook_event.files_processed = files_processed
@@ -252,100 +266,110 @@ class GitHubWebhookView(View):
             
             return JsonResponse({'error': str(e)}, status=500)
     
-    def should_process_file(self, file_path):
+    def should_process_file(self, file_path, selector):
         """Check if file should be processed for documentation"""
-        # Skip hidden files, config files, etc.
-        skip_patterns = [
-            '.git/', '__pycache__/', 'node_modules/', '.env', 
-            '.gitignore', 'README.md', 'LICENSE', '.DS_Store'
-        ]
-        
-        for pattern in skip_patterns:
-            if pattern in file_path:
-                return False
+        return selector.skip_reason_for_path(file_path) is None
+    
+    def download_file_content(self, github_repo, file_path, commit_sha):
+        """Download a file's raw bytes from GitHub at the given commit"""
+        file_url = f"{github_repo.api_url}/contents/{file_path}?ref={commit_sha}"
+        response = requests.get(file_url)
         
-        # Only process code files (you can extend this list)
-        code_extensions = [
-            '.py', '.js', '.ts', '.java', '.cpp', '.c', '.h',
-            '.php', '.rb', '.go', '.rs', '.swift', '.kt',
-            '.cs', '.sql', '.html', '.css', '.scss', '.less'
-        ]
+        if response.status_code != 200:
+            raise Exception(f"Failed to download file: {response.status_code}")
         
-        return any(file_path.lower().endswith(ext) for ext in code_extensions)
+        file_data = response.json()
+        return base64.b64decode(file_data['content'])
     
-    def process_file_update(self, webhook_event, file_path, commit_sha):
-        """Download and process a single file update"""
-        try:
-            github_repo = webhook_event.github_repo
-            
-            # Create FileSync record
-            file_sync = FileSync.objects.create(
-                webhook_event=webhook_event,
-                file_path=file_path,
-                action='modified'
-            )
-            
-            # Download file content from GitHub
-            file_url = f"{github_repo.api_url}/contents/{file_path}?ref={commit_sha}"
-            response = requests.get(file_url)
-            
-            if response.status_code != 200:
-                file_sync.error_message = f"Failed to download file: {response.status_code}"
-                file_sync.save()
-                return False
-            
-            file_data = response.json()
-            
-            # Decode file content
-            import base64
-            file_content = base64.b64decode(file_data['content']).decode('utf-8', errors='ignore')
-            
-            if not file_content.strip():
-                file_sync.error_message = "Empty file content"
-                file_sync.save()
-                return False
-            
-            # Generate documentation using the same API as initial upload
-            api_url = settings.HOST_URL + "/api/repo2doc/"
-            api_response = requests.post(api_url, json={API_KEY_NAME.CODE: file_content})
-            
-            if api_response.status_code != 200:
-                file_sync.error_message = f"Documentation API failed: {api_response.status_code}"
-                file_sync.save()
-                return False
-            
-            documentation = api_response.json().get(API_KEY_NAME.DOCUMENTATION)
-            if not documentation:
-                file_sync.error_message = "No documentation generated"
+    def process_file_updates(self, webhook_event, file_paths, commit_sha, selector):
+        """
+        Download changed files and regenerate their documentation as one batch.
+
+        Tokens are charged to the doc folder's owner and organization; once
+        either's daily quota is used up the remaining files are recorded as
+        failed with the quota message. Files are scheduled as webhook work,
+        ahead of cold imports, and their queue time is added to the event's
+        wait_seconds.
+
+        Returns:
+            tuple: (number of docs written, {path: source hash} of those docs)
+        """
+        github_repo = webhook_event.github_repo
+        doc_folder = github_repo.doc_folder
+        file_syncs = {}
+        source_hashes = {}
+        synced = {}
+        check_quota = batch_quota(doc_folder.user, doc_folder.organization)
+        
+        def iter_items():
+            for file_path in file_paths:
+                # Create FileSync record
+                file_sync = FileSync.objects.create(
+                    webhook_event=webhook_event,
+                    file_path=file_path,
+                    action='modified'
+                )
+                file_syncs[file_path] = file_sync
+                
+                try:
+                    file_content = self.download_file_content(github_repo, file_path, commit_sha)
+                except Exception as e:
+                    file_sync.error_message = str(e)
+                    file_sync.save()
+                    continue
+                
+                skip_reason = selector.skip_reason_for_content(file_path, file_content)
+                if skip_reason:
+                    file_sync.error_message = f"Skipped: {skip_reason}"
+                    file_sync.save()
+                    continue
+                
+                try:
+                    check_quota()
+                except TokenQuotaExceeded as e:
+                    file_sync.error_message = str(e)
+                    file_sync.save()
+                    continue
+                
+                source_hashes[file_path] = hashlib.sha256(file_content).hexdigest()
+                yield file_path, file_content.decode('utf-8', errors='ignore')
+        
+        files_processed = 0
+        flow = ('webhook', tenant_key(doc_folder.user_id, doc_folder.organization_id))
+        for result in DocGenerationService(flow=flow).generate_batch(iter_items()):
+            file_sync = file_syncs[result['path']]
+            webhook_event.wait_seconds += result['wait_seconds']
+            if result.get('prompt_tokens') or result.get('completion_tokens'):
+                record_usage(doc_folder.user, doc_folder.organization, 'webhook',
+                             result['prompt_tokens'], result['completion_tokens'])
+            
+            if result['error']:
+                file_sync.error_message = result['error']
                 file_sync.save()
-                return False
+                continue
             
             # Save updated documentation
-            doc_folder = github_repo.doc_folder
             md_file_path = os.path.join(
                 doc_folder.folder_path,
-                os.path.splitext(file_path)[0] + ".md"
+                os.path.splitext(result['path'])[0] + ".md"
             )
             
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(md_file_path), exist_ok=True)
-            
-            with open(md_file_path, 'w', encoding='utf-8') as f:
-                f.write(documentation)
+            try:
+                write_doc_file(md_file_path, result['documentation'])
+            except OSError as e:
+                file_sync.error_message = str(e)
+                file_sync.save()
+                continue
             
             file_sync.success = True
             file_sync.save()
-            
-            return True
-            
-        except Exception as e:
-            if 'file_sync' in locals():
-                file_sync.error_message = str(e)
-                file_sync.save()
-            raise e
+            synced[result['path']] = source_hashes[result['path']]
+            files_processed += 1
+        
+        return files_processed, synced
     
     def handle_file_removal(self, webhook_event, file_path):
-        """Handle file removal"""
+        """Delete a removed file's doc; returns True on success"""
         try:
             # Create FileSync record
             file_sync = FileSync.objects.create(
@@ -379,11 +403,13 @@ class GitHubWebhookView(View):
             
             file_sync.success = True
             file_sync.save()
+            return True
             
         except Exception as e:
             if 'file_sync' in locals():
                 file_sync.error_message = str(e)
                 file_sync.save()
+            return False
 
 
 @api_view(['POST'])